@@ -21,13 +21,26 @@ DATABASES = {
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
         'ATOMIC_REQUESTS': True,
-        'CONN_MAX_AGE': 60,
+        # Соединения фоновых потоков живут между задачами пула (см. DB_POOL_SIZE)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        # Перед повторным использованием соединение проверяется, сломанное переоткрывается
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
         'OPTIONS': {
             'connect_timeout': 10,
         }
     }
 }
 
+# Размер пула фоновых потоков работы с БД (= максимум их соединений)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+
+# Очередь приема заказов: заказов в одной транзакции и ожидание добора пачки (мс)
+ORDER_INTAKE_MAX_BATCH = int(os.getenv('ORDER_INTAKE_MAX_BATCH', '50'))
+ORDER_INTAKE_MAX_WAIT_MS = float(os.getenv('ORDER_INTAKE_MAX_WAIT_MS', '5'))
+
+# Доля вызовов обработчика БД, для которых считаются SQL запросы (0 — выключено)
+DB_PROFILE_SAMPLE_RATE = float(os.getenv('DB_PROFILE_SAMPLE_RATE', '0.1'))
+
 # Настройки Django
 INSTALLED_APPS = [
     'database',
@@ -0,0 +1,68 @@
+"""
+Асинхронный обработчик базы данных для asyncio-кода
+"""
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+from .PostgreSQLHandler import PostgreSQLHandler
+
+
+class AsyncPostgreSQLHandler:
+    """
+    Асинхронная обертка над PostgreSQLHandler с тем же набором методов.
+
+    Каждый метод — корутина: вызов выполняется синхронным обработчиком в
+    пуле фоновых потоков БД (run_in_background), а Semaphore ограничивает
+    число одновременных запросов (по умолчанию — DB_POOL_SIZE). Поэтому
+    несколько await через asyncio.gather действительно идут параллельно
+    по разным соединениям и в собственных транзакциях методов.
+
+    Async ORM Django (aget, acount, async for) здесь не используется: он
+    выполняет все запросы в одном общем потоке (thread_sensitive) и не
+    поддерживает transaction.atomic, на котором построены методы записи.
+    """
+
+    # Методы, которые не переносятся: генераторы и служебные
+    NOT_MIRRORED = {'run_in_background', 'stream_custom_query', 'stream_report', 'invalidate_stats_cache',
+                    'invalidate_catalog_cache', 'submit_order'}
+
+    def __init__(self, handler: Optional[PostgreSQLHandler] = None, max_concurrency: Optional[int] = None):
+        self.handler = handler or PostgreSQLHandler()
+        self.max_concurrency = max_concurrency or getattr(settings, 'DB_POOL_SIZE', 4)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Выполнение произвольной синхронной функции работы с БД в пуле"""
+        async with self._semaphore:
+            return await asyncio.wrap_future(self.handler.run_in_background(fn, *args, **kwargs))
+
+    async def submit_order(self, customer_id: int, items: List[Dict[str, Any]], notes: str = "",
+                           reservation_ids: Optional[List[int]] = None):
+        """Заказ через очередь приема: ожидание фиксации пачки без занятия потока пула"""
+        return await asyncio.wrap_future(self.handler.submit_order(customer_id, items, notes, reservation_ids))
+
+    async def gather(self, *calls: Awaitable) -> list:
+        """Параллельное ожидание нескольких вызовов; ошибки пробрасываются"""
+        return list(await asyncio.gather(*calls))
+
+
+def _mirror(name: str):
+    """Корутина-двойник метода PostgreSQLHandler"""
+    sync_method = getattr(PostgreSQLHandler, name)
+
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.handler, name), *args, **kwargs)
+
+    method.__name__ = name
+    method.__qualname__ = f"AsyncPostgreSQLHandler.{name}"
+    method.__doc__ = sync_method.__doc__
+    method.__signature__ = inspect.signature(sync_method)
+    return method
+
+
+for _name, _member in inspect.getmembers(PostgreSQLHandler, inspect.isfunction):
+    if not _name.startswith('_') and _name not in AsyncPostgreSQLHandler.NOT_MIRRORED:
+        setattr(AsyncPostgreSQLHandler, _name, _mirror(_name))
@@ -0,0 +1,354 @@
+"""
+Массовый импорт клиентов и товаров через COPY FROM STDIN и upsert.
+
+Строки читаются из CSV/JSONL потоком, проверяются полями модели и
+передаются в PostgreSQL через временную таблицу. В памяти держится только
+текущий буфер COPY, поэтому размер файла не ограничен.
+
+Синхронизация с внешними системами идет через INSERT ... ON CONFLICT
+по уникальному ключу (email/sku) пачками по chunk_size строк.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from .ChangeFeed import notify_reload, suppress_notifications
+from .models import Customer, Product
+
+
+# Описание импортируемых таблиц: колонки из файла, уникальный ключ,
+# приведение типов из staging-таблицы и служебные поля
+IMPORT_SPECS = {
+    'customers': {
+        'model': Customer,
+        'key': 'email',
+        'columns': ['first_name', 'last_name', 'email', 'phone', 'address'],
+        'casts': {},
+        'extra': {'created_at': 'NOW()', 'updated_at': 'NOW()'},
+    },
+    'products': {
+        'model': Product,
+        'key': 'sku',
+        'columns': ['name', 'description', 'category', 'price', 'quantity', 'sku', 'is_active'],
+        'casts': {'price': 'numeric', 'quantity': 'integer', 'is_active': 'boolean'},
+        'extra': {'created_at': 'NOW()', 'updated_at': 'NOW()'},
+    },
+}
+
+TRUE_VALUES = {'1', 't', 'true', 'y', 'yes', 'да'}
+FALSE_VALUES = {'0', 'f', 'false', 'n', 'no', 'нет'}
+
+
+class CopyStream:
+    """
+    Файлоподобный объект для cursor.copy_expert().
+
+    Лениво превращает итератор кортежей в CSV-текст для COPY ... FORMAT csv.
+    Все значения заключаются в кавычки, поэтому пустая строка не превращается в NULL.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[Any, ...]]):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        self._pending = ''
+
+    def _fill(self, size: int):
+        while size < 0 or len(self._pending) < size:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                break
+            self._writer.writerow(row)
+            # Копим несколько строк перед сбросом буфера, чтобы не дергать StringIO на каждой
+            if self._buffer.tell() >= 65536:
+                self._pending += self._buffer.getvalue()
+                self._buffer.seek(0)
+                self._buffer.truncate()
+        self._pending += self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+    def read(self, size: int = -1) -> str:
+        self._fill(size)
+        if size < 0:
+            chunk, self._pending = self._pending, ''
+        else:
+            chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
+
+
+def detect_format(path: str) -> str:
+    """Определение формата файла по расширению"""
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_records(path: str, file_format: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Потоковое чтение файла: (номер строки, словарь значений)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'jsonl':
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {'__error__': f"некорректный JSON: {e.msg}"}
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, {'__error__': "ожидается JSON-объект"}
+                    continue
+                yield line_no, record
+        else:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+
+
+class BulkImporter:
+    """Импорт таблицы customers/products через временную таблицу и COPY"""
+
+    def __init__(self, table: str):
+        if table not in IMPORT_SPECS:
+            raise ValueError(f"Неизвестная таблица для импорта: {table}")
+        self.table = table
+        self.spec = IMPORT_SPECS[table]
+        self.model = self.spec['model']
+        self.stage_table = f"import_{table}_stage"
+
+    def clean_record(self, record: Dict[str, Any]) -> Tuple[Any, ...]:
+        """Проверка строки по полям модели; ValueError с причиной отказа"""
+        if '__error__' in record:
+            raise ValueError(record['__error__'])
+
+        values = []
+        for column in self.spec['columns']:
+            field = self.model._meta.get_field(column)
+            raw = record.get(column)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if raw is None or raw == '':
+                if field.has_default():
+                    raw = field.get_default()
+                elif field.blank:
+                    raw = ''
+            elif field.get_internal_type() == 'BooleanField' and not isinstance(raw, bool):
+                text = str(raw).lower()
+                if text in TRUE_VALUES:
+                    raw = True
+                elif text in FALSE_VALUES:
+                    raw = False
+            try:
+                value = field.clean(raw, None)
+            except ValidationError as e:
+                raise ValueError(f"{column}: {'; '.join(e.messages)}")
+            values.append(value)
+        return tuple(values)
+
+    def _valid_rows(self, records: Iterable[Tuple[int, Dict[str, Any]]],
+                    on_reject: Callable[[int, str], None], stats: Dict[str, int]) -> Iterator[Tuple[Any, ...]]:
+        for line_no, record in records:
+            stats['read'] += 1
+            try:
+                yield (line_no,) + self.clean_record(record)
+            except ValueError as e:
+                stats['rejected'] += 1
+                on_reject(line_no, str(e))
+
+    @transaction.atomic
+    def run(self, path: str, file_format: Optional[str] = None,
+            on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+        """
+        Импорт файла; возвращает счетчики read/inserted/rejected.
+
+        conflicted — сколько из rejected отклонено из-за ключа, добавленного
+        параллельно во время импорта.
+        """
+        on_reject = on_reject or (lambda line_no, reason: None)
+        file_format = file_format or detect_format(path)
+        key = self.spec['key']
+        columns = self.spec['columns']
+        stage = self.stage_table
+        stats = {'read': 0, 'inserted': 0, 'rejected': 0, 'conflicted': 0}
+
+        with connection.cursor() as cursor:
+            # 1. Временная таблица без ограничений — COPY в нее не падает на дубликатах
+            stage_columns = ', '.join(f"{col} text" for col in columns)
+            cursor.execute(
+                f"CREATE TEMP TABLE {stage} (line_no integer, {stage_columns}, reject_reason text) "
+                f"ON COMMIT DROP"
+            )
+
+            # 2. Потоковая загрузка проверенных строк
+            rows = self._valid_rows(read_records(path, file_format), on_reject, stats)
+            cursor.copy_expert(
+                f"COPY {stage} (line_no, {', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                CopyStream(rows)
+            )
+            cursor.execute(f"CREATE INDEX ON {stage} ({key}, line_no)")
+            cursor.execute(f"ANALYZE {stage}")
+
+            # 3. Отбраковка дубликатов внутри файла (остается первая строка)
+            cursor.execute(
+                f"""
+                UPDATE {stage} s
+                SET reject_reason = 'дубликат {key} в файле (строка ' || d.first_line || ')'
+                FROM (SELECT {key}, MIN(line_no) AS first_line FROM {stage} GROUP BY {key}) d
+                WHERE s.{key} = d.{key} AND s.line_no > d.first_line
+                """
+            )
+
+            # 4. Отбраковка ключей, уже существующих в базе
+            cursor.execute(
+                f"""
+                UPDATE {stage} s
+                SET reject_reason = '{key} уже существует'
+                FROM {self.table} t
+                WHERE t.{key} = s.{key} AND s.reject_reason IS NULL
+                """
+            )
+
+            # 5. Перенос оставшихся строк в целевую таблицу
+            target_columns = columns + list(self.spec['extra'])
+            select_columns = [
+                f"{col}::{self.spec['casts'][col]}" if col in self.spec['casts'] else col
+                for col in columns
+            ] + list(self.spec['extra'].values())
+            # Вместо уведомления на каждую строку — одно о перезагрузке таблицы
+            suppress_notifications(cursor)
+            # Ключ, добавленный параллельной транзакцией после шага 4, пропускается
+            # ON CONFLICT — такие строки помечаются и попадают в отчет об отклоненных
+            cursor.execute(
+                f"""
+                WITH ins AS (
+                    INSERT INTO {self.table} ({', '.join(target_columns)})
+                    SELECT {', '.join(select_columns)}
+                    FROM {stage}
+                    WHERE reject_reason IS NULL
+                    ON CONFLICT ({key}) DO NOTHING
+                    RETURNING {key}
+                ), conflicted AS (
+                    UPDATE {stage} s
+                    SET reject_reason = '{key} уже существует (добавлен во время импорта)'
+                    WHERE s.reject_reason IS NULL
+                      AND NOT EXISTS (SELECT 1 FROM ins WHERE ins.{key} = s.{key})
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM ins), (SELECT COUNT(*) FROM conflicted)
+                """
+            )
+            stats['inserted'], stats['conflicted'] = cursor.fetchone()
+            notify_reload(cursor, self.table)
+
+        # 6. Отчет об отклоненных строках читается серверным курсором порциями
+        with connection.connection.cursor(name=f"{stage}_rejects") as rejects:
+            rejects.itersize = 5000
+            rejects.execute(
+                f"SELECT line_no, reject_reason FROM {stage} "
+                f"WHERE reject_reason IS NOT NULL ORDER BY line_no"
+            )
+            for line_no, reason in rejects:
+                stats['rejected'] += 1
+                on_reject(line_no, reason)
+
+        return stats
+
+    @transaction.atomic
+    def upsert(self, rows: Iterable[Dict[str, Any]], update_fields: Optional[List[str]] = None,
+               chunk_size: int = 1000, on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+        """
+        Вставка или обновление строк по уникальному ключу.
+
+        update_fields — колонки, перезаписываемые у существующих строк
+        (по умолчанию все, кроме ключа). Строки, у которых эти колонки не
+        изменились, не трогаются. Строки применяются по порядку, поэтому при
+        повторе ключа побеждает последняя строка, а предыдущая считается
+        вставленной или обновленной — как если бы они пришли отдельными вызовами.
+        Неверные строки передаются в on_reject(номер строки с 1, причина).
+        Возвращает счетчики inserted/updated/unchanged/rejected.
+        """
+        on_reject = on_reject or (lambda line_no, reason: None)
+        key = self.spec['key']
+        columns = self.spec['columns']
+        if update_fields is None:
+            update_fields = [col for col in columns if col != key]
+        unknown = set(update_fields) - set(columns) - {key}
+        if unknown or key in update_fields:
+            raise ValueError(f"Недопустимые поля для обновления: {', '.join(sorted(unknown) or [key])}")
+        if chunk_size < 1:
+            raise ValueError("chunk_size должен быть положительным")
+
+        extra = self.spec['extra']
+        key_index = columns.index(key)
+        set_clause = [f"{col} = EXCLUDED.{col}" for col in update_fields]
+        if 'updated_at' in extra:
+            set_clause.append("updated_at = NOW()")
+        target = ', '.join(f"{self.table}.{col}" for col in update_fields)
+        excluded = ', '.join(f"EXCLUDED.{col}" for col in update_fields)
+        # xmax = 0 у только что вставленной строки, у обновленной — id текущей транзакции
+        if update_fields:
+            conflict = (
+                f"DO UPDATE SET {', '.join(set_clause)} "
+                f"WHERE ({target}) IS DISTINCT FROM ({excluded})"
+            )
+        else:
+            conflict = "DO NOTHING"
+        sql = (
+            f"INSERT INTO {self.table} ({', '.join(columns + list(extra))}) VALUES %s "
+            f"ON CONFLICT ({key}) {conflict} "
+            f"RETURNING (xmax = 0) AS inserted"
+        )
+        template = f"({', '.join(['%s'] * len(columns) + list(extra.values()))})"
+
+        stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'rejected': 0}
+
+        def flush(cursor, values):
+            result = execute_values(cursor.cursor, sql, list(values.values()), template,
+                                    page_size=len(values), fetch=True)
+            inserted = sum(1 for (is_new,) in result if is_new)
+            stats['inserted'] += inserted
+            stats['updated'] += len(result) - inserted
+            stats['unchanged'] += len(values) - len(result)
+
+        rows = iter(rows)
+        offset = 0
+        with connection.cursor() as cursor:
+            suppress_notifications(cursor)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+
+                values = {}
+                for index, record in enumerate(chunk):
+                    try:
+                        cleaned = self.clean_record(record)
+                    except ValueError as e:
+                        stats['rejected'] += 1
+                        on_reject(offset + index + 1, str(e))
+                        continue
+                    # Один ключ не может встречаться в одном INSERT дважды:
+                    # повтор уходит в следующий INSERT и применяется поверх предыдущего
+                    if cleaned[key_index] in values:
+                        flush(cursor, values)
+                        values = {}
+                    values[cleaned[key_index]] = cleaned
+                offset += len(chunk)
+                if values:
+                    flush(cursor, values)
+            notify_reload(cursor, self.table)
+
+        return stats
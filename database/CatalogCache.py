@@ -0,0 +1,66 @@
+"""
+Кэш каталога товаров в памяти процесса
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+
+class CatalogCache:
+    """
+    LRU-кэш с ограничением времени жизни записей.
+
+    get_or_load(key, loader) возвращает значение из кэша или вызывает loader
+    и запоминает результат. Значения отдаются общими для всех потоков —
+    изменяемые объекты вызывающий код копирует сам. invalidate() увеличивает поколение кэша: результат
+    загрузки, начатой до сброса, уже не сохраняется.
+    """
+
+    def __init__(self, max_entries: int = 32, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        found, value, generation = self.lookup(key)
+        if found:
+            return value
+        value = loader()
+        self.store(key, value, generation)
+        return value
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any, int]:
+        """
+        Поиск записи: (найдена ли, значение, поколение кэша).
+
+        Поколение передается в store(): если кэш сбросили, пока значение
+        вычислялось, оно не сохраняется.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1], self._generation
+            self.misses += 1
+            return False, None, self._generation
+
+    def store(self, key: Hashable, value: Any, generation: int):
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Сброс всех записей"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
@@ -0,0 +1,148 @@
+"""
+Лента изменений базы через LISTEN/NOTIFY.
+
+Триггеры (миграция 0009_change_notify_triggers) шлют в канал db_changes
+уведомление о каждой измененной строке customers, products, orders и
+order_items, а миграция 0014_stock_stripe_changes — о полосах остатков
+stock_stripes. ChangeListener слушает канал на отдельном соединении в своем
+потоке, собирает уведомления в пачки (batch_window) и передает их в
+on_changes(ChangeBatch). Изменение позиции заказа считается изменением
+самого заказа, изменение полосы остатка — изменением товара.
+"""
+import json
+import select
+import threading
+import time
+from typing import Callable, Dict, Set
+
+import psycopg2
+import psycopg2.extensions
+from django.db import connections
+
+
+CHANNEL = 'db_changes'
+TABLES = ('customers', 'products', 'orders')
+# Дочерние таблицы: изменение строки — изменение родителя с id из поля "p"
+PARENT_TABLES = {'order_items': 'orders', 'stock_stripes': 'products'}
+
+
+class ChangeBatch:
+    """Пачка изменений: rows[таблица][id] = последняя операция (I/U/D), reload — таблицы целиком"""
+
+    def __init__(self):
+        self.rows: Dict[str, Dict[int, str]] = {}
+        self.reload: Set[str] = set()
+
+    def __bool__(self):
+        return bool(self.rows or self.reload)
+
+    @property
+    def tables(self) -> Set[str]:
+        return set(self.rows) | self.reload
+
+    def add(self, payload: str):
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            return
+        table, op = change.get('t'), change.get('op')
+        if op == 'R':
+            self.reload.add(table)
+        elif table in PARENT_TABLES:
+            if change.get('p') is not None:
+                self._merge(PARENT_TABLES[table], change['p'], 'U')
+        elif change.get('id') is not None:
+            self._merge(table, change['id'], op)
+
+    def _merge(self, table: str, row_id: int, op: str):
+        rows = self.rows.setdefault(table, {})
+        # Вставка с последующим изменением остается вставкой
+        if not (op == 'U' and rows.get(row_id) == 'I'):
+            rows[row_id] = op
+
+
+def suppress_notifications(cursor):
+    """
+    Отключение построчных уведомлений до конца текущей транзакции.
+
+    Для массовых операций: после них вызывается notify_reload, и слушатели
+    перечитывают таблицу целиком.
+    """
+    cursor.execute("SELECT set_config('app.notify_changes', 'off', true)")
+
+
+def notify_reload(cursor, *tables: str):
+    """Уведомление о перезагрузке таблиц (доставляется при COMMIT)"""
+    cursor.execute("SELECT set_config('app.notify_changes', 'on', true)")
+    for table in tables:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, json.dumps({'t': table, 'op': 'R'})])
+
+
+class ChangeListener:
+    """Поток, слушающий канал изменений на собственном соединении"""
+
+    # Пауза перед повторным подключением (секунды, удваивается до MAX_RETRY_DELAY)
+    RETRY_DELAY = 0.5
+    MAX_RETRY_DELAY = 10
+
+    def __init__(self, on_changes: Callable[[ChangeBatch], None], channel: str = CHANNEL,
+                 batch_window: float = 0.05, poll_timeout: float = 0.5):
+        self.on_changes = on_changes
+        self.channel = channel
+        self.batch_window = batch_window
+        self.poll_timeout = poll_timeout
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='db-change-listener', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _connect(self):
+        params = connections['default'].get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _run(self):
+        delay = self.RETRY_DELAY
+        first = True
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                delay = self.RETRY_DELAY
+                if not first:
+                    # Пока соединения не было, уведомления терялись — перечитать все
+                    batch = ChangeBatch()
+                    batch.reload.update(TABLES)
+                    self.on_changes(batch)
+                first = False
+                self._listen(conn)
+            except psycopg2.Error as e:
+                print(f"⚠️ Лента изменений: соединение потеряно ({e}), повтор через {delay} с")
+                self._stopped.wait(delay)
+                delay = min(delay * 2, self.MAX_RETRY_DELAY)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _listen(self, conn):
+        batch = ChangeBatch()
+        deadline = None
+        while not self._stopped.is_set():
+            timeout = self.poll_timeout if deadline is None else max(0.0, deadline - time.monotonic())
+            if select.select([conn], [], [], timeout)[0]:
+                conn.poll()
+                while conn.notifies:
+                    batch.add(conn.notifies.pop(0).payload)
+                if batch and deadline is None:
+                    deadline = time.monotonic() + self.batch_window
+            if deadline is not None and time.monotonic() >= deadline:
+                self.on_changes(batch)
+                batch = ChangeBatch()
+                deadline = None
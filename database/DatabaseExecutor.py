@@ -0,0 +1,104 @@
+"""
+Пул фоновых потоков для работы с базой данных.
+
+Django держит по одному соединению на поток. Если на каждое обновление
+данных запускать новый поток, каждый раз открывается новое соединение,
+которое потом никто не закрывает. Здесь фиксированное число потоков
+переиспользуется. Каждый поток держит свое постоянное соединение
+(CONN_MAX_AGE), его исправность проверяет CONN_HEALTH_CHECKS. Итого
+открытых соединений не больше размера пула.
+"""
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+
+class DatabaseExecutor:
+    """Ограниченный пул потоков с постоянными соединениями Django"""
+
+    def __init__(self, size: int = 4, name: str = 'db-worker'):
+        self.size = size
+        self._tasks: queue.Queue = queue.Queue()
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{index}", daemon=True)
+            for index in range(size)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """
+        Выполнить fn(*args, **kwargs) в потоке пула; результат — через Future.
+
+        Задача выполняется в копии контекста (contextvars) вызывающего кода,
+        как в asyncio.to_thread.
+        """
+        future: Future = Future()
+        context = contextvars.copy_context()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Пул соединений уже остановлен")
+            self._tasks.put((future, context, fn, args, kwargs))
+        return future
+
+    def _worker(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            future, context, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Как в обработке HTTP-запроса: до и после задачи закрываем
+            # просроченные и сломанные соединения, живые остаются для следующей
+            close_old_connections()
+            try:
+                result = context.run(fn, *args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                close_old_connections()
+        connections.close_all()
+
+    def shutdown(self, wait: bool = True):
+        """Остановка пула: каждый поток закрывает свое соединение и завершается"""
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            for _ in self._threads:
+                self._tasks.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+_executor: Optional[DatabaseExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> DatabaseExecutor:
+    """Общий пул приложения (создается при первом обращении, размер — DB_POOL_SIZE)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = DatabaseExecutor(getattr(settings, 'DB_POOL_SIZE', 4))
+        return _executor
+
+
+def shutdown_executor(wait: bool = True):
+    """Остановка общего пула (при выходе из приложения)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait)
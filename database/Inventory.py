@@ -0,0 +1,359 @@
+"""
+Списание и резервирование остатков товаров без потерянных обновлений.
+
+Остаток списывается условным UPDATE (quantity >= n), поэтому проверка и
+списание атомарны и продать больше, чем есть, нельзя. Остаток популярного
+товара можно разнести по полосам (stock_stripes): заказ списывает из
+случайной свободной полосы (FOR UPDATE SKIP LOCKED) и не ждет заказы,
+списывающие из других полос. Только если ни в одной свободной полосе не
+хватает, блокируются все полосы товара и списание собирается из нескольких.
+Строка товара при этом не меняется: текущий остаток читается через
+annotate_stock, а изменения полос видны по stock_stripes.updated_at и
+уведомлениям ленты изменений. Признак products.striped stripe()/unstripe()
+меняют под блокировкой строки товара, а списание проверяет его в той же
+строке, поэтому разнесение во время списаний не теряет и не удваивает остаток.
+
+Резерв (stock_reservations) списывает остаток сразу и удерживает его до
+оформления заказа или истечения срока; просроченные резервы возвращает
+expire_reservations().
+"""
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import StockReservation, StockStripe
+
+
+class Inventory:
+    """Операции с остатками; методы вызываются внутри транзакции вызывающего"""
+
+    # Число полос по умолчанию для stripe()
+    DEFAULT_STRIPES = 8
+    # Срок резерва по умолчанию (секунды)
+    RESERVATION_TTL = 900
+
+    def decrement(self, quantities: Dict[int, int]) -> List[int]:
+        """
+        Списание {product_id: количество}; возвращает id товаров, которых не хватило.
+
+        При нехватке части товаров остальные уже списаны — вызывающий
+        откатывает транзакцию.
+        """
+        quantities = {product_id: qty for product_id, qty in quantities.items() if qty > 0}
+        if not quantities:
+            return []
+
+        with connection.cursor() as cursor:
+            # Товары без полос — одним условным UPDATE
+            updated = self._decrement_rows(cursor, quantities)
+            rest = [product_id for product_id in quantities if product_id not in updated]
+            if not rest:
+                return []
+            # Остальные — товары с полосами или без нужного остатка. FOR KEY SHARE дает
+            # последнюю версию строки и не пускает stripe()/unstripe() до конца транзакции,
+            # но не мешает параллельным списаниям
+            striped = self._lock_striped(cursor, rest)
+            # Пока ждали блокировку, unstripe() мог вернуть остаток в строку товара
+            plain = {product_id: quantities[product_id] for product_id in rest if product_id not in striped}
+            updated = self._decrement_rows(cursor, plain) if plain else set()
+            return [
+                product_id for product_id in rest
+                if product_id not in updated
+                and (product_id not in striped or not self._take_striped(cursor, product_id, quantities[product_id]))
+            ]
+
+    @staticmethod
+    def _decrement_rows(cursor, quantities: Dict[int, int]) -> set:
+        """
+        Условное списание из строк товаров без полос; id списанных.
+
+        Признак striped стоит в строке товара: если stripe() изменил ее, пока
+        UPDATE ждал блокировку, условие перепроверяется по новой версии строки.
+        """
+        cursor.execute(
+            """
+            UPDATE products AS p
+            SET quantity = p.quantity - v.qty, updated_at = NOW()
+            FROM unnest(%s::int[], %s::int[]) AS v(id, qty)
+            WHERE p.id = v.id AND p.quantity >= v.qty AND NOT p.striped
+            RETURNING p.id
+            """,
+            (list(quantities), list(quantities.values()))
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def _lock_striped(cursor, product_ids: List[int]) -> set:
+        """Блокировка строк товаров (FOR KEY SHARE, по порядку id); id товаров с полосами"""
+        cursor.execute(
+            "SELECT id, striped FROM products WHERE id = ANY(%s) ORDER BY id FOR KEY SHARE",
+            [list(product_ids)]
+        )
+        return {product_id for product_id, striped in cursor.fetchall() if striped}
+
+    # Выбор одной случайной полосы с достаточным остатком; {skip} — SKIP LOCKED или пусто.
+    # Выбор — в CTE: он выполняется один раз, а подзапрос в FROM планировщик
+    # может перевыполнять для каждой строки (и random() выберет другие полосы)
+    TAKE_STRIPE_SQL = """
+        WITH chosen AS (
+            SELECT stripe FROM stock_stripes
+            WHERE product_id = %s AND quantity >= %s
+            ORDER BY random()
+            LIMIT 1
+            FOR UPDATE {skip}
+        )
+        UPDATE stock_stripes AS s
+        SET quantity = s.quantity - %s, updated_at = NOW()
+        FROM chosen
+        WHERE s.product_id = %s AND s.stripe = chosen.stripe
+        RETURNING s.stripe
+    """
+
+    def _take_striped(self, cursor, product_id: int, qty: int) -> bool:
+        # Сначала незанятая полоса, затем ожидание одной занятой (писателей
+        # больше, чем полос); после ожидания условие остатка проверяется заново
+        for skip in ('SKIP LOCKED', ''):
+            cursor.execute(self.TAKE_STRIPE_SQL.format(skip=skip), [product_id, qty, qty, product_id])
+            if cursor.fetchone() is not None:
+                return True
+
+        # Ни в одной полосе не хватает: все полосы в порядке номеров (без взаимных блокировок)
+        cursor.execute(
+            "SELECT stripe, quantity FROM stock_stripes WHERE product_id = %s ORDER BY stripe FOR UPDATE",
+            [product_id]
+        )
+        stripes = cursor.fetchall()
+        if not stripes or sum(quantity for _, quantity in stripes) < qty:
+            return False
+        remaining = qty
+        for stripe, quantity in sorted(stripes, key=lambda row: -row[1]):
+            take = min(quantity, remaining)
+            cursor.execute(
+                "UPDATE stock_stripes SET quantity = quantity - %s, updated_at = NOW() "
+                "WHERE product_id = %s AND stripe = %s",
+                [take, product_id, stripe]
+            )
+            remaining -= take
+            if not remaining:
+                break
+        return True
+
+    def restock(self, quantities: Dict[int, int]):
+        """Возврат {product_id: количество} на склад (в полосу с наименьшим остатком)"""
+        quantities = {product_id: qty for product_id, qty in quantities.items() if qty > 0}
+        if not quantities:
+            return
+
+        with connection.cursor() as cursor:
+            striped = self._lock_striped(cursor, list(quantities))
+            if striped:
+                cursor.execute(
+                    """
+                    WITH target AS (
+                        SELECT DISTINCT ON (s.product_id) s.product_id, s.stripe, v.qty
+                        FROM stock_stripes s
+                        JOIN unnest(%s::int[], %s::int[]) AS v(id, qty) ON v.id = s.product_id
+                        ORDER BY s.product_id, s.quantity, s.stripe
+                    )
+                    UPDATE stock_stripes AS s
+                    SET quantity = s.quantity + target.qty, updated_at = NOW()
+                    FROM target
+                    WHERE s.product_id = target.product_id AND s.stripe = target.stripe
+                    """,
+                    (list(striped), [quantities[product_id] for product_id in striped])
+                )
+            rest = {product_id: qty for product_id, qty in quantities.items() if product_id not in striped}
+            if rest:
+                cursor.execute(
+                    """
+                    UPDATE products AS p
+                    SET quantity = p.quantity + v.qty, updated_at = NOW()
+                    FROM unnest(%s::int[], %s::int[]) AS v(id, qty)
+                    WHERE p.id = v.id
+                    """,
+                    (list(rest), list(rest.values()))
+                )
+
+    def stock(self, product_ids: Iterable[int]) -> Dict[int, int]:
+        """Текущий остаток товаров с учетом полос"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT p.id, COALESCE(s.total, p.quantity)
+                FROM products p
+                LEFT JOIN (
+                    SELECT product_id, SUM(quantity)::int AS total
+                    FROM stock_stripes WHERE product_id = ANY(%s)
+                    GROUP BY product_id
+                ) s ON s.product_id = p.id
+                WHERE p.id = ANY(%s)
+                """,
+                [list(product_ids), list(product_ids)]
+            )
+            return dict(cursor.fetchall())
+
+    def striped_totals(self, product_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """Остатки товаров с полосами (None — всех таких товаров)"""
+        with connection.cursor() as cursor:
+            if product_ids is None:
+                cursor.execute("SELECT product_id, SUM(quantity)::int FROM stock_stripes GROUP BY product_id")
+            else:
+                cursor.execute(
+                    "SELECT product_id, SUM(quantity)::int FROM stock_stripes "
+                    "WHERE product_id = ANY(%s) GROUP BY product_id",
+                    [list(product_ids)]
+                )
+            return dict(cursor.fetchall())
+
+    @staticmethod
+    def annotate_stock(queryset):
+        """Аннотация stock товаров: сумма полос, а у товаров без полос — products.quantity"""
+        stripes = (StockStripe.objects.filter(product=OuterRef('pk')).order_by()
+                   .values('product').annotate(total=Sum('quantity')).values('total'))
+        return queryset.annotate(stock=Coalesce(Subquery(stripes), F('quantity')))
+
+    @staticmethod
+    def apply_stock(products: list) -> list:
+        """Текущий остаток (аннотация stock из annotate_stock) в поле quantity товаров"""
+        for product in products:
+            stock = getattr(product, 'stock', None)
+            if stock is not None:
+                product.quantity = stock
+        return products
+
+    @transaction.atomic
+    def stripe(self, product_id: int, stripes: Optional[int] = None) -> int:
+        """
+        Разнесение остатка товара по stripes полосам (или перебалансировка
+        уже разнесенного); возвращает общий остаток
+        """
+        stripes = stripes or self.DEFAULT_STRIPES
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT quantity FROM products WHERE id = %s FOR UPDATE", [product_id])
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Товар с ID {product_id} не найден")
+            total = self._collect_stripes(cursor, product_id)
+            if total is None:
+                total = row[0]
+            base, extra = divmod(total, stripes)
+            cursor.execute(
+                """
+                INSERT INTO stock_stripes (product_id, stripe, quantity, updated_at)
+                SELECT %s, n, %s + (n < %s)::int, NOW() FROM generate_series(0, %s - 1) AS n
+                """,
+                [product_id, base, extra, stripes]
+            )
+            cursor.execute(
+                "UPDATE products SET quantity = %s, striped = TRUE, updated_at = NOW() WHERE id = %s",
+                [total, product_id]
+            )
+            return total
+
+    @transaction.atomic
+    def unstripe(self, product_id: int) -> Optional[int]:
+        """Возврат остатка из полос в products.quantity; None — у товара нет полос"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM products WHERE id = %s FOR UPDATE", [product_id])
+            total = self._collect_stripes(cursor, product_id)
+            if total is not None:
+                cursor.execute(
+                    "UPDATE products SET quantity = %s, striped = FALSE, updated_at = NOW() WHERE id = %s",
+                    [total, product_id]
+                )
+            return total
+
+    @staticmethod
+    def _collect_stripes(cursor, product_id: int) -> Optional[int]:
+        """Удаление полос товара под блокировкой; сумма их остатков или None"""
+        cursor.execute(
+            "DELETE FROM stock_stripes WHERE product_id = %s RETURNING quantity", [product_id]
+        )
+        rows = cursor.fetchall()
+        return sum(quantity for quantity, in rows) if rows else None
+
+    @transaction.atomic
+    def reserve(self, quantities: Dict[int, int], ttl: Optional[float] = None) -> List[StockReservation]:
+        """
+        Резерв {product_id: количество} на ttl секунд; при нехватке
+        хотя бы одного товара — ValueError и ничего не резервируется.
+        """
+        missing = self.decrement(quantities)
+        if missing:
+            raise ValueError(f"Недостаточно товара для резерва: {missing}")
+        expires_at = timezone.now() + timedelta(seconds=ttl or self.RESERVATION_TTL)
+        return StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, quantity=qty, expires_at=expires_at)
+            for product_id, qty in quantities.items() if qty > 0
+        ])
+
+    def commit_reservations(self, reservation_ids: Iterable[int], order_id: int) -> Dict[int, int]:
+        """
+        Оформление удерживаемых резервов в заказ; возвращает зарезервированные
+        количества по товарам (уже возвращенные резервы не учитываются)
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE stock_reservations SET status = 'committed', order_id = %s
+                WHERE id = ANY(%s) AND status = 'held'
+                RETURNING product_id, quantity
+                """,
+                [order_id, list(reservation_ids)]
+            )
+            reserved = Counter()
+            for product_id, qty in cursor.fetchall():
+                reserved[product_id] += qty
+            return dict(reserved)
+
+    @transaction.atomic
+    def release_reservations(self, reservation_ids: Iterable[int]) -> int:
+        """Возврат удерживаемых резервов на склад; возвращает число резервов"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE stock_reservations SET status = 'released'
+                WHERE id = ANY(%s) AND status = 'held'
+                RETURNING product_id, quantity
+                """,
+                [list(reservation_ids)]
+            )
+            return self._restock_rows(cursor.fetchall())
+
+    def expire_reservations(self, batch_size: int = 500) -> int:
+        """Возврат просроченных резервов пачками; возвращает число резервов"""
+        total = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Резервы, которые сейчас оформляются, пропускаются
+                cursor.execute(
+                    """
+                    WITH expired AS (
+                        SELECT id FROM stock_reservations
+                        WHERE status = 'held' AND expires_at < NOW()
+                        ORDER BY expires_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE stock_reservations AS r SET status = 'released'
+                    FROM expired WHERE r.id = expired.id
+                    RETURNING r.product_id, r.quantity
+                    """,
+                    [batch_size]
+                )
+                released = self._restock_rows(cursor.fetchall())
+            total += released
+            if released < batch_size:
+                return total
+
+    def _restock_rows(self, rows) -> int:
+        quantities = Counter()
+        for product_id, qty in rows:
+            quantities[product_id] += qty
+        self.restock(quantities)
+        return len(rows)
@@ -0,0 +1,114 @@
+"""
+Перенос старых завершенных заказов в архивные таблицы.
+
+Заказы со статусами delivered/cancelled старше заданной даты переносятся
+вместе с позициями в orders_archive и order_items_archive пачками по
+batch_size: каждая пачка — одна транзакция с DELETE ... RETURNING, вставка
+в архив в том же запросе. Между пачками делается пауза, чтобы не занимать
+базу надолго. Сводка продаж sales_summary не меняется: выручка архивных
+заказов остается в истории (rebuild учитывает и архив).
+"""
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from django.db import connection, transaction
+
+from .ChangeFeed import notify_reload, suppress_notifications
+from .models import Order, OrderItem
+
+
+# Статусы, с которыми заказ больше не меняется
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+
+def _columns(model) -> str:
+    return ", ".join(field.column for field in model._meta.concrete_fields)
+
+
+class OrderArchiver:
+    """Пакетный перенос заказов в архив"""
+
+    def __init__(self, batch_size: int = 1000, pause: float = 0.2):
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def count(self, older_than: datetime, statuses: Iterable[str] = ARCHIVABLE_STATUSES) -> int:
+        """Сколько заказов будет перенесено"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM orders WHERE status = ANY(%s) AND order_date < %s",
+                [list(statuses), older_than]
+            )
+            return cursor.fetchone()[0]
+
+    @transaction.atomic
+    def archive_batch(self, older_than: datetime, statuses: Iterable[str] = ARCHIVABLE_STATUSES) -> Dict[str, int]:
+        """Перенос одной пачки; возвращает {'orders': ..., 'items': ...}"""
+        statuses = [status for status in statuses if status in ARCHIVABLE_STATUSES]
+        order_columns = _columns(Order)
+        item_columns = _columns(OrderItem)
+        with connection.cursor() as cursor:
+            suppress_notifications(cursor)
+            # Заказы, которые сейчас меняет кто-то другой, пропускаются (SKIP LOCKED)
+            cursor.execute(
+                f"""
+                WITH batch AS (
+                    SELECT id, order_date FROM orders
+                    WHERE status = ANY(%s) AND order_date < %s
+                    ORDER BY order_date, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ),
+                moved_items AS (
+                    DELETE FROM order_items oi USING batch b
+                    WHERE oi.order_id = b.id AND oi.order_date = b.order_date
+                    RETURNING oi.*
+                ),
+                archived_items AS (
+                    INSERT INTO order_items_archive ({item_columns})
+                    SELECT {item_columns} FROM moved_items
+                    RETURNING 1
+                ),
+                moved_orders AS (
+                    DELETE FROM orders o USING batch b
+                    WHERE o.id = b.id AND o.order_date = b.order_date
+                    RETURNING o.*
+                ),
+                archived_orders AS (
+                    INSERT INTO orders_archive ({order_columns})
+                    SELECT {order_columns} FROM moved_orders
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM archived_orders), (SELECT COUNT(*) FROM archived_items)
+                """,
+                [statuses, older_than, self.batch_size]
+            )
+            orders, items = cursor.fetchone()
+            if orders:
+                notify_reload(cursor, 'orders')
+        return {'orders': orders, 'items': items}
+
+    def archive(self, older_than: datetime, statuses: Iterable[str] = ARCHIVABLE_STATUSES,
+                max_batches: Optional[int] = None,
+                on_batch: Optional[Callable[[int, Dict[str, int]], None]] = None) -> Dict[str, int]:
+        """
+        Перенос пачками, пока есть подходящие заказы (или max_batches пачек).
+
+        После каждой пачки вызывается on_batch(номер, итоги) и делается пауза pause.
+        """
+        statuses = list(statuses)
+        totals = {'orders': 0, 'items': 0, 'batches': 0}
+        while max_batches is None or totals['batches'] < max_batches:
+            moved = self.archive_batch(older_than, statuses)
+            if not moved['orders']:
+                break
+            totals['orders'] += moved['orders']
+            totals['items'] += moved['items']
+            totals['batches'] += 1
+            if on_batch:
+                on_batch(totals['batches'], dict(totals))
+            if moved['orders'] < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return totals
@@ -0,0 +1,282 @@
+"""
+Загрузка заказов из внешних систем (команда manage.py ingest_orders).
+
+Файл CSV/JSONL делится по покупателям на шарды (customer_id % shards):
+заказы покупателя попадают в один шард и записываются в порядке файла.
+Шарды обрабатываются параллельно в отдельных процессах, у каждого свое
+соединение. Заказы пишутся пачками без create_order: одна транзакция на
+batch_size заказов — INSERT заказов и позиций, сводка продаж и отметка
+прогресса шарда (ingest_checkpoints). Отметка фиксируется вместе с пачкой,
+поэтому прерванная загрузка продолжается с первой незаписанной записи.
+
+Загружаются уже состоявшиеся заказы: остатки товаров не списываются.
+
+Запись JSONL:
+  {"customer_id": 1, "items": [{"product_id": 5, "quantity": 2, "unit_price": "99.90"}],
+   "order_date": "2024-03-01T12:00:00+03:00", "status": "delivered", "notes": ""}
+В CSV колонка items — "product_id:количество[:цена]" через ";". Без unit_price
+берется текущая цена товара, без order_date — текущее время, без status — pending.
+"""
+import json
+import os
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.db import DataError, IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .BulkImporter import detect_format, read_records
+from .ChangeFeed import suppress_notifications
+from .SalesRollup import SalesRollup
+from .models import Customer, IngestCheckpoint, Order, OrderItem, Product
+
+STATUSES = {status for status, _ in Order.STATUS_CHOICES}
+
+
+def _parse_item(item) -> List[Any]:
+    """Позиция заказа: [product_id, количество, цена или None]"""
+    if isinstance(item, str):
+        parts = [part.strip() for part in item.split(':')]
+        if len(parts) not in (2, 3):
+            raise ValueError(f"items: ожидается product_id:количество[:цена], получено «{item}»")
+        item = dict(zip(['product_id', 'quantity', 'unit_price'], parts))
+    if not isinstance(item, dict):
+        raise ValueError("items: позиция должна быть объектом")
+    try:
+        product_id = int(item.get('product_id'))
+        quantity = int(item.get('quantity'))
+    except (TypeError, ValueError):
+        raise ValueError("items: product_id и quantity должны быть целыми числами")
+    if quantity <= 0:
+        raise ValueError(f"items: количество товара {product_id} должно быть больше нуля")
+    price = item.get('unit_price')
+    if price is not None and price != '':
+        try:
+            price = Decimal(str(price))
+        except InvalidOperation:
+            raise ValueError(f"items: некорректная цена товара {product_id}")
+        if not price.is_finite() or price < 0:
+            raise ValueError(f"items: некорректная цена товара {product_id}")
+        price = str(price)
+    else:
+        price = None
+    return [product_id, quantity, price]
+
+
+def _parse_order_date(value) -> Optional[datetime]:
+    if value is None or str(value).strip() == '':
+        return None
+    text = str(value).strip()
+    parsed = parse_datetime(text)
+    if parsed is None:
+        day = parse_date(text)
+        if day is None:
+            raise ValueError(f"order_date: некорректная дата «{text}»")
+        parsed = datetime.combine(day, time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_order(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Проверка и приведение записи заказа; ValueError с причиной отказа"""
+    if '__error__' in record:
+        raise ValueError(record['__error__'])
+    try:
+        customer_id = int(record.get('customer_id'))
+    except (TypeError, ValueError):
+        raise ValueError("customer_id: ожидается целое число")
+
+    items = record.get('items')
+    if isinstance(items, str):
+        items = [part for part in items.split(';') if part.strip()]
+    if not isinstance(items, list) or not items:
+        raise ValueError("items: в заказе нет позиций")
+
+    status = str(record.get('status') or 'pending').strip()
+    if status not in STATUSES:
+        raise ValueError(f"status: неизвестный статус «{status}»")
+    # Товар входит в заказ одной позицией (уникальность в order_items): повторы складываются
+    merged: Dict[int, List[Any]] = {}
+    for product_id, quantity, price in (_parse_item(item) for item in items):
+        if product_id not in merged:
+            merged[product_id] = [product_id, quantity, price]
+        elif merged[product_id][2] != price:
+            raise ValueError(f"items: товар {product_id} указан несколько раз с разной ценой")
+        else:
+            merged[product_id][1] += quantity
+
+    order_date = _parse_order_date(record.get('order_date'))
+    return {
+        'customer_id': customer_id,
+        'items': list(merged.values()),
+        'order_date': order_date.isoformat() if order_date else None,
+        'status': status,
+        'notes': str(record.get('notes') or ''),
+    }
+
+
+def split_orders(path: str, shards: int, directory: str, file_format: Optional[str] = None,
+                 on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, Any]:
+    """
+    Разбиение файла на shards файлов JSONL в directory.
+
+    Возвращает пути и число записей шардов ('paths', 'counts'), счетчики
+    'read'/'rejected' и границы дат заказов 'first_date'/'last_date'.
+    """
+    on_reject = on_reject or (lambda line_no, reason: None)
+    paths = [os.path.join(directory, f"shard_{shard:04d}.jsonl") for shard in range(shards)]
+    files = [open(shard_path, 'w', encoding='utf-8') for shard_path in paths]
+    stats = {'paths': paths, 'counts': [0] * shards, 'read': 0, 'rejected': 0,
+             'first_date': None, 'last_date': None}
+    try:
+        for line_no, record in read_records(path, file_format or detect_format(path)):
+            stats['read'] += 1
+            try:
+                order = parse_order(record)
+            except ValueError as e:
+                stats['rejected'] += 1
+                on_reject(line_no, str(e))
+                continue
+            shard = order['customer_id'] % shards
+            files[shard].write(json.dumps([line_no, order], ensure_ascii=False) + '\n')
+            stats['counts'][shard] += 1
+            if order['order_date']:
+                order_date = datetime.fromisoformat(order['order_date'])
+                if stats['first_date'] is None or order_date < stats['first_date']:
+                    stats['first_date'] = order_date
+                if stats['last_date'] is None or order_date > stats['last_date']:
+                    stats['last_date'] = order_date
+    finally:
+        for f in files:
+            f.close()
+    return stats
+
+
+class OrderIngest:
+    """Запись заказов шарда пачками с отметкой прогресса"""
+
+    def __init__(self, job: str, batch_size: int = 500):
+        self.job = job
+        self.batch_size = batch_size
+
+    def run_shard(self, shard: int, path: str,
+                  on_batch: Optional[Callable[[Dict[str, int]], None]] = None,
+                  on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+        """
+        Загрузка файла шарда с отметки прогресса; возвращает счетчики
+        orders/items/rejected этого запуска
+        """
+        on_reject = on_reject or (lambda line_no, reason: None)
+        position = IngestCheckpoint.objects.get(job=self.job, shard=shard).position
+        totals = {'orders': 0, 'items': 0, 'rejected': 0}
+        with open(path, encoding='utf-8') as f:
+            records = (json.loads(line) for line in islice(f, position, None))
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                try:
+                    results = [self.write_batch(shard, batch)]
+                except (DataError, IntegrityError):
+                    # Пачка откатилась целиком: по одной записи, чтобы отклонить только ошибочные
+                    results = [self._write_single(shard, record) for record in batch]
+
+                for stats, rejects in results:
+                    for line_no, reason in rejects:
+                        on_reject(line_no, reason)
+                    for key in totals:
+                        totals[key] += stats[key]
+                    if on_batch:
+                        on_batch(stats)
+        return totals
+
+    def _write_single(self, shard: int, record) -> Tuple[Dict[str, int], List[Tuple[int, str]]]:
+        try:
+            return self.write_batch(shard, [record])
+        except (DataError, IntegrityError) as e:
+            line_no = record[0]
+            self._advance(shard, 1, 0, 0, 1)
+            return {'orders': 0, 'items': 0, 'rejected': 1}, [(line_no, str(e).strip())]
+
+    @transaction.atomic
+    def write_batch(self, shard: int, batch: List[list]) -> Tuple[Dict[str, int], List[Tuple[int, str]]]:
+        """
+        Запись пачки [номер строки, заказ] одной транзакцией вместе с отметкой;
+        возвращает счетчики и отклоненные записи (номер строки, причина)
+        """
+        customers = set(Customer.objects.filter(
+            id__in={order['customer_id'] for _, order in batch}
+        ).values_list('id', flat=True))
+        prices = dict(Product.objects.filter(
+            id__in={item[0] for _, order in batch for item in order['items']}
+        ).values_list('id', 'price'))
+
+        now = timezone.now()
+        orders, lines, rejects = [], [], []
+        for line_no, record in batch:
+            if record['customer_id'] not in customers:
+                rejects.append((line_no, f"покупатель {record['customer_id']} не найден"))
+                continue
+            missing = [item[0] for item in record['items'] if item[0] not in prices]
+            if missing:
+                rejects.append((line_no, f"товары не найдены: {missing}"))
+                continue
+            items = [(product_id, quantity, Decimal(price) if price is not None else prices[product_id])
+                     for product_id, quantity, price in record['items']]
+            orders.append(Order(
+                customer_id=record['customer_id'],
+                order_date=datetime.fromisoformat(record['order_date']) if record['order_date'] else now,
+                status=record['status'],
+                notes=record['notes'],
+                total_amount=sum(price * quantity for _, quantity, price in items),
+            ))
+            lines.append(items)
+
+        with connection.cursor() as cursor:
+            # Перезагрузку таблицы заказов команда объявляет один раз в конце
+            suppress_notifications(cursor)
+        Order.objects.bulk_create(orders)
+        order_items = [
+            OrderItem(order=order, order_date=order.order_date, product_id=product_id, quantity=quantity,
+                      unit_price=price, total_price=price * quantity)
+            for order, items in zip(orders, lines)
+            for product_id, quantity, price in items
+        ]
+        OrderItem.objects.bulk_create(order_items)
+        SalesRollup().apply_orders([order.id for order in orders])
+
+        stats = {'orders': len(orders), 'items': len(order_items), 'rejected': len(rejects)}
+        self._advance(shard, len(batch), stats['orders'], stats['items'], stats['rejected'])
+        return stats, rejects
+
+    def _advance(self, shard: int, records: int, orders: int, items: int, rejected: int):
+        IngestCheckpoint.objects.filter(job=self.job, shard=shard).update(
+            position=F('position') + records,
+            orders=F('orders') + orders,
+            items=F('items') + items,
+            rejected=F('rejected') + rejected,
+        )
+
+
+def ingest_shard(job: str, shard: int, path: str, batch_size: int = 500, events=None) -> Dict[str, int]:
+    """
+    Загрузка шарда в процессе пула. В очередь events (если задана) идут
+    ('batch', shard, счетчики) после каждой пачки и ('reject', номер строки, причина).
+    """
+    def on_batch(stats):
+        events.put(('batch', shard, stats))
+
+    def on_reject(line_no, reason):
+        events.put(('reject', line_no, reason))
+
+    try:
+        return OrderIngest(job, batch_size).run_shard(
+            shard, path, on_batch if events is not None else None, on_reject if events is not None else None
+        )
+    finally:
+        connections.close_all()
@@ -0,0 +1,139 @@
+"""
+Очередь приема заказов с групповой фиксацией.
+
+Каждый вызов create_order — отдельная транзакция, и на пике приема заказов
+время уходит в основном на сброс журнала (fsync) при каждом COMMIT.
+Здесь заказы ставятся в очередь, а рабочий поток собирает их в пачку
+(до max_batch заказов или max_wait секунд после первого) и записывает
+одной транзакцией. Каждый заказ пачки выполняется в своей точке
+сохранения (вложенный transaction.atomic в create_order): ошибочный заказ
+откатывается, не затрагивая остальные. Результат заказа (Order или None,
+если заказ отклонен) приходит через Future после фиксации пачки.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+
+class OrderIntakeQueue:
+    """Рабочий поток, записывающий заказы пачками в одной транзакции"""
+
+    def __init__(self, handler=None, max_batch: Optional[int] = None, max_wait: Optional[float] = None,
+                 name: str = 'order-intake'):
+        if handler is None:
+            from .PostgreSQLHandler import PostgreSQLHandler
+            handler = PostgreSQLHandler()
+        self.handler = handler
+        self.max_batch = max_batch or getattr(settings, 'ORDER_INTAKE_MAX_BATCH', 50)
+        self.max_wait = max_wait if max_wait is not None else getattr(settings, 'ORDER_INTAKE_MAX_WAIT_MS', 5) / 1000
+        self._orders: queue.Queue = queue.Queue()
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, customer_id: int, items: List[Dict[str, Any]], notes: str = "",
+               reservation_ids: Optional[List[int]] = None) -> Future:
+        """
+        Постановка заказа в очередь; аргументы — как у create_order.
+
+        Future дает Order после фиксации пачки или None, если заказ
+        отклонен; при сбое всей транзакции — ее исключение.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Очередь приема заказов уже остановлена")
+            self._orders.put((future, (customer_id, items, notes, reservation_ids)))
+        return future
+
+    def _collect(self, first) -> list:
+        """Добор пачки за max_wait после первого заказа; None в пачке — сигнал остановки"""
+        batch = [first]
+        if first is None:
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                order = self._orders.get(timeout=timeout) if timeout > 0 else self._orders.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(order)
+            if order is None:
+                break
+        return batch
+
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            batch = self._collect(self._orders.get())
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+            batch = [(future, args) for future, args in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                close_old_connections()
+                try:
+                    self._write(batch)
+                finally:
+                    close_old_connections()
+        connections.close_all()
+
+    def _write(self, batch: list):
+        results = []
+        try:
+            with transaction.atomic():
+                for future, args in batch:
+                    try:
+                        results.append((future, self.handler.create_order(*args), None))
+                    except Exception as e:
+                        # Точка сохранения заказа уже откачена atomic
+                        results.append((future, None, e))
+        except BaseException as e:
+            for future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for future, order, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(order)
+
+    def shutdown(self, wait: bool = True):
+        """Остановка: заказы, уже стоящие в очереди, записываются, соединение закрывается"""
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            self._orders.put(None)
+        if wait:
+            self._thread.join()
+
+
+_intake: Optional[OrderIntakeQueue] = None
+_intake_lock = threading.Lock()
+
+
+def get_order_intake() -> OrderIntakeQueue:
+    """Общая очередь приема заказов (создается при первом обращении)"""
+    global _intake
+    with _intake_lock:
+        if _intake is None:
+            _intake = OrderIntakeQueue()
+        return _intake
+
+
+def shutdown_order_intake(wait: bool = True):
+    """Остановка общей очереди (при выходе из приложения)"""
+    global _intake
+    with _intake_lock:
+        intake, _intake = _intake, None
+    if intake is not None:
+        intake.shutdown(wait)
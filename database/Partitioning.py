@@ -0,0 +1,240 @@
+"""
+Помесячное секционирование заказов (orders) и их позиций (order_items) по order_date.
+
+Секция на каждый календарный месяц в часовом поясе приложения
+(orders_p2026_01, order_items_p2026_01 ...) и секция по умолчанию (*_default)
+для строк вне созданных месяцев. Первичные ключи секционированных таблиц
+включают order_date, поэтому позиции ссылаются на заказ парой
+(order_id, order_date). Преобразование таблиц выполняет миграция
+0007_partition_orders, будущие секции создает ensure_partitions
+(при запуске приложения и командой manage.py ensure_partitions).
+"""
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+PARTITIONED_TABLES = ['orders', 'order_items']
+
+# Ссылка позиций на заказ в секционированной схеме
+ORDER_ITEMS_ORDER_FK = 'order_items_order_fk'
+
+
+def month_start(value: date) -> date:
+    """Первое число месяца"""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """Первое число месяца через months месяцев"""
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def partition_bounds(month: date) -> Tuple[datetime, datetime]:
+    """Границы секции месяца: полночь первого числа в часовом поясе приложения"""
+    tz = ZoneInfo(settings.TIME_ZONE)
+    start = datetime(month.year, month.month, 1, tzinfo=tz)
+    end_month = add_months(month, 1)
+    return start, datetime(end_month.year, end_month.month, 1, tzinfo=tz)
+
+
+def is_partitioned(cursor, table: str = 'orders') -> bool:
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)",
+        [table]
+    )
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def list_partitions(cursor, table: str) -> List[Tuple[str, str, int]]:
+    """Секции таблицы: (имя, границы, оценка числа строк)"""
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+        """,
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def _create_partition(cursor, table: str, month: date):
+    start, end = partition_bounds(month)
+    cursor.execute(
+        f"CREATE TABLE {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM (%s) TO (%s)",
+        [start, end]
+    )
+
+
+def ensure_partitions(months_ahead: int = 3, today: Optional[date] = None) -> List[str]:
+    """
+    Создание недостающих секций с текущего месяца на months_ahead вперед.
+
+    Если в секции по умолчанию уже есть строки за месяц, секция не создается
+    (PostgreSQL не даст ее присоединить) — выводится предупреждение.
+    Возвращает имена созданных секций.
+    """
+    created = []
+    first = month_start(today or datetime.now(ZoneInfo(settings.TIME_ZONE)).date())
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            _ensure_partitions(cursor, first, months_ahead, created)
+    except Exception as e:
+        print(f"❌ Ошибка создания секций заказов: {e}")
+        return []
+    return created
+
+
+def _ensure_partitions(cursor, first: date, months_ahead: int, created: List[str]):
+    if not is_partitioned(cursor):
+        return
+    existing = {name for table in PARTITIONED_TABLES for name, _, _ in list_partitions(cursor, table)}
+    for offset in range(months_ahead + 1):
+        month = add_months(first, offset)
+        missing = [table for table in PARTITIONED_TABLES if partition_name(table, month) not in existing]
+        if not missing:
+            continue
+        start, end = partition_bounds(month)
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM orders_default WHERE order_date >= %s AND order_date < %s)",
+            [start, end]
+        )
+        if cursor.fetchone()[0]:
+            print(f"⚠️ В orders_default есть заказы за {month:%Y-%m} — секция месяца не создана")
+            continue
+        for table in missing:
+            _create_partition(cursor, table, month)
+            created.append(partition_name(table, month))
+
+
+def _table_definitions(cursor, table: str):
+    """Индексы (не ограничения) и ограничения PRIMARY KEY/UNIQUE/FOREIGN KEY таблицы"""
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(i.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)
+        ORDER BY i.relname
+        """,
+        [table]
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f') AND conparentid = 0
+        ORDER BY contype DESC, conname
+        """,
+        [table]
+    )
+    return indexes, cursor.fetchall()
+
+
+def _rebuild_tables(cursor, partitioned: bool, months_ahead: int):
+    """
+    Пересоздание orders и order_items секционированными (или обычными) с переносом данных.
+
+    Ссылка order_items → orders по одному order_id в модели отключена
+    (db_constraint=False): в секционированной схеме ее заменяет составной
+    ключ ORDER_ITEMS_ORDER_FK, в обычной — внешний ключ, который Django
+    восстанавливает при откате миграции.
+    """
+    definitions = {table: _table_definitions(cursor, table) for table in PARTITIONED_TABLES}
+
+    # Сначала внешние ключи (позиции ссылаются на заказы), затем остальное
+    for table in reversed(PARTITIONED_TABLES):
+        for name, contype, _ in definitions[table][1]:
+            if contype == 'f':
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+    for table in PARTITIONED_TABLES:
+        for name, contype, _ in definitions[table][1]:
+            if contype != 'f':
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+        for name, _ in definitions[table][0]:
+            cursor.execute(f'DROP INDEX "{name}"')
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        cursor.execute(
+            f"CREATE TABLE {table} (LIKE {table}_legacy INCLUDING DEFAULTS INCLUDING IDENTITY "
+            f"INCLUDING CONSTRAINTS){' PARTITION BY RANGE (order_date)' if partitioned else ''}"
+        )
+
+    if partitioned:
+        cursor.execute("SELECT MIN(order_date) FROM orders_legacy")
+        oldest = cursor.fetchone()[0]
+        today = datetime.now(ZoneInfo(settings.TIME_ZONE)).date()
+        month = month_start(oldest.astimezone(ZoneInfo(settings.TIME_ZONE)).date() if oldest else today)
+        last = add_months(month_start(today), months_ahead)
+        while month <= last:
+            for table in PARTITIONED_TABLES:
+                _create_partition(cursor, table, month)
+            month = add_months(month, 1)
+        for table in PARTITIONED_TABLES:
+            cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    for table in PARTITIONED_TABLES:
+        cursor.execute(f"INSERT INTO {table} OVERRIDING SYSTEM VALUE SELECT * FROM {table}_legacy")
+    for table in reversed(PARTITIONED_TABLES):
+        cursor.execute(f"DROP TABLE {table}_legacy")
+
+    for table in PARTITIONED_TABLES:
+        # Последовательность новой identity-колонки продолжает старые id
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)", [sequence])
+        if sequence.split('.')[-1] != f"{table}_id_seq":
+            cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {table}_id_seq")
+
+        key = 'id, order_date' if partitioned else 'id'
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({key})")
+        indexes, constraints = definitions[table]
+        for name, contype, definition in constraints:
+            if contype == 'u':
+                # Уникальность в секционированной таблице должна включать ключ секционирования
+                columns = definition[definition.index('(') + 1:definition.rindex(')')]
+                columns = [column.strip() for column in columns.split(',') if column.strip() != 'order_date']
+                if partitioned:
+                    columns.append('order_date')
+                cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" UNIQUE ({", ".join(columns)})')
+            elif contype == 'f' and 'REFERENCES orders(' not in definition:
+                cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+        for _, definition in indexes:
+            cursor.execute(definition)
+
+    if partitioned:
+        cursor.execute(
+            f"""
+            ALTER TABLE order_items ADD CONSTRAINT {ORDER_ITEMS_ORDER_FK}
+            FOREIGN KEY (order_id, order_date) REFERENCES orders (id, order_date)
+            ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED
+            """
+        )
+    for table in PARTITIONED_TABLES:
+        cursor.execute(f"ANALYZE {table}")
+
+
+def partition_tables(cursor, months_ahead: int = 3):
+    """Преобразование orders и order_items в секционированные таблицы"""
+    if not is_partitioned(cursor):
+        _rebuild_tables(cursor, partitioned=True, months_ahead=months_ahead)
+
+
+def unpartition_tables(cursor):
+    """Обратное преобразование в обычные таблицы"""
+    if is_partitioned(cursor):
+        _rebuild_tables(cursor, partitioned=False, months_ahead=0)
@@ -3,13 +3,24 @@
 """
 import os
 import sys
+import copy
+import gzip
+import time
 import django
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from collections import Counter
+from concurrent.futures import Future
+from typing import List, Optional, Dict, Any, Callable, Iterable, Iterator, Tuple
+import psycopg2
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction, connection
+from django.utils import timezone
 from django.db.utils import OperationalError, IntegrityError, ProgrammingError
 
+from .QueryProfiler import profiler, instrument
+from .CatalogCache import CatalogCache
+
 # Добавляем текущую директорию в путь Python
 current_dir = Path(__file__).parent.parent
 sys.path.append(str(current_dir))
@@ -19,30 +30,82 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config')
 
 try:
     django.setup()
-    from .models import Customer, Product, Order, OrderItem
+    from .models import Customer, Product, Order, OrderItem, StockStripe
+    from .BulkImporter import BulkImporter
+    from .SalesRollup import SalesRollup
+    from .SalesReports import SalesReports, REPORTS, ORDERS_SOURCE, ITEMS_SOURCE
+    from .Inventory import Inventory
+    from .DatabaseExecutor import get_executor
+    from .OrderIntake import get_order_intake
     from django.db import models as django_models
     DJANGO_SETUP = True
 except Exception as e:
     print(f"❌ Ошибка настройки Django: {e}")
     DJANGO_SETUP = False
-    Customer = Product = Order = OrderItem = None
+    Customer = Product = Order = OrderItem = StockStripe = None
+    BulkImporter = SalesRollup = SalesReports = Inventory = get_executor = get_order_intake = None
+    REPORTS = {}
+    ORDERS_SOURCE = ITEMS_SOURCE = None
     django_models = None
 
 
 class PostgreSQLHandler:
     """Класс для работы с PostgreSQL через Django ORM"""
 
+    # Время жизни кэша статистики (секунды). Кэш общий для всех экземпляров
+    # и сбрасывается методами записи этого класса.
+    STATS_TTL = 30
+    _stats_cache: Dict[tuple, Tuple[float, Dict[str, Any]]] = {}
+
+    # Поля поиска клиентов; наличие pg_trgm определяется при первом поиске
+    SEARCH_FIELDS = ['first_name', 'last_name', 'email', 'phone']
+    _trigram_available: Optional[bool] = None
+
+    # Результат проверки соединения кэшируется на HEALTH_TTL секунд: ее вызывают
+    # запуск, конструктор и строка статуса окна
+    HEALTH_TTL = 30
+    _health: Optional[Tuple[float, bool]] = None
+
+    # Каталог товаров (по категории и признаку активности) кэшируется в памяти
+    # процесса; сбрасывается при создании товаров, заказов и импорте.
+    # Остатки на складе в кэше могут устареть — свежие дает get_stock
+    _catalog = CatalogCache(max_entries=32, ttl=300)
+
+    # get_changes_since: больше стольких изменений — таблицу дешевле перечитать;
+    # записи об удалениях хранятся столько дней (более старая отметка — полная перезагрузка)
+    DELTA_LIMIT = 5000
+    TOMBSTONE_RETENTION_DAYS = 7
+    # Запас отметки: время строки берется триггером чуть раньше, чем транзакция
+    # получает xid и становится видна как пишущая (секунды)
+    WATERMARK_SLACK = 1
+
+    # Сортировки get_low_stock_products: имя — поля ключа (последнее — id для однозначности)
+    LOW_STOCK_ORDERINGS = {
+        'quantity': ['stock', 'id'],
+        'name': ['name', 'id'],
+        'category': ['category', 'stock', 'id'],
+    }
+
     def __init__(self):
         if not DJANGO_SETUP:
             print("❌ Django не настроен. Проверьте настройки.")
             return
         self.check_connection()
 
-    def check_connection(self) -> bool:
-        """Проверка соединения с базой данных"""
+    def check_connection(self, force: bool = False) -> bool:
+        """Проверка соединения с базой данных (force — в обход кэша)"""
         if not DJANGO_SETUP:
             return False
 
+        cached = PostgreSQLHandler._health
+        if not force and cached is not None and time.monotonic() - cached[0] < self.HEALTH_TTL:
+            return cached[1]
+
+        healthy = self._ping()
+        PostgreSQLHandler._health = (time.monotonic(), healthy)
+        return healthy
+
+    def _ping(self) -> bool:
         try:
             with connection.cursor() as cursor:
                 cursor.execute("SELECT version();")
@@ -61,6 +124,19 @@ class PostgreSQLHandler:
             print(f"❌ Неожиданная ошибка при подключении: {e}")
             return False
 
+    def run_in_background(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Выполнение fn в общем пуле фоновых потоков БД.
+
+        Потоки и их соединения переиспользуются, поэтому частые обновления
+        не открывают новых соединений; размер пула — DB_POOL_SIZE.
+        """
+        if not DJANGO_SETUP:
+            future = Future()
+            future.set_exception(RuntimeError("Django не настроен"))
+            return future
+        return get_executor().submit(fn, *args, **kwargs)
+
     @transaction.atomic
     def create_customer(self, **kwargs) -> Optional[Customer]:
         """Создание нового клиента"""
@@ -69,6 +145,7 @@ class PostgreSQLHandler:
 
         try:
             customer = Customer.objects.create(**kwargs)
+            transaction.on_commit(self.invalidate_stats_cache)
             print(f"✅ Клиент создан: {customer}")
             return customer
         except IntegrityError as e:
@@ -92,20 +169,88 @@ class PostgreSQLHandler:
             print(f"❌ Неожиданная ошибка при получении клиента: {e}")
             return None
 
-    def get_customers_by_name(self, name: str) -> List[Customer]:
-        """Поиск клиентов по имени"""
+    def get_customers_by_name(self, name: str, limit: int = 50) -> List[Customer]:
+        """Поиск клиентов по имени (а также email и телефону, см. search_customers)"""
+        return self.search_customers(name, limit)
+
+    def search_customers(self, query: str, limit: int = 50) -> List[Customer]:
+        """
+        Поиск клиентов по подстроке в имени, фамилии, email и телефоне.
+
+        Каждое слово запроса должно встретиться хотя бы в одном поле. При
+        наличии pg_trgm условия ILIKE обслуживаются GIN-индексами, а результаты
+        ранжируются по strict_word_similarity; без расширения — поиск через ORM.
+        """
         if not DJANGO_SETUP:
             return []
 
+        words = query.split()
+        if not words:
+            return []
+
         try:
-            return list(Customer.objects.filter(
-                django_models.Q(first_name__icontains=name) |
-                django_models.Q(last_name__icontains=name)
-            ))
+            if self._has_trigram():
+                return self._search_customers_trigram(query, words, limit)
+            return self._search_customers_orm(words, limit)
         except Exception as e:
             print(f"❌ Ошибка при поиске клиентов: {e}")
             return []
 
+    @classmethod
+    def _has_trigram(cls) -> bool:
+        """Установлено ли расширение pg_trgm (проверяется один раз)"""
+        if cls._trigram_available is None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                cls._trigram_available = cursor.fetchone() is not None
+        return cls._trigram_available
+
+    def _search_customers_trigram(self, query: str, words: List[str], limit: int) -> List[Customer]:
+        """Поиск по триграммным индексам с ранжированием по сходству"""
+        conditions = []
+        params: List[Any] = [query]
+        for word in words:
+            pattern = '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append('(' + ' OR '.join(f"{field} ILIKE %s" for field in self.SEARCH_FIELDS) + ')')
+            params.extend([pattern] * len(self.SEARCH_FIELDS))
+        params.append(limit)
+        return list(Customer.objects.raw(
+            f"""
+            SELECT *, strict_word_similarity(%s::text, concat_ws(' ', first_name, last_name, email, phone)) AS rank
+            FROM customers
+            WHERE {' AND '.join(conditions)}
+            ORDER BY rank DESC, last_name, first_name, id
+            LIMIT %s
+            """,
+            params
+        ))
+
+    def _search_customers_orm(self, words: List[str], limit: int) -> List[Customer]:
+        """Запасной поиск без pg_trgm: icontains по всем полям, точные совпадения выше"""
+        queryset = Customer.objects.all()
+        for word in words:
+            condition = django_models.Q()
+            for field in self.SEARCH_FIELDS:
+                condition |= django_models.Q(**{f"{field}__icontains": word})
+            queryset = queryset.filter(condition)
+
+        first = words[0]
+        rank = django_models.Case(
+            django_models.When(
+                django_models.Q(last_name__iexact=first) | django_models.Q(first_name__iexact=first) |
+                django_models.Q(email__iexact=first) | django_models.Q(phone=first),
+                then=django_models.Value(2)
+            ),
+            django_models.When(
+                django_models.Q(last_name__istartswith=first) | django_models.Q(first_name__istartswith=first) |
+                django_models.Q(email__istartswith=first) | django_models.Q(phone__startswith=first),
+                then=django_models.Value(1)
+            ),
+            default=django_models.Value(0),
+            output_field=django_models.IntegerField()
+        )
+        return list(queryset.annotate(rank=rank).order_by('-rank', 'last_name', 'first_name', 'id')[:limit])
+
     @transaction.atomic
     def create_product(self, **kwargs) -> Optional[Product]:
         """Создание нового товара"""
@@ -114,6 +259,8 @@ class PostgreSQLHandler:
 
         try:
             product = Product.objects.create(**kwargs)
+            transaction.on_commit(self.invalidate_stats_cache)
+            transaction.on_commit(self.invalidate_catalog_cache)
             print(f"✅ Товар создан: {product}")
             return product
         except IntegrityError as e:
@@ -124,31 +271,277 @@ class PostgreSQLHandler:
             return None
 
     def get_products_by_category(self, category: str) -> List[Product]:
-        """Получение товаров по категории"""
+        """Получение товаров по категории (из кэша каталога)"""
+        return self.get_catalog(category)
+
+    def get_catalog(self, category: Optional[str] = None, active_only: bool = True) -> List[Product]:
+        """
+        Товары каталога по категории (None — все категории) из кэша в памяти.
+
+        Возвращаются копии: изменения объектов вызывающим кодом не попадают в кэш.
+        """
         if not DJANGO_SETUP:
             return []
 
+        def load():
+            queryset = Product.objects.order_by('name', 'id')
+            if category is not None:
+                queryset = queryset.filter(category=category)
+            if active_only:
+                queryset = queryset.filter(is_active=True)
+            return Inventory.apply_stock(list(Inventory.annotate_stock(queryset)))
+
         try:
-            return list(Product.objects.filter(category=category, is_active=True))
+            return [copy.copy(product) for product in self._catalog.get_or_load((category, active_only), load)]
         except Exception as e:
             print(f"❌ Ошибка при получении товаров: {e}")
             return []
 
-    def get_low_stock_products(self, threshold: int = 10) -> List[Product]:
-        """Получение товаров с низким запасом"""
+    def get_stock(self, product_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """Текущие остатки товаров из базы (None — все активные товары)"""
+        if not DJANGO_SETUP:
+            return {}
+
+        try:
+            queryset = Product.objects.filter(is_active=True)
+            if product_ids is not None:
+                product_ids = list(product_ids)
+                queryset = Product.objects.filter(id__in=product_ids)
+            stock = dict(queryset.values_list('id', 'quantity'))
+            # У товаров с полосами остаток — сумма полос
+            striped = Inventory().striped_totals(product_ids)
+            stock.update((product_id, total) for product_id, total in striped.items() if product_id in stock)
+            return stock
+        except Exception as e:
+            print(f"❌ Ошибка при получении остатков: {e}")
+            return {}
+
+    def reserve_stock(self, items: List[Dict[str, Any]], ttl: Optional[float] = None) -> List[int]:
+        """
+        Резерв товаров [{'product_id', 'quantity'}] на ttl секунд (Inventory.RESERVATION_TTL);
+        возвращает id резервов для create_order или [] при нехватке
+        """
+        if not DJANGO_SETUP:
+            return []
+
+        try:
+            quantities = Counter()
+            for item in items:
+                quantities[item['product_id']] += item['quantity']
+            reservations = Inventory().reserve(dict(quantities), ttl)
+            transaction.on_commit(self.invalidate_catalog_cache)
+            return [reservation.id for reservation in reservations]
+        except ValueError as e:
+            print(f"❌ {e}")
+            return []
+        except Exception as e:
+            print(f"❌ Ошибка при резервировании товаров: {e}")
+            return []
+
+    def release_reservations(self, reservation_ids: Iterable[int]) -> int:
+        """Отмена резервов: товар возвращается на склад"""
+        if not DJANGO_SETUP:
+            return 0
+
+        try:
+            return Inventory().release_reservations(reservation_ids)
+        except Exception as e:
+            print(f"❌ Ошибка при отмене резервов: {e}")
+            return 0
+
+    def expire_reservations(self) -> int:
+        """Возврат на склад просроченных резервов"""
+        if not DJANGO_SETUP:
+            return 0
+
+        try:
+            return Inventory().expire_reservations()
+        except Exception as e:
+            print(f"❌ Ошибка при возврате просроченных резервов: {e}")
+            return 0
+
+    def stripe_product_stock(self, product_id: int, stripes: Optional[int] = None) -> Optional[int]:
+        """
+        Разнесение остатка популярного товара по полосам (повторный вызов —
+        перебалансировка); возвращает общий остаток
+        """
+        if not DJANGO_SETUP:
+            return None
+
+        try:
+            return Inventory().stripe(product_id, stripes)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return None
+        except Exception as e:
+            print(f"❌ Ошибка при разнесении остатка: {e}")
+            return None
+
+    def unstripe_product_stock(self, product_id: int) -> Optional[int]:
+        """Возврат остатка товара из полос в одну строку"""
+        if not DJANGO_SETUP:
+            return None
+
+        try:
+            return Inventory().unstripe(product_id)
+        except Exception as e:
+            print(f"❌ Ошибка при сборе остатка: {e}")
+            return None
+
+    def get_low_stock_products(self, threshold: Optional[int] = 10,
+                               category_thresholds: Optional[Dict[str, int]] = None,
+                               order_by: str = 'quantity', descending: bool = False,
+                               cursor: Optional[tuple] = None, limit: Optional[int] = None) -> List[Product]:
+        """
+        Активные товары с остатком ниже порога.
+
+        category_thresholds задает свой порог для категорий, threshold — для
+        остальных (None — только перечисленные категории). order_by — ключ
+        LOW_STOCK_ORDERINGS; страница — limit строк после cursor (значения
+        полей ключа у последней строки предыдущей страницы, keyset).
+        Остаток товара с полосами — сумма полос; остальные товары отбираются
+        и сортируются по частичному индексу products_active_quantity_idx.
+        """
         if not DJANGO_SETUP:
             return []
 
         try:
-            return list(Product.objects.filter(quantity__lt=threshold, is_active=True))
+            if order_by not in self.LOW_STOCK_ORDERINGS:
+                raise ValueError(f"Неизвестная сортировка: {order_by}")
+            branches = self._low_stock_querysets(threshold, category_thresholds)
+            key_fields = self.LOW_STOCK_ORDERINGS[order_by]
+            return Inventory.apply_stock(
+                self._keyset_page(branches, key_fields, cursor, limit, backward=False, descending=descending)
+            )
+        except ValueError as e:
+            print(f"❌ Ошибка параметров выборки остатков: {e}")
+            return []
         except Exception as e:
             print(f"❌ Ошибка при получении товаров: {e}")
             return []
 
+    def count_low_stock_products(self, threshold: Optional[int] = 10,
+                                 category_thresholds: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """Число товаров с низким запасом по категориям (index-only scan по частичному индексу и полосы)"""
+        if not DJANGO_SETUP:
+            return {}
+
+        try:
+            counts = Counter()
+            for queryset in self._low_stock_querysets(threshold, category_thresholds):
+                counts.update(dict(
+                    queryset.order_by().values_list('category').annotate(count=django_models.Count('id'))
+                ))
+            return dict(counts)
+        except Exception as e:
+            print(f"❌ Ошибка при подсчете товаров: {e}")
+            return {}
+
+    @staticmethod
+    def _low_stock_querysets(threshold: Optional[int], category_thresholds: Optional[Dict[str, int]]) -> tuple:
+        """
+        Товары с остатком (аннотация stock) ниже порога: без полос — по столбцам
+        частичного индекса по остатку, с полосами — по сумме полос
+        """
+        category_thresholds = category_thresholds or {}
+        if threshold is None and not category_thresholds:
+            raise ValueError("Не задан ни общий порог, ни пороги категорий")
+
+        # Порог строки — одно выражение CASE по категории: условие проверяется
+        # по столбцам индекса, без обращения к таблице
+        row_threshold = django_models.Case(
+            *(django_models.When(category=category, then=django_models.Value(limit))
+              for category, limit in category_thresholds.items()),
+            default=django_models.Value(threshold),
+            output_field=django_models.IntegerField()
+        )
+        # Общая верхняя граница остатка сужает просмотр индекса до диапазона
+        upper = max(list(category_thresholds.values()) + ([threshold] if threshold is not None else []))
+        striped_ids = StockStripe.objects.values('product_id')
+        plain = (Product.objects.filter(is_active=True, quantity__lt=upper).exclude(id__in=striped_ids)
+                 .annotate(stock=django_models.F('quantity')))
+        # products.quantity товара с полосами устаревает — условие по сумме полос
+        striped = Inventory.annotate_stock(Product.objects.filter(is_active=True, id__in=striped_ids))
+        return plain.filter(stock__lt=row_threshold), striped.filter(stock__lt=row_threshold)
+
+    def import_customers(self, path: str, file_format: Optional[str] = None,
+                         on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+        """Массовый импорт клиентов из CSV/JSONL через COPY"""
+        return self._import_file('customers', path, file_format, on_reject)
+
+    def import_products(self, path: str, file_format: Optional[str] = None,
+                        on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+        """Массовый импорт товаров из CSV/JSONL через COPY"""
+        return self._import_file('products', path, file_format, on_reject)
+
+    def _import_file(self, table: str, path: str, file_format: Optional[str],
+                     on_reject: Optional[Callable[[int, str], None]]) -> Dict[str, int]:
+        """Общая часть импорта: отклоненные строки передаются в on_reject(строка, причина)"""
+        if not DJANGO_SETUP:
+            return {}
+
+        try:
+            stats = BulkImporter(table).run(path, file_format, on_reject)
+            self.invalidate_stats_cache()
+            if table == 'products':
+                self.invalidate_catalog_cache()
+            print(f"✅ Импорт {table}: прочитано {stats['read']}, добавлено {stats['inserted']}, "
+                  f"отклонено {stats['rejected']}")
+            return stats
+        except (OSError, ValueError) as e:
+            print(f"❌ Ошибка чтения файла импорта: {e}")
+            return {}
+        except Exception as e:
+            print(f"❌ Неожиданная ошибка при импорте {table}: {e}")
+            return {}
+
+    def upsert_customers(self, rows: Iterable[Dict[str, Any]], update_fields: Optional[List[str]] = None,
+                         chunk_size: int = 1000,
+                         on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+        """Вставка или обновление клиентов по email"""
+        return self._upsert('customers', rows, update_fields, chunk_size, on_reject)
+
+    def upsert_products(self, rows: Iterable[Dict[str, Any]], update_fields: Optional[List[str]] = None,
+                        chunk_size: int = 1000,
+                        on_reject: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+        """Вставка или обновление товаров по артикулу"""
+        return self._upsert('products', rows, update_fields, chunk_size, on_reject)
+
+    def _upsert(self, table: str, rows: Iterable[Dict[str, Any]], update_fields: Optional[List[str]],
+                chunk_size: int, on_reject: Optional[Callable[[int, str], None]]) -> Dict[str, int]:
+        """
+        Общая часть upsert: счетчики inserted/updated/unchanged/rejected.
+
+        Отклоненные строки передаются в on_reject(строка, причина).
+        """
+        if not DJANGO_SETUP:
+            return {}
+
+        try:
+            stats = BulkImporter(table).upsert(rows, update_fields, chunk_size, on_reject)
+            self.invalidate_stats_cache()
+            if table == 'products':
+                self.invalidate_catalog_cache()
+            print(f"✅ Синхронизация {table}: добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+                  f"без изменений {stats['unchanged']}, отклонено {stats['rejected']}")
+            return stats
+        except ValueError as e:
+            print(f"❌ Ошибка параметров синхронизации: {e}")
+            return {}
+        except Exception as e:
+            print(f"❌ Неожиданная ошибка при синхронизации {table}: {e}")
+            return {}
+
     @transaction.atomic
     def create_order(self, customer_id: int, items: List[Dict[str, Any]],
-                    notes: str = "") -> Optional[Order]:
-        """Создание заказа с элементами"""
+                    notes: str = "", reservation_ids: Optional[List[int]] = None) -> Optional[Order]:
+        """
+        Создание заказа с элементами.
+
+        Остатки списываются атомарно (см. database/Inventory.py). Товары,
+        зарезервированные reserve_stock (reservation_ids), повторно не
+        списываются; излишек резерва возвращается на склад.
+        """
         if not DJANGO_SETUP:
             return None
 
@@ -156,32 +549,67 @@ class PostgreSQLHandler:
             customer = Customer.objects.get(id=customer_id)
             order = Order.objects.create(customer=customer, notes=notes)
 
-            total_amount = 0
+            # Строки с одним товаром складываются: товар входит в заказ одной
+            # позицией и списывается и проверяется по общему количеству
+            needed = Counter()
             for item in items:
-                product = Product.objects.get(id=item['product_id'])
+                needed[item['product_id']] += item['quantity']
+
+            # Все товары заказа одним запросом
+            products = Product.objects.in_bulk(list(needed))
 
-                # Проверяем наличие товара
-                if product.quantity < item['quantity']:
-                    raise ValueError(f"Недостаточно товара: {product.name}. На складе: {product.quantity}, требуется: {item['quantity']}")
+            order_items = []
+            for product_id, quantity in needed.items():
+                product = products.get(product_id)
+                if product is None:
+                    raise Product.DoesNotExist(f"Товар с ID {product_id} не найден")
 
-                # Создаем элемент заказа
-                order_item = OrderItem.objects.create(
+                # bulk_create не вызывает save(), поэтому total_price считаем здесь
+                order_items.append(OrderItem(
                     order=order,
+                    order_date=order.order_date,
                     product=product,
-                    quantity=item['quantity'],
-                    unit_price=product.price
-                )
+                    quantity=quantity,
+                    unit_price=product.price,
+                    total_price=product.price * quantity
+                ))
+
+            # Создаем элементы заказа одним INSERT
+            OrderItem.objects.bulk_create(order_items)
 
-                # Обновляем количество товара на складе
-                product.quantity -= item['quantity']
-                product.save()
+            # Списываем остатки условным UPDATE: строка не обновится, если
+            # товара не хватает; зарезервированное уже списано
+            inventory = Inventory()
+            reserved = Counter(inventory.commit_reservations(reservation_ids, order.id)) if reservation_ids else Counter()
+            inventory.restock(dict(reserved - needed))
+            missing = inventory.decrement(dict(needed - reserved))
+            if missing:
+                stock = inventory.stock(missing)
+                product = products[missing[0]]
+                raise ValueError(f"Недостаточно товара: {product.name}. "
+                                 f"На складе: {stock.get(product.id, 0)}, требуется: {needed[product.id]}")
 
-                total_amount += float(order_item.total_price)
+            with connection.cursor() as cursor:
+                # Общая сумма заказа считается в SQL
+                cursor.execute(
+                    """
+                    UPDATE orders
+                    SET total_amount = COALESCE(
+                            (SELECT SUM(total_price) FROM order_items
+                             WHERE order_id = %s AND order_date = %s), 0),
+                        updated_at = NOW()
+                    WHERE id = %s AND order_date = %s
+                    RETURNING total_amount, updated_at
+                    """,
+                    (order.id, order.order_date, order.id, order.order_date)
+                )
+                order.total_amount, order.updated_at = cursor.fetchone()
 
-            # Обновляем общую сумму заказа
-            order.total_amount = total_amount
-            order.save()
+            # Учитываем заказ в сводке продаж
+            SalesRollup().apply_orders([order.id])
 
+            transaction.on_commit(self.invalidate_stats_cache)
+            transaction.on_commit(self.invalidate_catalog_cache)
             print(f"✅ Заказ создан: #{order.id}")
             return order
 
@@ -194,28 +622,390 @@ class PostgreSQLHandler:
             transaction.set_rollback(True)
             return None
 
-    def get_orders_by_customer(self, customer_id: int) -> List[Order]:
-        """Получение заказов клиента"""
+    def submit_order(self, customer_id: int, items: List[Dict[str, Any]],
+                     notes: str = "", reservation_ids: Optional[List[int]] = None) -> Future:
+        """
+        Постановка заказа в очередь приема (database/OrderIntake.py).
+
+        Заказы записываются пачками в одной транзакции; Future дает Order
+        после фиксации или None, если заказ отклонен.
+        """
+        if not DJANGO_SETUP:
+            future = Future()
+            future.set_exception(RuntimeError("Django не настроен"))
+            return future
+        return get_order_intake().submit(customer_id, items, notes, reservation_ids)
+
+    def get_orders_by_customer(self, customer_id: int, date_from: Optional[date] = None,
+                               date_to: Optional[date] = None, include_archived: bool = False) -> List[Order]:
+        """
+        Получение заказов клиента (окно дат отсекает лишние месячные секции).
+
+        include_archived=True добавляет заказы из архива (у них archived = True).
+        """
         if not DJANGO_SETUP:
             return []
 
         try:
-            return list(Order.objects.filter(customer_id=customer_id).order_by('-order_date'))
+            queryset = self._order_date_window(Order.objects.filter(customer_id=customer_id), date_from, date_to)
+            orders = list(queryset.order_by('-order_date'))
+            if include_archived:
+                orders = self._with_archived_orders(orders, "customer_id = %s", [customer_id], date_from, date_to)
+            return orders
         except Exception as e:
             print(f"❌ Ошибка при получении заказов: {e}")
             return []
 
-    def get_orders_by_status(self, status: str) -> List[Order]:
-        """Получение заказов по статусу"""
+    def get_orders_by_status(self, status: str, date_from: Optional[date] = None,
+                             date_to: Optional[date] = None, include_archived: bool = False) -> List[Order]:
+        """
+        Получение заказов по статусу (окно дат отсекает лишние месячные секции).
+
+        include_archived=True добавляет заказы из архива (у них archived = True).
+        """
         if not DJANGO_SETUP:
             return []
 
         try:
-            return list(Order.objects.filter(status=status).order_by('-order_date'))
+            queryset = self._order_date_window(Order.objects.filter(status=status), date_from, date_to)
+            orders = list(queryset.order_by('-order_date'))
+            if include_archived:
+                orders = self._with_archived_orders(orders, "status = %s", [status], date_from, date_to)
+            return orders
         except Exception as e:
             print(f"❌ Ошибка при получении заказов: {e}")
             return []
 
+    def get_order_items(self, order_id: int, include_archived: bool = False) -> List[OrderItem]:
+        """Позиции заказа; include_archived=True ищет и среди архивных"""
+        if not DJANGO_SETUP:
+            return []
+
+        try:
+            items = list(OrderItem.objects.filter(order_id=order_id).select_related('product'))
+            if not items and include_archived:
+                items = list(self._archived(OrderItem, 'order_items_archive', "order_id = %s", [order_id]))
+            return items
+        except Exception as e:
+            print(f"❌ Ошибка при получении позиций заказа: {e}")
+            return []
+
+    def _with_archived_orders(self, orders: List[Order], condition: str, params: list,
+                              date_from: Optional[date], date_to: Optional[date]) -> List[Order]:
+        """Добавление архивных заказов к живым с общей сортировкой по дате"""
+        conditions = [condition]
+        params = list(params)
+        if date_from is not None:
+            conditions.append("order_date >= %s")
+            params.append(self._as_datetime(date_from))
+        if date_to is not None:
+            conditions.append("order_date < %s")
+            params.append(self._as_datetime(date_to))
+        archived = self._archived(Order, 'orders_archive', " AND ".join(conditions), params)
+        return sorted(orders + archived, key=lambda order: order.order_date, reverse=True)
+
+    @staticmethod
+    def _archived(model, table: str, where: str, params: list) -> list:
+        """
+        Строки архивной таблицы как объекты модели (только для чтения:
+        save() такого объекта записал бы его в живую таблицу)
+        """
+        columns = ", ".join(field.column for field in model._meta.concrete_fields)
+        rows = list(model.objects.raw(f"SELECT {columns} FROM {table} WHERE {where}", params))
+        for row in rows:
+            row.archived = True
+        return rows
+
+    def get_customers_page(self, cursor: Optional[int] = None, limit: int = 200,
+                           backward: bool = False) -> List[Customer]:
+        """Страница клиентов по id (keyset): следующая после cursor или предыдущая до него"""
+        if not DJANGO_SETUP:
+            return []
+
+        try:
+            return self._keyset_page(Customer.objects.all(), ['id'], cursor, limit, backward, descending=False)
+        except Exception as e:
+            print(f"❌ Ошибка при получении клиентов: {e}")
+            return []
+
+    def get_products_page(self, cursor: Optional[int] = None, limit: int = 200,
+                          backward: bool = False) -> List[Product]:
+        """Страница товаров по id (keyset)"""
+        if not DJANGO_SETUP:
+            return []
+
+        try:
+            return Inventory.apply_stock(self._keyset_page(
+                Inventory.annotate_stock(Product.objects.all()), ['id'], cursor, limit, backward, descending=False
+            ))
+        except Exception as e:
+            print(f"❌ Ошибка при получении товаров: {e}")
+            return []
+
+    def get_orders_page(self, cursor: Optional[tuple] = None, limit: int = 200,
+                        backward: bool = False) -> List[Order]:
+        """Страница заказов по (order_date, id), свежие первыми; cursor — (order_date, id)"""
+        if not DJANGO_SETUP:
+            return []
+
+        try:
+            return self._keyset_page(Order.objects.select_related('customer'), ['order_date', 'id'],
+                                     cursor, limit, backward, descending=True)
+        except Exception as e:
+            print(f"❌ Ошибка при получении заказов: {e}")
+            return []
+
+    def get_rows_by_ids(self, table: str, ids: Iterable[int]) -> list:
+        """Строки customers, products или orders по списку id (для ленты изменений)"""
+        if not DJANGO_SETUP:
+            return []
+
+        try:
+            return Inventory.apply_stock(list(self._live_queryset(table).filter(id__in=list(ids))))
+        except Exception as e:
+            print(f"❌ Ошибка при получении строк {table}: {e}")
+            return []
+
+    def get_changes_since(self, model, watermark: Optional[datetime] = None,
+                          limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Изменения таблицы после отметки времени watermark.
+
+        model — модель (Customer, Product, Order) или имя таблицы. Возвращает
+        rows — строки с updated_at >= watermark (товары — и с полосами остатка,
+        измененными после нее), deleted — id удаленных строк
+        (из deleted_rows), watermark — отметку для следующего вызова и
+        full_reload — нужно ли перечитать таблицу целиком: отметки нет, она
+        старше хранения удалений или изменений больше limit (DELTA_LIMIT).
+
+        updated_at и время удаления ставят триггеры по часам сервера на момент
+        записи (миграция 0016). Новая отметка — начало самой старой открытой
+        пишущей транзакции (с xid) или текущее время, минус WATERMARK_SLACK:
+        строки, которые такая транзакция еще не зафиксировала, попадут в
+        следующую выборку, а транзакция, еще ничего не писавшая, запишет их
+        позже отметки. Читающие транзакции (например, приостановленный курсор
+        вкладки SQL) отметку не держат; долгая пишущая транзакция держит ее для
+        всех клиентов, и каждая выборка повторяет строки с ее начала.
+        Строки на границе могут прийти повторно — их применение идемпотентно.
+        """
+        result = {'rows': [], 'deleted': [], 'watermark': watermark, 'full_reload': True}
+        if not DJANGO_SETUP:
+            return result
+
+        table = model if isinstance(model, str) else model._meta.db_table
+        limit = limit or self.DELTA_LIMIT
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT LEAST(clock_timestamp(), (
+                        SELECT MIN(xact_start) FROM pg_stat_activity
+                        WHERE datname = current_database() AND backend_type = 'client backend'
+                          AND pid <> pg_backend_pid() AND backend_xid IS NOT NULL
+                    )) - make_interval(secs => %s)
+                    """,
+                    [self.WATERMARK_SLACK]
+                )
+                result['watermark'] = cursor.fetchone()[0]
+                if watermark is None or watermark < timezone.now() - timedelta(days=self.TOMBSTONE_RETENTION_DAYS):
+                    return result
+
+                changed = django_models.Q(updated_at__gte=watermark)
+                if table == 'products':
+                    # Списание из полос не меняет строку товара
+                    changed |= django_models.Q(
+                        id__in=StockStripe.objects.filter(updated_at__gte=watermark).values('product_id')
+                    )
+                rows = Inventory.apply_stock(list(
+                    self._live_queryset(table).filter(changed).order_by('updated_at', 'id')[:limit + 1]
+                ))
+                if len(rows) > limit:
+                    return result
+
+                # Строка, перенесенная в другую секцию, удаляется и вставляется заново — такие пропускаются
+                cursor.execute(
+                    f"""
+                    SELECT DISTINCT d.row_id FROM deleted_rows d
+                    WHERE d.table_name = %s AND d.deleted_at >= %s
+                      AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = d.row_id)
+                    """,
+                    [table, watermark]
+                )
+                result.update(rows=rows, deleted=[row[0] for row in cursor.fetchall()], full_reload=False)
+                return result
+        except Exception as e:
+            print(f"❌ Ошибка при получении изменений {table}: {e}")
+            result['watermark'] = watermark
+            return result
+
+    def fold_sales_summary(self) -> int:
+        """Перенос накопленных дельт сводки продаж в sales_summary"""
+        if not DJANGO_SETUP:
+            return 0
+
+        try:
+            return SalesRollup().fold()
+        except Exception as e:
+            print(f"❌ Ошибка при обновлении сводки продаж: {e}")
+            return 0
+
+    def prune_tombstones(self, retention_days: Optional[int] = None) -> int:
+        """Удаление записей об удаленных строках старше retention_days (TOMBSTONE_RETENTION_DAYS)"""
+        if not DJANGO_SETUP:
+            return 0
+
+        days = self.TOMBSTONE_RETENTION_DAYS if retention_days is None else retention_days
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM deleted_rows WHERE deleted_at < NOW() - make_interval(days => %s)", [days]
+                )
+                return cursor.rowcount
+        except Exception as e:
+            print(f"❌ Ошибка при очистке удаленных строк: {e}")
+            return 0
+
+    @staticmethod
+    def _live_queryset(table: str):
+        querysets = {
+            'customers': Customer.objects.all,
+            'products': lambda: Inventory.annotate_stock(Product.objects.all()),
+            'orders': lambda: Order.objects.select_related('customer'),
+        }
+        return querysets[table]()
+
+    @staticmethod
+    def _keyset_page(queryset, key_fields: List[str], cursor, limit: Optional[int],
+                     backward: bool, descending: bool) -> list:
+        """
+        Постраничная выборка без OFFSET: строки строго после (или до) ключа cursor.
+
+        queryset может быть кортежем выборок с одинаковыми столбцами: каждая
+        упорядочивается и ограничивается отдельно (по своему индексу), затем
+        они объединяются UNION ALL. limit=None — все строки после cursor.
+        Результат всегда в порядке отображения, даже при backward=True.
+        """
+        # Направление сравнения и сортировки в SQL
+        reverse = descending != backward
+        branches = list(queryset) if isinstance(queryset, (tuple, list)) else [queryset]
+        if cursor is not None:
+            if not isinstance(cursor, (tuple, list)):
+                cursor = (cursor,)
+            op = 'lt' if reverse else 'gt'
+            # (a, b) < (x, y)  ⇔  a < x OR (a = x AND b < y)
+            condition = None
+            for field, value in reversed(list(zip(key_fields, cursor))):
+                strict = django_models.Q(**{f"{field}__{op}": value})
+                condition = strict if condition is None else strict | (django_models.Q(**{field: value}) & condition)
+            if len(key_fields) > 1:
+                # Избыточное условие по первому полю позволяет использовать его индекс
+                condition &= django_models.Q(**{f"{key_fields[0]}__{op}e": cursor[0]})
+            branches = [branch.filter(condition) for branch in branches]
+        ordering = [f"-{field}" if reverse else field for field in key_fields]
+        branches = [branch.order_by(*ordering) for branch in branches]
+        if len(branches) > 1:
+            if limit is not None:
+                branches = [branch[:limit] for branch in branches]
+            queryset = branches[0].union(*branches[1:], all=True).order_by(*ordering)
+        else:
+            queryset = branches[0]
+        rows = list(queryset[:limit] if limit is not None else queryset)
+        if backward:
+            rows.reverse()
+        return rows
+
+    def export_orders(self, path: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                      statuses: Optional[List[str]] = None, compress: Optional[bool] = None,
+                      include_archived: bool = False) -> int:
+        """
+        Выгрузка заказов с позициями в CSV через COPY TO STDOUT.
+
+        Данные пишутся в файл потоком, без загрузки в память. date_to не
+        включается в период. compress=None — сжимать, если путь оканчивается на .gz.
+        include_archived — вместе с архивными заказами (orders_archive), из тех
+        же источников UNION ALL, что и отчеты SalesReports.
+        Возвращает число выгруженных строк или -1 при ошибке.
+        """
+        if not DJANGO_SETUP:
+            return -1
+
+        date_conditions = []
+        date_params = []
+        if date_from is not None:
+            date_conditions.append("order_date >= %s")
+            date_params.append(self._as_datetime(date_from))
+        if date_to is not None:
+            date_conditions.append("order_date < %s")
+            date_params.append(self._as_datetime(date_to))
+        conditions = list(date_conditions)
+        params = list(date_params)
+        if statuses:
+            conditions.append("status = ANY(%s)")
+            params.append(list(statuses))
+
+        if include_archived:
+            # Условия — в каждой ветке UNION ALL, чтобы отсечь лишние секции
+            orders = f"({ORDERS_SOURCE.format(where=' AND '.join(conditions) or 'TRUE')})"
+            items = f"({ITEMS_SOURCE.format(where=' AND '.join(date_conditions) or 'TRUE')})"
+            where = ""
+            params = params * 2 + date_params * 2
+        else:
+            orders, items = "orders", "order_items"
+            where = f"WHERE {' AND '.join(f'o.{condition}' for condition in conditions)}" if conditions else ""
+
+        if compress is None:
+            compress = str(path).endswith('.gz')
+
+        try:
+            with connection.cursor() as cursor:
+                # COPY не принимает параметры на сервере — подставляем их на клиенте
+                select = cursor.mogrify(
+                    f"""
+                    SELECT o.id AS order_id, o.order_date, o.status,
+                           c.id AS customer_id, c.email AS customer_email,
+                           c.last_name || ' ' || c.first_name AS customer_name,
+                           o.total_amount, oi.id AS item_id, p.id AS product_id,
+                           p.sku, p.name AS product_name, p.category,
+                           oi.quantity, oi.unit_price, oi.total_price
+                    FROM {orders} o
+                    JOIN customers c ON c.id = o.customer_id
+                    JOIN {items} oi ON oi.order_id = o.id AND oi.order_date = o.order_date
+                    JOIN products p ON p.id = oi.product_id
+                    {where}
+                    """,
+                    params
+                ).decode()
+                opener = gzip.open if compress else open
+                with opener(path, 'wb') as f:
+                    cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+                rows = cursor.rowcount
+            print(f"✅ Выгружено строк заказов: {rows} → {path}")
+            return rows
+        except OSError as e:
+            print(f"❌ Ошибка записи файла выгрузки: {e}")
+            return -1
+        except Exception as e:
+            print(f"❌ Неожиданная ошибка при выгрузке заказов: {e}")
+            return -1
+
+    @classmethod
+    def _order_date_window(cls, queryset, date_from: Optional[date], date_to: Optional[date]):
+        """Фильтр по order_date; date_to не включается в период"""
+        if date_from is not None:
+            queryset = queryset.filter(order_date__gte=cls._as_datetime(date_from))
+        if date_to is not None:
+            queryset = queryset.filter(order_date__lt=cls._as_datetime(date_to))
+        return queryset
+
+    @staticmethod
+    def _as_datetime(value: date) -> datetime:
+        """Дата без времени — полночь в часовом поясе приложения"""
+        if not isinstance(value, datetime):
+            value = datetime.combine(value, datetime.min.time())
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
     @transaction.atomic
     def update_order_status(self, order_id: int, new_status: str) -> bool:
         """Обновление статуса заказа"""
@@ -223,9 +1013,19 @@ class PostgreSQLHandler:
             return False
 
         try:
-            order = Order.objects.get(id=order_id)
-            order.status = new_status
-            order.save()
+            order = Order.objects.select_for_update().get(id=order_id)
+            if order.status != new_status:
+                if not order.can_change_status(new_status):
+                    print(f"❌ Недопустимая смена статуса заказа #{order_id}: "
+                          f"'{order.status}' → '{new_status}'")
+                    return False
+                # Переносим заказ в сводке продаж со старого статуса на новый
+                rollup = SalesRollup()
+                rollup.apply_orders([order.id], sign=-1)
+                order.status = new_status
+                order.save()
+                rollup.apply_orders([order.id])
+            transaction.on_commit(self.invalidate_stats_cache)
             print(f"✅ Статус заказа #{order_id} обновлен на '{new_status}'")
             return True
         except ObjectDoesNotExist:
@@ -235,6 +1035,57 @@ class PostgreSQLHandler:
             print(f"❌ Неожиданная ошибка при обновлении статуса: {e}")
             return False
 
+    @transaction.atomic
+    def bulk_update_order_status(self, order_ids: Iterable[int], new_status: str) -> Dict[str, List[int]]:
+        """
+        Смена статуса группы заказов одним UPDATE.
+
+        Меняются только заказы, из статуса которых по Order.STATUS_TRANSITIONS
+        можно перейти в new_status. Возвращает {'updated': [...], 'rejected': [...]}:
+        в rejected попадают заказы с недопустимым переходом и несуществующие.
+        """
+        order_ids = sorted(set(order_ids))
+        if not DJANGO_SETUP:
+            return {'updated': [], 'rejected': order_ids}
+
+        predecessors = Order.allowed_predecessors(new_status)
+        if not predecessors:
+            print(f"❌ В статус '{new_status}' нельзя перевести ни один заказ")
+            return {'updated': [], 'rejected': order_ids}
+
+        try:
+            with connection.cursor() as cursor:
+                # Блокируем подходящие заказы в порядке id, чтобы вычесть их из
+                # сводки продаж до смены статуса
+                cursor.execute(
+                    "SELECT id FROM orders WHERE id = ANY(%s) AND status = ANY(%s) ORDER BY id FOR UPDATE",
+                    [order_ids, predecessors]
+                )
+                eligible = [row[0] for row in cursor.fetchall()]
+                rollup = SalesRollup()
+                rollup.apply_orders(eligible, sign=-1)
+
+                cursor.execute(
+                    """
+                    UPDATE orders SET status = %s, updated_at = NOW()
+                    WHERE id = ANY(%s) AND status = ANY(%s)
+                    RETURNING id
+                    """,
+                    [new_status, eligible, predecessors]
+                )
+                updated = sorted(row[0] for row in cursor.fetchall())
+                rollup.apply_orders(updated)
+
+            transaction.on_commit(self.invalidate_stats_cache)
+            updated_set = set(updated)
+            rejected = [order_id for order_id in order_ids if order_id not in updated_set]
+            print(f"✅ Статус '{new_status}': обновлено заказов {len(updated)}, отклонено {len(rejected)}")
+            return {'updated': updated, 'rejected': rejected}
+        except Exception as e:
+            print(f"❌ Неожиданная ошибка при обновлении статусов: {e}")
+            transaction.set_rollback(True)
+            return {'updated': [], 'rejected': order_ids}
+
     def execute_custom_query(self, query: str, params: tuple = None) -> List[dict]:
         """Выполнение произвольного SQL запроса"""
         if not DJANGO_SETUP:
@@ -255,53 +1106,266 @@ class PostgreSQLHandler:
             print(f"❌ Неожиданная ошибка выполнения запроса: {e}")
             return []
 
-    def get_database_stats(self) -> Dict[str, int]:
-        """Получение статистики базы данных"""
+    def stream_custom_query(self, query: str, params: tuple = None,
+                            batch_size: int = 500) -> Iterator[Tuple[Tuple[str, ...], List[tuple]]]:
+        """
+        Потоковое выполнение произвольного SQL запроса.
+
+        SELECT читается серверным (именованным) курсором порциями по batch_size
+        строк: генератор отдает (имена колонок, список кортежей). Запросы, которые
+        нельзя объявить курсором (INSERT, UPDATE...), выполняются обычным курсором.
+        Транзакция держится, пока генератор не исчерпан или не закрыт (close()),
+        поэтому его нужно потреблять в одном потоке. Ошибки SQL пробрасываются.
+        """
+        if not DJANGO_SETUP:
+            return
+
+        with transaction.atomic():
+            connection.ensure_connection()
+            raw_connection = connection.connection
+            cursor = raw_connection.cursor(name=f"custom_query_{id(raw_connection)}")
+            named = True
+            try:
+                with transaction.atomic():
+                    cursor.execute(query, params)
+            except psycopg2.Error:
+                # Не SELECT — DECLARE CURSOR не подходит, выполняем как обычно
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                named = False
+
+            try:
+                if not named and not cursor.description:
+                    return
+                rows = cursor.fetchmany(batch_size)
+                # У именованного курсора description известен только после первого FETCH
+                columns = tuple(col[0] for col in cursor.description)
+                while rows:
+                    yield columns, rows
+                    rows = cursor.fetchmany(batch_size)
+            finally:
+                cursor.close()
+
+    def get_report(self, name: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                   grain: Optional[str] = 'month', limit: int = 10) -> Dict[str, Any]:
+        """
+        Отчет по продажам (см. database/SalesReports.py): title, columns, rows.
+
+        name — ключ REPORTS, grain — период группировки (day, week, month,
+        quarter, year или None), limit — число мест в топе товаров.
+        """
         if not DJANGO_SETUP:
             return {}
 
         try:
-            stats = {
-                'customers': Customer.objects.count(),
-                'products': Product.objects.count(),
-                'active_products': Product.objects.filter(is_active=True).count(),
-                'orders': Order.objects.count(),
-                'pending_orders': Order.objects.filter(status='pending').count(),
-            }
-            return stats
+            rows = SalesReports().build(name, date_from, date_to, grain, limit)
+            return {'title': REPORTS[name]['title'], 'columns': REPORTS[name]['columns'], 'rows': rows}
+        except ValueError as e:
+            print(f"❌ Ошибка параметров отчета: {e}")
+            return {}
+        except Exception as e:
+            print(f"❌ Ошибка при построении отчета {name}: {e}")
+            return {}
+
+    def stream_report(self, name: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                      grain: Optional[str] = 'month', limit: int = 10,
+                      batch_size: int = 500) -> Iterator[Tuple[Tuple[str, ...], List[tuple]]]:
+        """
+        Потоковое построение отчета: (колонки, порция строк), как stream_custom_query.
+
+        Генератор потребляется в одном потоке; ошибки пробрасываются.
+        """
+        if not DJANGO_SETUP:
+            return
+
+        columns = tuple(REPORTS[name]['columns']) if name in REPORTS else ()
+        for rows in SalesReports().stream(name, date_from, date_to, grain, limit, batch_size):
+            yield columns, rows
+
+    def get_database_stats(self, approximate: bool = False, use_cache: bool = True,
+                           date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Получение статистики базы данных.
+
+        Все счетчики считаются одним запросом с условной агрегацией и
+        кэшируются на STATS_TTL секунд. approximate=True берет оценки из
+        pg_class.reltuples и pg_stats (мгновенно даже на больших таблицах).
+        Выручка (revenue, revenue_by_status/category/day) читается из сводки
+        sales_summary, поэтому не зависит от объема истории заказов.
+        Окно date_from/date_to (date_to не включается) ограничивает заказы
+        и выручку; счетчики заказов в окне читают только его секции.
+        """
+        if not DJANGO_SETUP:
+            return {}
+
+        window = date_from is not None or date_to is not None
+        # Оценки планировщика есть только для всей таблицы
+        approximate = approximate and not window
+        cache_key = (approximate, date_from, date_to)
+        if use_cache:
+            cached = self._stats_cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] < self.STATS_TTL:
+                return dict(cached[1])
+
+        try:
+            stats = None
+            if approximate:
+                stats = self._approximate_stats()
+            if stats is None:
+                stats = self._exact_stats(date_from, date_to)
+            stats.update(SalesRollup().summary(date_from, date_to))
+            self._stats_cache[cache_key] = (time.monotonic(), stats)
+            return dict(stats)
         except Exception as e:
             print(f"❌ Ошибка при получении статистики: {e}")
             return {}
 
+    @classmethod
+    def invalidate_stats_cache(cls):
+        """Сброс кэша статистики и отчетов (вызывается после записи)"""
+        cls._stats_cache.clear()
+        if SalesReports is not None:
+            SalesReports.invalidate()
 
-def setup_database():
-    """Настройка базы данных: создание и применение миграций."""
-    if not DJANGO_SETUP:
-        print("❌ Django не настроен")
-        return False
+    @classmethod
+    def invalidate_catalog_cache(cls):
+        """Сброс кэша каталога товаров (вызывается после записи)"""
+        cls._catalog.invalidate()
 
-    from django.core.management import call_command
+    def get_query_profile(self) -> Dict[str, Any]:
+        """
+        Статистика SQL запросов по методам: вызовы, запросы, время в БД,
+        строки и найденные N+1 (учитывается доля DB_PROFILE_SAMPLE_RATE вызовов)
+        """
+        return profiler.snapshot()
 
-    print("🔄 Инициализация таблиц в базе данных...")
+    def reset_query_profile(self):
+        """Сброс статистики SQL запросов"""
+        profiler.reset()
 
-    # 0. Убедиться, что пакет database.migrations существует (Django иначе не видит миграции)
-    migrations_dir = Path(__file__).parent / 'migrations'
-    migrations_dir.mkdir(exist_ok=True)
-    (migrations_dir / '__init__.py').touch()
+    def _exact_stats(self, date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict[str, int]:
+        """Точные счетчики: по одному проходу на таблицу в одном запросе"""
+        conditions = []
+        params = []
+        if date_from is not None:
+            conditions.append("order_date >= %s")
+            params.append(self._as_datetime(date_from))
+        if date_to is not None:
+            conditions.append("order_date < %s")
+            params.append(self._as_datetime(date_to))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT c.total, p.total, p.active, o.total, o.pending
+                FROM (SELECT COUNT(*) AS total FROM customers) c,
+                     (SELECT COUNT(*) AS total,
+                             COUNT(*) FILTER (WHERE is_active) AS active
+                      FROM products) p,
+                     (SELECT COUNT(*) AS total,
+                             COUNT(*) FILTER (WHERE status = 'pending') AS pending
+                      FROM orders {where}) o
+                """,
+                params
+            )
+            row = cursor.fetchone()
+        return dict(zip(['customers', 'products', 'active_products', 'orders', 'pending_orders'], row))
+
+    def _approximate_stats(self) -> Optional[Dict[str, int]]:
+        """
+        Оценка счетчиков по статистике планировщика.
+
+        Доли активных товаров и заказов в обработке берутся из most_common_freqs
+        в pg_stats. Если таблицы еще не анализировались, возвращает None.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname,
+                       -- У секционированной таблицы строки считаются по секциям;
+                       -- пустые, еще не анализированные секции (relpages = 0) дают 0
+                       CASE WHEN c.relkind = 'p' THEN
+                           (SELECT CASE WHEN bool_and(ch.reltuples >= 0 OR ch.relpages = 0)
+                                        THEN SUM(GREATEST(ch.reltuples, 0)) ELSE -1 END
+                            FROM pg_inherits i JOIN pg_class ch ON ch.oid = i.inhrelid
+                            WHERE i.inhparent = c.oid)::bigint
+                       ELSE c.reltuples::bigint END,
+                       (SELECT s.most_common_freqs[array_position(s.most_common_vals::text::text[], v.val)]
+                        FROM pg_stats s
+                        WHERE s.schemaname = n.nspname AND s.tablename = c.relname AND s.attname = v.col)
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                LEFT JOIN (VALUES ('products', 'is_active', 't'),
+                                  ('orders', 'status', 'pending')) AS v(tbl, col, val)
+                       ON v.tbl = c.relname
+                WHERE n.nspname = current_schema()
+                  AND c.relname IN ('customers', 'products', 'orders')
+                """
+            )
+            rows = {name: (total, freq) for name, total, freq in cursor.fetchall()}
+
+        if len(rows) < 3 or any(total < 0 for total, _ in rows.values()):
+            return None
+        return {
+            'customers': rows['customers'][0],
+            'products': rows['products'][0],
+            'active_products': round(rows['products'][0] * (rows['products'][1] or 0)),
+            'orders': rows['orders'][0],
+            'pending_orders': round(rows['orders'][0] * (rows['orders'][1] or 0)),
+        }
+
+
+# Учет запросов всех публичных методов обработчика
+instrument(PostgreSQLHandler, exclude=('run_in_background', 'get_query_profile', 'reset_query_profile'))
+
+def pending_migrations() -> Optional[List[str]]:
+    """
+    Неприменённые миграции приложения database.
+
+    Сравнивает файлы database/migrations с таблицей django_migrations одним
+    запросом, без загрузки графа миграций. None — если проверить не удалось.
+    """
+    if not DJANGO_SETUP:
+        return None
 
-    # 1. Создать миграции для приложения database (создаёт файлы в database/migrations/)
+    migrations_dir = Path(__file__).parent / 'migrations'
+    names = sorted(path.stem for path in migrations_dir.glob('[0-9]*.py'))
     try:
-        print("  Создание миграций...")
-        call_command('makemigrations', 'database', verbosity=2)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM django_migrations WHERE app = 'database'")
+            applied = {row[0] for row in cursor.fetchall()}
+    except ProgrammingError:
+        # Таблицы django_migrations еще нет — база пустая
+        return names
     except Exception as e:
-        print(f"⚠️ Ошибка создания миграций: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"⚠️ Не удалось проверить миграции: {e}")
+        return None
+    return [name for name in names if name not in applied]
+
+
+def setup_database(fast: bool = False):
+    """
+    Настройка базы данных: применение миграций.
+
+    Миграции во время работы не создаются — они лежат в database/migrations.
+    При fast=True migrate запускается, только если есть неприменённые миграции.
+    """
+    if not DJANGO_SETUP:
+        print("❌ Django не настроен")
         return False
 
-    # 2. Применить миграции к БД
+    if fast:
+        pending = pending_migrations()
+        if pending == []:
+            return True
+
+    from django.core.management import call_command
+
+    print("🔄 Инициализация таблиц в базе данных...")
+
     try:
-        call_command('migrate', 'database', verbosity=2)
+        call_command('migrate', 'database', verbosity=1)
     except Exception as e:
         print(f"❌ Ошибка применения миграций: {e}")
         import traceback
@@ -312,13 +1376,16 @@ def setup_database():
     return True
 
 
-def create_test_data():
-    """Создание тестовых данных"""
+def create_test_data(only_if_empty: bool = False):
+    """Создание тестовых данных (only_if_empty — только в пустую базу)"""
     if not DJANGO_SETUP:
         print("❌ Django не настроен")
         return False
 
     try:
+        if only_if_empty and (Customer.objects.exists() or Product.objects.exists()):
+            return True
+
         handler = PostgreSQLHandler()
 
         # Создаем тестовых клиентов
@@ -0,0 +1,236 @@
+"""
+Учет SQL запросов по методам обработчика базы данных.
+
+Профилируемый вызов ставит на соединение своего потока
+connection.execute_wrapper и считает запросы, время в БД, строки и
+повторы одинаковых запросов (отпечаток — текст без литералов). Если один
+отпечаток повторяется в вызове N_PLUS_ONE_THRESHOLD раз и больше, вызов
+помечается как N+1. Вызовы отбираются случайно с долей DB_PROFILE_SAMPLE_RATE.
+
+Сессия (session) объединяет несколько вызовов, в том числе из разных потоков
+пула: текущая сессия хранится в ContextVar, а пул переносит контекст в задачу.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import isgeneratorfunction
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Текст запроса без литералов: одинаков для запросов с разными параметрами"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class CallRecord:
+    """Запросы одного вызова или сессии"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.fingerprints: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, sql: str, duration: float, rows: int):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            self.rows += max(rows, 0)
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def merge(self, other: 'CallRecord'):
+        with self._lock:
+            self.queries += other.queries
+            self.db_time += other.db_time
+            self.rows += other.rows
+            self.fingerprints.update(other.fingerprints)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Отпечатки, повторившиеся threshold раз и больше"""
+        return [(fp, count) for fp, count in self.fingerprints.most_common() if count >= threshold]
+
+
+class MethodStats:
+    """Накопленная статистика одного метода"""
+
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.n_plus_one = 0
+        self.repeated: List[Tuple[str, int]] = []
+
+    def add(self, record: CallRecord, repeated: List[Tuple[str, int]]):
+        self.calls += 1
+        self.queries += record.queries
+        self.max_queries = max(self.max_queries, record.queries)
+        self.db_time += record.db_time
+        self.rows += record.rows
+        if repeated:
+            self.n_plus_one += 1
+            self.repeated = repeated
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'queries': self.queries,
+            'avg_queries': self.queries / self.calls if self.calls else 0,
+            'max_queries': self.max_queries,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            'avg_db_time_ms': round(self.db_time * 1000 / self.calls, 2) if self.calls else 0,
+            'rows': self.rows,
+            'n_plus_one': self.n_plus_one,
+            'repeated': list(self.repeated),
+        }
+
+
+class QueryProfiler:
+    """Сбор статистики запросов по именам вызовов"""
+
+    # Столько одинаковых запросов в одном вызове считается N+1
+    N_PLUS_ONE_THRESHOLD = 5
+    # Сколько последних предупреждений N+1 хранить
+    MAX_WARNINGS = 50
+
+    def __init__(self, sample_rate: Optional[float] = None):
+        self._sample_rate = sample_rate
+        self._stats: Dict[str, MethodStats] = {}
+        self._warnings: deque = deque(maxlen=self.MAX_WARNINGS)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._session: ContextVar[Optional[CallRecord]] = ContextVar('query_profile_session', default=None)
+
+    @property
+    def sample_rate(self) -> float:
+        if self._sample_rate is None:
+            return float(getattr(settings, 'DB_PROFILE_SAMPLE_RATE', 0.1))
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value: float):
+        self._sample_rate = value
+
+    def _sampled(self) -> bool:
+        rate = self.sample_rate
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    @contextmanager
+    def profile(self, name: str):
+        """Учет запросов вызова name в текущем потоке"""
+        session = self._session.get()
+        # Вложенный вызов учитывается во внешнем; вне сессии — выборочно
+        if getattr(self._local, 'record', None) is not None or (session is None and not self._sampled()):
+            yield
+            return
+
+        record = CallRecord(name)
+        self._local.record = record
+        try:
+            with connection.execute_wrapper(self._wrapper):
+                yield
+        finally:
+            self._local.record = None
+            self._finish(record)
+            if session is not None:
+                session.merge(record)
+
+    @contextmanager
+    def session(self, name: str):
+        """Общий учет нескольких вызовов (в том числе в потоках пула)"""
+        if self._session.get() is not None or not self._sampled():
+            yield
+            return
+
+        record = CallRecord(name)
+        token = self._session.set(record)
+        try:
+            yield
+        finally:
+            self._session.reset(token)
+            self._finish(record)
+
+    def _wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            record = getattr(self._local, 'record', None)
+            if record is not None:
+                cursor = context.get('cursor')
+                rows = cursor.rowcount if cursor is not None else 0
+                record.add(sql, time.perf_counter() - started, rows)
+
+    def _finish(self, record: CallRecord):
+        repeated = record.repeated(self.N_PLUS_ONE_THRESHOLD)
+        with self._lock:
+            self._stats.setdefault(record.name, MethodStats()).add(record, repeated)
+            for fp, count in repeated:
+                self._warnings.append((time.time(), record.name, fp, count))
+        for fp, count in repeated:
+            print(f"⚠️ N+1 в {record.name}: {count} одинаковых запросов: {fp[:120]}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Статистика по вызовам и последние предупреждения N+1"""
+        with self._lock:
+            return {
+                'sample_rate': self.sample_rate,
+                'methods': {name: stats.as_dict() for name, stats in self._stats.items()},
+                'warnings': list(self._warnings),
+            }
+
+    def reset(self):
+        """Сброс накопленной статистики"""
+        with self._lock:
+            self._stats.clear()
+            self._warnings.clear()
+
+
+profiler = QueryProfiler()
+
+
+def profiled(name: str):
+    """Декоратор: учет запросов функции под именем name"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profiler.profile(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument(cls, exclude=()):
+    """
+    Учет запросов всех публичных методов класса.
+
+    Генераторы пропускаются: их запросы выполняются после возврата из метода.
+    """
+    for name, member in list(vars(cls).items()):
+        if name.startswith('_') or name in exclude or not callable(member) or isgeneratorfunction(member):
+            continue
+        if isinstance(member, (classmethod, staticmethod)):
+            continue
+        setattr(cls, name, profiled(f"{cls.__name__}.{name}")(member))
+    return cls
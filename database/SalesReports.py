@@ -0,0 +1,219 @@
+"""
+Отчеты по продажам за произвольный период.
+
+Каждый отчет — один агрегирующий запрос к orders/order_items/products
+(вместе с архивными orders_archive/order_items_archive) с группировкой по
+периодам date_trunc (день, неделя, месяц...) в часовом поясе приложения
+и оконными функциями для рангов, долей и скользящих значений. Отмененные
+заказы не учитываются. Результат читается серверным курсором порциями и
+кэшируется по параметрам отчета; кэш сбрасывается при изменении заказов
+(PostgreSQLHandler.invalidate_stats_cache).
+"""
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .CatalogCache import CatalogCache
+
+
+# Допустимые периоды группировки (аргумент date_trunc); None — весь период одной строкой
+GRAINS = ('day', 'week', 'month', 'quarter', 'year')
+
+ORDERS_SOURCE = """
+    SELECT id, customer_id, order_date, status, total_amount FROM orders WHERE {where}
+    UNION ALL
+    SELECT id, customer_id, order_date, status, total_amount FROM orders_archive WHERE {where}
+"""
+
+ITEMS_SOURCE = """
+    SELECT id, order_id, order_date, product_id, quantity, unit_price, total_price
+    FROM order_items WHERE {where}
+    UNION ALL
+    SELECT id, order_id, order_date, product_id, quantity, unit_price, total_price
+    FROM order_items_archive WHERE {where}
+"""
+
+# Позиции неотмененных заказов периода с товаром
+SALES_JOIN = """
+    FROM ({items}) oi
+    JOIN ({orders}) o ON o.id = oi.order_id AND o.order_date = oi.order_date
+    JOIN products p ON p.id = oi.product_id
+    WHERE o.status <> 'cancelled'
+"""
+
+REPORTS: Dict[str, Dict[str, Any]] = {
+    'top_products': {
+        'title': 'Топ товаров по выручке',
+        'columns': ['Период', 'Место', 'Товар', 'Категория', 'Количество', 'Заказов', 'Выручка', 'Доля, %'],
+        'sql': """
+            WITH sales AS (
+                SELECT {bucket} AS bucket, p.id, p.name, p.category,
+                       SUM(oi.quantity) AS quantity, COUNT(DISTINCT o.id) AS orders,
+                       SUM(oi.total_price) AS revenue
+                {sales}
+                GROUP BY 1, p.id, p.name, p.category
+            ), ranked AS (
+                SELECT *,
+                       RANK() OVER (PARTITION BY bucket ORDER BY revenue DESC) AS place,
+                       revenue / NULLIF(SUM(revenue) OVER (PARTITION BY bucket), 0) AS share
+                FROM sales
+            )
+            SELECT bucket, place, name, category, quantity, orders, revenue, ROUND(100 * share, 2)
+            FROM ranked
+            WHERE place <= %(limit)s
+            ORDER BY bucket, place, name
+        """,
+    },
+    'revenue_by_category': {
+        'title': 'Выручка по категориям',
+        'columns': ['Период', 'Категория', 'Заказов', 'Количество', 'Выручка', 'Доля, %',
+                    'Нарастающий итог', 'Изменение'],
+        'sql': """
+            WITH sales AS (
+                SELECT {bucket} AS bucket, p.category,
+                       COUNT(DISTINCT o.id) AS orders, SUM(oi.quantity) AS quantity,
+                       SUM(oi.total_price) AS revenue
+                {sales}
+                GROUP BY 1, 2
+            )
+            SELECT bucket, category, orders, quantity, revenue,
+                   ROUND(100 * revenue / NULLIF(SUM(revenue) OVER (PARTITION BY bucket), 0), 2),
+                   SUM(revenue) OVER (PARTITION BY category ORDER BY bucket),
+                   revenue - LAG(revenue) OVER (PARTITION BY category ORDER BY bucket)
+            FROM sales
+            ORDER BY bucket, revenue DESC
+        """,
+    },
+    'repeat_customers': {
+        'title': 'Повторные покупатели',
+        'columns': ['Период', 'Покупателей', 'Новых', 'Повторных', 'Доля повторных, %'],
+        # Номер заказа покупателя считается по всей истории до конца периода:
+        # повторный покупатель периода сделал в нем не первый свой заказ
+        'sql': """
+            WITH numbered AS (
+                SELECT o.customer_id, o.order_date,
+                       ROW_NUMBER() OVER (PARTITION BY o.customer_id ORDER BY o.order_date, o.id) AS seq
+                FROM ({history}) o
+                WHERE o.status <> 'cancelled'
+            ), per_bucket AS (
+                SELECT {bucket} AS bucket,
+                       COUNT(DISTINCT customer_id) AS customers,
+                       COUNT(DISTINCT customer_id) FILTER (WHERE seq = 1) AS new_customers,
+                       COUNT(DISTINCT customer_id) FILTER (WHERE seq > 1) AS repeat_customers
+                FROM numbered o
+                WHERE {period}
+                GROUP BY 1
+            )
+            SELECT bucket, customers, new_customers, repeat_customers,
+                   ROUND(100.0 * repeat_customers / NULLIF(customers, 0), 2)
+            FROM per_bucket
+            ORDER BY bucket
+        """,
+    },
+    'average_order_value': {
+        'title': 'Средний чек',
+        'columns': ['Период', 'Заказов', 'Покупателей', 'Выручка', 'Средний чек',
+                    'Скользящее среднее (3)'],
+        'sql': """
+            WITH per_bucket AS (
+                SELECT {bucket} AS bucket, COUNT(*) AS orders,
+                       COUNT(DISTINCT customer_id) AS customers, SUM(total_amount) AS revenue
+                FROM ({orders}) o
+                WHERE o.status <> 'cancelled'
+                GROUP BY 1
+            )
+            SELECT bucket, orders, customers, revenue,
+                   ROUND(revenue / NULLIF(orders, 0), 2),
+                   ROUND(AVG(revenue / NULLIF(orders, 0)) OVER (
+                       ORDER BY bucket ROWS BETWEEN 2 PRECEDING AND CURRENT ROW
+                   ), 2)
+            FROM per_bucket
+            ORDER BY bucket
+        """,
+    },
+}
+
+
+class SalesReports:
+    """Построение отчетов по продажам с кэшем результатов"""
+
+    # Результаты длиннее стольких строк не кэшируются
+    CACHE_MAX_ROWS = 10000
+    _cache = CatalogCache(max_entries=64, ttl=300)
+
+    @classmethod
+    def invalidate(cls):
+        """Сброс кэша отчетов (при изменении заказов)"""
+        cls._cache.invalidate()
+
+    def build_query(self, name: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                    grain: Optional[str] = 'month', limit: int = 10) -> Tuple[str, Dict[str, Any]]:
+        """SQL и параметры отчета name; date_to не включается в период"""
+        if name not in REPORTS:
+            raise ValueError(f"Неизвестный отчет: {name}")
+        if grain is not None and grain not in GRAINS:
+            raise ValueError(f"Неизвестный период группировки: {grain}")
+
+        params = {'tz': settings.TIME_ZONE, 'grain': grain, 'limit': limit,
+                  'date_from': date_from, 'date_to': date_to}
+        # Границы — полночь дат в часовом поясе приложения; условие на order_date
+        # в каждой ветке UNION ALL позволяет отсечь лишние секции
+        lower = "order_date >= %(date_from)s::timestamp AT TIME ZONE %(tz)s"
+        upper = "order_date < %(date_to)s::timestamp AT TIME ZONE %(tz)s"
+        bounds = [condition for condition, value in ((lower, date_from), (upper, date_to)) if value is not None]
+        where = " AND ".join(bounds) or "TRUE"
+        bucket = ("date_trunc(%(grain)s, o.order_date AT TIME ZONE %(tz)s)::date"
+                  if grain else "NULL::date")
+
+        orders = ORDERS_SOURCE.format(where=where)
+        sql = REPORTS[name]['sql'].format(
+            bucket=bucket,
+            orders=orders,
+            sales=SALES_JOIN.format(items=ITEMS_SOURCE.format(where=where), orders=orders),
+            history=ORDERS_SOURCE.format(where=upper if date_to is not None else "TRUE"),
+            period=" AND ".join(f"o.{condition}" for condition in bounds) or "TRUE",
+        )
+        return sql, params
+
+    def stream(self, name: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+               grain: Optional[str] = 'month', limit: int = 10,
+               batch_size: int = 500) -> Iterator[List[tuple]]:
+        """
+        Строки отчета порциями по batch_size.
+
+        Из кэша порции отдаются сразу; иначе запрос читается серверным
+        курсором, а полный результат сохраняется в кэш. Генератор держит
+        транзакцию, пока не исчерпан или не закрыт.
+        """
+        key = (name, date_from, date_to, grain, limit)
+        found, rows, generation = self._cache.lookup(key)
+        if found:
+            for start in range(0, len(rows), batch_size):
+                yield rows[start:start + batch_size]
+            return
+
+        sql, params = self.build_query(name, date_from, date_to, grain, limit)
+        collected: Optional[List[tuple]] = []
+        with transaction.atomic():
+            connection.ensure_connection()
+            raw_connection = connection.connection
+            with raw_connection.cursor(name=f"sales_report_{id(raw_connection)}") as cursor:
+                cursor.execute(sql, params)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    if collected is not None:
+                        collected.extend(batch)
+                        if len(collected) > self.CACHE_MAX_ROWS:
+                            collected = None
+                    yield batch
+        if collected is not None:
+            self._cache.store(key, collected, generation)
+
+    def build(self, name: str, date_from: Optional[date] = None, date_to: Optional[date] = None,
+              grain: Optional[str] = 'month', limit: int = 10) -> List[tuple]:
+        """Все строки отчета списком"""
+        return [row for batch in self.stream(name, date_from, date_to, grain, limit) for row in batch]
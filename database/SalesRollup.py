@@ -0,0 +1,177 @@
+"""
+Инкрементальное ведение сводки продаж (таблица sales_summary).
+
+Сводка хранит выручку, количество и число заказов по (день, категория, статус).
+Изменения заказов применяются к ней дельтами: при создании заказа — с
+плюсом, при смене статуса — с минусом по старому статусу и с плюсом по новому.
+Транзакция заказа только добавляет дельты в sales_summary_deltas и не
+блокирует строку сводки (все заказы дня попадают в одну строку pending);
+fold() переносит дельты в sales_summary (фоновое обслуживание приложения,
+main.py), а summary() только читает — сводку вместе с еще не перенесенными
+дельтами.
+Полный пересчет выполняет rebuild() (команда rebuild_sales_summary); архивные
+заказы (orders_archive) в нем учитываются, так что архивирование сводку не меняет.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+class SalesRollup:
+    """Операции над таблицей sales_summary"""
+
+    # Агрегат позиций заказов по ключу сводки; {where} — фильтр по заказам,
+    # {orders}/{items} — живые таблицы или архивные (orders_archive, order_items_archive)
+    AGGREGATE_SQL = """
+        SELECT (o.order_date AT TIME ZONE %s)::date AS day, p.category, o.status,
+               SUM(oi.total_price) AS revenue, SUM(oi.quantity) AS quantity,
+               COUNT(DISTINCT o.id) AS order_count
+        FROM {orders} o
+        JOIN {items} oi ON oi.order_id = o.id AND oi.order_date = o.order_date
+        JOIN products p ON p.id = oi.product_id
+        {where}
+        GROUP BY 1, 2, 3
+    """
+
+    def apply_orders(self, order_ids: List[int], sign: int = 1):
+        """
+        Добавление (sign=1) или вычитание (sign=-1) заказов из сводки.
+
+        Вызывается внутри транзакции, изменяющей заказы. Заказы берутся
+        в текущем состоянии, поэтому вычитание делается до смены статуса.
+        """
+        if not order_ids:
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO sales_summary_deltas (day, category, status, revenue, quantity, order_count)
+                SELECT day, category, status, %s * revenue, %s * quantity, %s * order_count
+                FROM ({self.AGGREGATE_SQL.format(orders='orders', items='order_items',
+                                                 where="WHERE o.id = ANY(%s)")}) delta
+                """,
+                [sign, sign, sign, settings.TIME_ZONE, list(order_ids)]
+            )
+
+    @transaction.atomic
+    def fold(self) -> int:
+        """Перенос накопленных дельт в sales_summary; возвращает число перенесенных дельт"""
+        with connection.cursor() as cursor:
+            # Параллельный fold() ждет удаляемые строки и пропускает их — дельта
+            # учитывается один раз. Ключи обновляются по порядку, без взаимных блокировок.
+            cursor.execute(
+                """
+                WITH moved AS (
+                    DELETE FROM sales_summary_deltas
+                    RETURNING day, category, status, revenue, quantity, order_count
+                ), folded AS (
+                    INSERT INTO sales_summary AS s (day, category, status, revenue, quantity, order_count)
+                    SELECT day, category, status, SUM(revenue), SUM(quantity), SUM(order_count)
+                    FROM moved
+                    GROUP BY 1, 2, 3
+                    ORDER BY 1, 2, 3
+                    ON CONFLICT (day, category, status) DO UPDATE
+                    SET revenue = s.revenue + EXCLUDED.revenue,
+                        quantity = s.quantity + EXCLUDED.quantity,
+                        order_count = s.order_count + EXCLUDED.order_count
+                )
+                SELECT COUNT(*) FROM moved
+                """
+            )
+            moved = cursor.fetchone()[0]
+            if moved:
+                # Пустые строки сводки не нужны
+                cursor.execute("DELETE FROM sales_summary WHERE order_count <= 0")
+            return moved
+
+    @transaction.atomic
+    def rebuild(self) -> int:
+        """
+        Полный пересчет сводки по таблицам заказов, включая архивные;
+        возвращает число строк сводки
+        """
+        with connection.cursor() as cursor:
+            # EXCLUSIVE блокирует запись дельт и их перенос на время пересчета,
+            # но не чтение сводки. Пересчет учитывает все заказы, дельты не нужны.
+            cursor.execute("LOCK TABLE sales_summary, sales_summary_deltas IN EXCLUSIVE MODE")
+            cursor.execute("DELETE FROM sales_summary_deltas")
+            cursor.execute("DELETE FROM sales_summary")
+            cursor.execute(
+                f"""
+                INSERT INTO sales_summary (day, category, status, revenue, quantity, order_count)
+                SELECT day, category, status, SUM(revenue), SUM(quantity), SUM(order_count)
+                FROM ({self.AGGREGATE_SQL.format(orders='orders', items='order_items', where="")}
+                      UNION ALL
+                      {self.AGGREGATE_SQL.format(orders='orders_archive', items='order_items_archive',
+                                                 where="")}) parts
+                GROUP BY 1, 2, 3
+                """,
+                [settings.TIME_ZONE, settings.TIME_ZONE]
+            )
+            return cursor.rowcount
+
+    def summary(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                days: int = 7) -> Dict[str, Any]:
+        """
+        Выручка по статусам, категориям и последним days дням из сводки.
+
+        date_to не включается в период. Отмененные заказы в выручку не входят.
+        Еще не перенесенные дельты учитываются при чтении; сводка не меняется.
+        """
+        conditions = ["status <> 'cancelled'"]
+        params: List[Any] = []
+        if date_from is not None:
+            conditions.append("day >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append("day < %s")
+            params.append(date_to)
+        where = " AND ".join(conditions)
+
+        with connection.cursor() as cursor:
+            # s — сводка в том виде, какой она станет после fold(): пустые ключи отбрасываются.
+            # Статусы — без фильтра по отмене, чтобы было видно и отмененные суммы
+            cursor.execute(
+                f"""
+                WITH s AS (
+                    SELECT day, category, status, SUM(revenue) AS revenue
+                    FROM (SELECT day, category, status, revenue, order_count FROM sales_summary
+                          UNION ALL
+                          SELECT day, category, status, revenue, order_count FROM sales_summary_deltas) parts
+                    GROUP BY 1, 2, 3
+                    HAVING SUM(order_count) > 0
+                )
+                SELECT 'status', status, SUM(revenue)
+                FROM s
+                WHERE {" AND ".join(conditions[1:]) or "TRUE"}
+                GROUP BY status
+                UNION ALL
+                SELECT 'category', category, SUM(revenue)
+                FROM s WHERE {where}
+                GROUP BY category
+                UNION ALL
+                SELECT 'day', day::text, SUM(revenue)
+                FROM s
+                WHERE {where} AND day > (SELECT MAX(day) FROM s) - %s
+                GROUP BY day
+                """,
+                params + params + params + [days]
+            )
+            rows = cursor.fetchall()
+
+        result: Dict[str, Any] = {
+            'revenue': Decimal(0),
+            'revenue_by_status': {},
+            'revenue_by_category': {},
+            'revenue_by_day': {},
+        }
+        for kind, key, revenue in rows:
+            result[f'revenue_by_{kind}'][key] = revenue
+            if kind == 'category':
+                result['revenue'] += revenue
+        result['revenue_by_day'] = dict(sorted(result['revenue_by_day'].items()))
+        return result
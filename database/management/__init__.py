@@ -0,0 +1 @@
+# Пакет management-команд приложения database
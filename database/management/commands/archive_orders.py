@@ -0,0 +1,56 @@
+"""
+Перенос старых доставленных и отмененных заказов в архивные таблицы.
+
+Примеры:
+  python manage.py archive_orders --older-than 180
+  python manage.py archive_orders --older-than 2025-01-01 --batch-size 500 --sleep 0.5
+  python manage.py archive_orders --older-than 365 --status cancelled --dry-run
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from database.OrderArchiver import ARCHIVABLE_STATUSES, OrderArchiver
+from database.PostgreSQLHandler import PostgreSQLHandler
+
+
+def older_than(value: str):
+    """Число дней назад или дата ГГГГ-ММ-ДД"""
+    if value.isdigit():
+        return timezone.now() - timedelta(days=int(value))
+    return PostgreSQLHandler._as_datetime(date.fromisoformat(value))
+
+
+class Command(BaseCommand):
+    help = "Перенос старых завершенных заказов в orders_archive / order_items_archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', required=True, type=older_than,
+                            help="Заказы старше N дней или даты ГГГГ-ММ-ДД")
+        parser.add_argument('--status', dest='statuses', action='append', choices=ARCHIVABLE_STATUSES,
+                            help="Статус заказа (по умолчанию delivered и cancelled)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Заказов в одной транзакции")
+        parser.add_argument('--sleep', type=float, default=0.2, help="Пауза между пачками, секунд")
+        parser.add_argument('--max-batches', type=int, help="Остановиться после N пачек")
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать заказы")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size должен быть больше нуля")
+        statuses = options['statuses'] or ARCHIVABLE_STATUSES
+        archiver = OrderArchiver(options['batch_size'], options['sleep'])
+
+        if options['dry_run']:
+            count = archiver.count(options['older_than'], statuses)
+            self.stdout.write(f"К переносу заказов: {count}")
+            return
+
+        def progress(batch, totals):
+            self.stdout.write(f"  пачка {batch}: заказов {totals['orders']}, позиций {totals['items']}")
+
+        totals = archiver.archive(options['older_than'], statuses, options['max_batches'], progress)
+        PostgreSQLHandler.invalidate_stats_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f"Перенесено в архив заказов: {totals['orders']}, позиций: {totals['items']}"
+        ))
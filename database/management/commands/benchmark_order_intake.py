@@ -0,0 +1,115 @@
+"""
+Пропускная способность приема заказов: транзакция на заказ против очереди
+с групповой фиксацией (database/OrderIntake.py).
+
+--clients потоков создают всего --orders заказов из одной позиции:
+  direct — каждый поток вызывает create_order (своя транзакция и COMMIT)
+  queue  — каждый поток ставит заказ в очередь и ждет его Future
+Созданные заказы, покупатель и товар удаляются после замера.
+
+Пример:
+  python manage.py benchmark_order_intake --orders 2000 --clients 16 --batch 50 --wait-ms 5
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from database.OrderIntake import OrderIntakeQueue
+from database.PostgreSQLHandler import PostgreSQLHandler
+from database.SalesRollup import SalesRollup
+from database.models import Customer, Order, OrderItem, Product
+
+MODES = ['direct', 'queue']
+BENCH_SKU = 'BENCH-ORDER-INTAKE'
+BENCH_EMAIL = 'bench-order-intake@example.com'
+
+
+class Command(BaseCommand):
+    help = "Сравнение приема заказов по одному в транзакции и пачками через очередь"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help="Заказов в каждом режиме")
+        parser.add_argument('--clients', type=int, default=16, help="Потоков-клиентов")
+        parser.add_argument('--batch', type=int, default=50, help="Максимум заказов в пачке очереди")
+        parser.add_argument('--wait-ms', type=float, default=5, help="Ожидание добора пачки, мс")
+        parser.add_argument('--mode', dest='modes', action='append', choices=MODES,
+                            help="Режим (по умолчанию оба)")
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1 or options['clients'] < 1 or options['batch'] < 1:
+            raise CommandError("--orders, --clients и --batch должны быть больше нуля")
+
+        Customer.objects.filter(email=BENCH_EMAIL).delete()
+        Product.objects.filter(sku=BENCH_SKU).delete()
+        customer = Customer.objects.create(first_name="Нагрузочный", last_name="Покупатель", email=BENCH_EMAIL)
+        product = Product.objects.create(name="Нагрузочный товар", sku=BENCH_SKU, price=1,
+                                         quantity=10 ** 9, is_active=False)
+        handler = PostgreSQLHandler()
+        try:
+            # Пробный заказ и ANALYZE: нового товара нет в статистике order_items, и без
+            # нее планировщик запроса сводки продаж сканирует весь индекс products
+            handler.create_order(customer.id, [{'product_id': product.id, 'quantity': 1}], "benchmark")
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE order_items")
+
+            self.stdout.write(f"Заказов: {options['orders']}, клиентов: {options['clients']}, "
+                              f"пачка до {options['batch']} за {options['wait_ms']} мс")
+            rates = {}
+            for mode in options['modes'] or MODES:
+                done, elapsed = self.run_mode(mode, handler, customer.id, product.id, options)
+                rates[mode] = done / elapsed
+                self.stdout.write(f"  {mode:7} заказов: {done:6}  за {elapsed:6.2f} с  "
+                                  f"в секунду: {rates[mode]:8.1f}")
+            if len(rates) == len(MODES):
+                self.stdout.write(f"Ускорение очереди: x{rates['queue'] / rates['direct']:.1f}")
+        finally:
+            self.cleanup(customer, product)
+
+    def run_mode(self, mode, handler, customer_id, product_id, options):
+        items = [{'product_id': product_id, 'quantity': 1}]
+        intake = OrderIntakeQueue(handler, options['batch'], options['wait_ms'] / 1000) if mode == 'queue' else None
+        shares = [options['orders'] // options['clients'] + (index < options['orders'] % options['clients'])
+                  for index in range(options['clients'])]
+        counts = [0] * options['clients']
+        errors = []
+
+        def client(index):
+            try:
+                for _ in range(shares[index]):
+                    if intake is None:
+                        order = handler.create_order(customer_id, items, "benchmark")
+                    else:
+                        order = intake.submit(customer_id, items, "benchmark").result()
+                    if order is None:
+                        raise RuntimeError("Заказ отклонен")
+                    counts[index] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(options['clients'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        if intake is not None:
+            intake.shutdown()
+        if errors:
+            raise CommandError(f"Ошибка в режиме {mode}: {errors[0]}")
+        return sum(counts), elapsed
+
+    @transaction.atomic
+    def cleanup(self, customer, product):
+        order_ids = list(Order.objects.filter(customer=customer).values_list('id', flat=True))
+        if order_ids:
+            # Сводка продаж учитывала эти заказы
+            SalesRollup().apply_orders(order_ids, -1)
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).delete()
+        customer.delete()
+        product.delete()
@@ -0,0 +1,164 @@
+"""
+Нагрузочная проверка списания остатка одного популярного товара.
+
+Каждый из --writers потоков (свое соединение) в цикле списывает одну
+единицу в отдельной транзакции и держит ее еще --hold-ms (остальная работа
+оформления заказа). Режимы:
+  naive   — чтение остатка и запись нового значения без блокировки (теряет обновления)
+  row     — условный UPDATE одной строки products (Inventory.decrement)
+  striped — то же по полосам остатка (Inventory.stripe)
+С --orders потоки в режимах row и striped оформляют полноценные заказы
+(create_order: позиция, сумма заказа, сводка продаж); созданные заказы и
+покупатель удаляются после замера. С --restripe-ms отдельный поток в
+режимах row и striped попеременно разносит остаток по полосам и собирает
+обратно (stripe/unstripe) во время списаний: потерянных обновлений и
+ложных нехваток быть не должно.
+
+Пример:
+  python manage.py benchmark_stock --writers 32 --duration 5 --stripes 16
+  python manage.py benchmark_stock --orders --mode row --mode striped
+  python manage.py benchmark_stock --mode row --mode striped --restripe-ms 20
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from database.Inventory import Inventory
+from database.PostgreSQLHandler import PostgreSQLHandler
+from database.SalesRollup import SalesRollup
+from database.models import Customer, Order, OrderItem, Product
+
+MODES = ['naive', 'row', 'striped']
+# Режимы, в которых списание может идти через create_order
+ORDER_MODES = ['row', 'striped']
+BENCH_SKU = 'BENCH-HOT-STOCK'
+BENCH_EMAIL = 'bench-hot-stock@example.com'
+INITIAL_STOCK = 10 ** 9
+
+
+class Command(BaseCommand):
+    help = "Пропускная способность списания остатка одного товара при конкурентной записи"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=32, help="Потоков-покупателей")
+        parser.add_argument('--duration', type=float, default=5, help="Длительность каждого режима, секунд")
+        parser.add_argument('--hold-ms', type=float, default=2, help="Время транзакции после списания, мс")
+        parser.add_argument('--stripes', type=int, default=Inventory.DEFAULT_STRIPES, help="Полос в режиме striped")
+        parser.add_argument('--mode', dest='modes', action='append', choices=MODES,
+                            help="Режим (по умолчанию все)")
+        parser.add_argument('--orders', action='store_true',
+                            help="Списывать через create_order (только режимы row и striped)")
+        parser.add_argument('--restripe-ms', type=float,
+                            help="Период stripe/unstripe во время списаний, мс (режимы row и striped)")
+
+    def handle(self, *args, **options):
+        if options['writers'] < 1 or options['stripes'] < 1:
+            raise CommandError("--writers и --stripes должны быть больше нуля")
+        modes = options['modes'] or (ORDER_MODES if options['orders'] else MODES)
+        if options['orders'] and set(modes) - set(ORDER_MODES):
+            raise CommandError("С --orders доступны только режимы row и striped")
+        if options['restripe_ms'] is not None and set(modes) - set(ORDER_MODES):
+            raise CommandError("С --restripe-ms доступны только режимы row и striped")
+
+        Product.objects.filter(sku=BENCH_SKU).delete()
+        Customer.objects.filter(email=BENCH_EMAIL).delete()
+        product = Product.objects.create(name="Нагрузочный товар", sku=BENCH_SKU, price=1,
+                                         quantity=INITIAL_STOCK, is_active=False)
+        customer = None
+        if options['orders']:
+            customer = Customer.objects.create(first_name="Нагрузочный", last_name="Покупатель",
+                                               email=BENCH_EMAIL)
+        inventory = Inventory()
+        try:
+            self.stdout.write(f"Потоков: {options['writers']}, удержание транзакции: {options['hold_ms']} мс"
+                              + (", списание заказами create_order" if options['orders'] else ""))
+            for mode in modes:
+                inventory.unstripe(product.id)
+                Product.objects.filter(id=product.id).update(quantity=INITIAL_STOCK)
+                if mode == 'striped':
+                    inventory.stripe(product.id, options['stripes'])
+
+                done, elapsed, restripes = self.run_mode(mode, product.id, customer, options)
+                left = inventory.stock([product.id])[product.id]
+                lost = done - (INITIAL_STOCK - left)
+                self.stdout.write(
+                    f"  {mode:8} списаний: {done:7}  в секунду: {done / elapsed:9.1f}  "
+                    f"потеряно обновлений: {lost}"
+                    + (f"  stripe/unstripe: {restripes}" if options['restripe_ms'] is not None else "")
+                )
+        finally:
+            inventory.unstripe(product.id)
+            if customer is not None:
+                self.delete_orders(customer)
+                customer.delete()
+            product.delete()
+
+    def run_mode(self, mode, product_id, customer, options):
+        deadline = time.monotonic() + options['duration']
+        hold = options['hold_ms'] / 1000
+        counts = [0] * options['writers']
+        errors = []
+        handler = PostgreSQLHandler() if customer is not None else None
+
+        def writer(index):
+            inventory = Inventory()
+            try:
+                while time.monotonic() < deadline:
+                    with transaction.atomic():
+                        if mode == 'naive':
+                            product = Product.objects.get(id=product_id)
+                            product.quantity -= 1
+                            product.save(update_fields=['quantity'])
+                        elif handler is not None:
+                            if handler.create_order(customer.id, [{'product_id': product_id, 'quantity': 1}],
+                                                    "benchmark") is None:
+                                raise RuntimeError("Заказ отклонен")
+                        elif inventory.decrement({product_id: 1}):
+                            raise RuntimeError("Остаток закончился")
+                        time.sleep(hold)
+                    counts[index] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        restripes = [0]
+
+        def restriper():
+            # Разнесение и сбор остатка, пока потоки списывают
+            inventory = Inventory()
+            try:
+                while time.monotonic() < deadline:
+                    time.sleep(options['restripe_ms'] / 1000)
+                    if inventory.unstripe(product_id) is None:
+                        inventory.stripe(product_id, options['stripes'])
+                    restripes[0] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        if options['restripe_ms'] is not None:
+            threads.append(threading.Thread(target=restriper))
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        if errors:
+            raise CommandError(f"Ошибка в режиме {mode}: {errors[0]}")
+        return sum(counts), elapsed, restripes[0]
+
+    @staticmethod
+    @transaction.atomic
+    def delete_orders(customer):
+        order_ids = list(Order.objects.filter(customer=customer).values_list('id', flat=True))
+        if order_ids:
+            # Сводка продаж учитывала эти заказы
+            SalesRollup().apply_orders(order_ids, -1)
+        OrderItem.objects.filter(order_id__in=order_ids).delete()
+        Order.objects.filter(id__in=order_ids).delete()
@@ -0,0 +1,38 @@
+"""
+Создание будущих месячных секций orders и order_items.
+
+Примеры:
+  python manage.py ensure_partitions
+  python manage.py ensure_partitions --ahead 6
+  python manage.py ensure_partitions --list
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from database.Partitioning import PARTITIONED_TABLES, ensure_partitions, is_partitioned, list_partitions
+
+
+class Command(BaseCommand):
+    help = "Создание месячных секций заказов на несколько месяцев вперед"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='на сколько месяцев вперед от текущего создавать секции (по умолчанию 3)')
+        parser.add_argument('--list', action='store_true', help='показать секции таблиц')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError("Таблица orders не секционирована — примените миграции (manage.py migrate)")
+
+        created = ensure_partitions(options['ahead'])
+        for name in created:
+            self.stdout.write(f"  создана секция {name}")
+        self.stdout.write(self.style.SUCCESS(f"Создано секций: {len(created)}"))
+
+        if options['list']:
+            with connection.cursor() as cursor:
+                for table in PARTITIONED_TABLES:
+                    self.stdout.write(f"{table}:")
+                    for name, bounds, rows in list_partitions(cursor, table):
+                        self.stdout.write(f"  {name:<28} {bounds}  ~{max(rows, 0)} строк")
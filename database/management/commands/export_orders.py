@@ -0,0 +1,44 @@
+"""
+Потоковая выгрузка заказов с позициями в CSV (опционально gzip).
+
+Пример:
+  python manage.py export_orders orders_2025.csv.gz --from 2025-01-01 --to 2026-01-01 --status delivered
+  python manage.py export_orders history.csv --include-archived
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from database.PostgreSQLHandler import PostgreSQLHandler
+from database.models import Order
+
+
+class Command(BaseCommand):
+    help = "Выгрузка заказов с позициями через COPY TO STDOUT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл выгрузки (.csv или .csv.gz)")
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help="Начало периода, ГГГГ-ММ-ДД (включительно)")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help="Конец периода, ГГГГ-ММ-ДД (не включительно)")
+        parser.add_argument('--status', dest='statuses', action='append',
+                            choices=[code for code, _ in Order.STATUS_CHOICES],
+                            help="Статус заказа (можно указать несколько раз)")
+        parser.add_argument('--gzip', dest='compress', action='store_true', default=None,
+                            help="Сжимать gzip (по умолчанию — если путь оканчивается на .gz)")
+        parser.add_argument('--include-archived', action='store_true',
+                            help="Выгрузить и архивные заказы (archive_orders)")
+
+    def handle(self, *args, **options):
+        rows = PostgreSQLHandler().export_orders(
+            options['path'],
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            statuses=options['statuses'],
+            compress=options['compress'],
+            include_archived=options['include_archived'],
+        )
+        if rows < 0:
+            raise CommandError("Выгрузка не выполнена")
+        self.stdout.write(self.style.SUCCESS(f"Выгружено строк: {rows}"))
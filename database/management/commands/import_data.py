@@ -0,0 +1,48 @@
+"""
+Массовый импорт клиентов и товаров из CSV/JSONL.
+
+Пример:
+  python manage.py import_data products catalog.csv --rejects rejects.csv
+"""
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from database.PostgreSQLHandler import PostgreSQLHandler
+
+
+class Command(BaseCommand):
+    help = "Импорт клиентов или товаров из CSV/JSONL через COPY"
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=['customers', 'products'], help="Целевая таблица")
+        parser.add_argument('path', help="Путь к файлу CSV или JSONL")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], dest='file_format',
+                            help="Формат файла (по умолчанию — по расширению)")
+        parser.add_argument('--rejects', help="Файл CSV для отклоненных строк (по умолчанию — stderr)")
+
+    def handle(self, *args, **options):
+        rejects_file = open(options['rejects'], 'w', newline='', encoding='utf-8') if options['rejects'] else None
+        try:
+            if rejects_file:
+                writer = csv.writer(rejects_file)
+                writer.writerow(['line', 'reason'])
+                on_reject = lambda line_no, reason: writer.writerow([line_no, reason])
+            else:
+                on_reject = lambda line_no, reason: self.stderr.write(f"строка {line_no}: {reason}")
+
+            handler = PostgreSQLHandler()
+            if options['table'] == 'customers':
+                stats = handler.import_customers(options['path'], options['file_format'], on_reject)
+            else:
+                stats = handler.import_products(options['path'], options['file_format'], on_reject)
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        if not stats:
+            raise CommandError("Импорт не выполнен")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано: {stats['read']}, добавлено: {stats['inserted']}, отклонено: {stats['rejected']}"
+        ))
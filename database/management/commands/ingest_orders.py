@@ -0,0 +1,198 @@
+"""
+Параллельная загрузка заказов из внешних систем (см. database/OrderIngest.py).
+
+Повторный запуск с тем же файлом продолжает загрузку с отметок прогресса;
+--restart начинает ее заново (уже загруженные заказы остаются). Если файл
+изменился с начала задания (размер или время изменения), продолжение
+отклоняется — нужен --restart.
+
+Примеры:
+  python manage.py ingest_orders legacy_orders.jsonl --workers 4 --batch-size 1000
+  python manage.py ingest_orders legacy_orders.csv --rejects rejects.csv
+"""
+import csv
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from database.ChangeFeed import notify_reload
+from database.OrderIngest import ingest_shard, split_orders
+from database.Partitioning import add_months, ensure_partitions, month_start
+from database.PostgreSQLHandler import PostgreSQLHandler
+from database.models import IngestCheckpoint
+
+DEFAULT_SHARDS = 16
+
+
+class Command(BaseCommand):
+    help = "Загрузка заказов из CSV/JSONL параллельными процессами с продолжением после сбоя"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к файлу CSV или JSONL")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], dest='file_format',
+                            help="Формат файла (по умолчанию — по расширению)")
+        parser.add_argument('--shards', type=int,
+                            help=f"Шардов по покупателям (по умолчанию {DEFAULT_SHARDS}, при продолжении — "
+                                 f"как в первом запуске)")
+        parser.add_argument('--workers', type=int, help="Процессов (по умолчанию — число CPU, не больше шардов)")
+        parser.add_argument('--batch-size', type=int, default=500, help="Заказов в одной транзакции")
+        parser.add_argument('--job', help="Имя задания для отметок прогресса (по умолчанию — полный путь файла)")
+        parser.add_argument('--restart', action='store_true', help="Сбросить отметки и загрузить файл заново")
+        parser.add_argument('--rejects', help="Файл CSV для отклоненных записей (по умолчанию — stderr)")
+        parser.add_argument('--progress-interval', type=float, default=2, help="Период вывода прогресса, секунд")
+
+    def handle(self, *args, **options):
+        if not Path(options['path']).is_file():
+            raise CommandError(f"Файл не найден: {options['path']}")
+        job = options['job'] or str(Path(options['path']).resolve())
+        if options['restart']:
+            IngestCheckpoint.objects.filter(job=job).delete()
+
+        # Шарды задаются первым запуском: от их числа зависит, какие записи в каком шарде
+        stat = os.stat(options['path'])
+        checkpoint = (IngestCheckpoint.objects.filter(job=job)
+                      .values_list('shards', 'file_size', 'file_mtime_ns').first())
+        started_with = checkpoint[0] if checkpoint else None
+        shards = options['shards'] or started_with or DEFAULT_SHARDS
+        if started_with and shards != started_with:
+            raise CommandError(f"Задание начато с --shards {started_with}; укажите его или --restart")
+        # Позиции отметок относятся к записям исходного файла — после его изменения они неверны
+        if checkpoint and checkpoint[1:] != (None, None) and checkpoint[1:] != (stat.st_size, stat.st_mtime_ns):
+            raise CommandError("Файл изменился с начала задания; для загрузки заново укажите --restart")
+        workers = options['workers'] or min(os.cpu_count() or 1, shards)
+        if shards < 1 or workers < 1 or options['batch_size'] < 1:
+            raise CommandError("--shards, --workers и --batch-size должны быть больше нуля")
+
+        # При продолжении отказы дописываются; отказы разбора уже выведены первым запуском
+        resuming = started_with is not None
+        append = resuming and options['rejects'] and Path(options['rejects']).exists()
+        rejects_file = (open(options['rejects'], 'a' if append else 'w', newline='', encoding='utf-8')
+                        if options['rejects'] else None)
+        try:
+            if rejects_file:
+                writer = csv.writer(rejects_file)
+                if not append:
+                    writer.writerow(['line', 'reason'])
+                on_reject = lambda line_no, reason: writer.writerow([line_no, reason])
+            else:
+                on_reject = lambda line_no, reason: self.stderr.write(f"строка {line_no}: {reason}")
+
+            with tempfile.TemporaryDirectory(prefix='ingest_orders_') as directory:
+                started = time.monotonic()
+                split = split_orders(options['path'], shards, directory, options['file_format'],
+                                     None if resuming else on_reject)
+                self.stdout.write(
+                    f"Прочитано записей: {split['read']}, отклонено при разборе: {split['rejected']} "
+                    f"({time.monotonic() - started:.1f} с)"
+                )
+                self.ensure_partitions(split['first_date'], split['last_date'])
+
+                for shard in range(shards):
+                    IngestCheckpoint.objects.get_or_create(job=job, shard=shard, defaults={
+                        'shards': shards, 'file_size': stat.st_size, 'file_mtime_ns': stat.st_mtime_ns,
+                    })
+                positions = dict(IngestCheckpoint.objects.filter(job=job).values_list('shard', 'position'))
+                pending = [shard for shard in range(shards) if split['counts'][shard] > positions[shard]]
+                remaining = sum(split['counts'][shard] - positions[shard] for shard in pending)
+                if positions and any(positions.values()):
+                    self.stdout.write(f"Продолжение с отметок: осталось записей {remaining}")
+
+                totals = self.run_workers(job, pending, split['paths'], workers, options, remaining, on_reject)
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        if totals['orders']:
+            with transaction.atomic(), connection.cursor() as cursor:
+                notify_reload(cursor, 'orders')
+            PostgreSQLHandler.invalidate_stats_cache()
+            PostgreSQLHandler.invalidate_catalog_cache()
+
+        # Отказы разбора при продолжении не выводятся повторно — и в итог не входят
+        rejected = totals['rejected'] + (0 if resuming else split['rejected'])
+        done = IngestCheckpoint.objects.filter(job=job)
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено заказов: {totals['orders']}, позиций: {totals['items']}, "
+            f"отклонено: {rejected}; всего по заданию заказов: {sum(c.orders for c in done)}"
+        ))
+
+    def ensure_partitions(self, first_date, last_date):
+        """Месячные секции на период заказов файла (иначе строки уйдут в секцию по умолчанию)"""
+        if first_date is None:
+            return
+        first = month_start(timezone.localtime(first_date).date())
+        last = month_start(timezone.localtime(last_date).date())
+        months = 0
+        while add_months(first, months) < last:
+            months += 1
+        created = ensure_partitions(months, today=first)
+        if created:
+            self.stdout.write(f"Созданы секции: {', '.join(created)}")
+
+    def run_workers(self, job, pending, paths, workers, options, remaining, on_reject):
+        totals = {'orders': 0, 'items': 0, 'rejected': 0}
+        if not pending:
+            return totals
+
+        # spawn: процессы не наследуют соединение и потоки родителя (и так же работают в Windows);
+        # Django настраивается в каждом процессе до первой задачи
+        context = multiprocessing.get_context('spawn')
+        started = time.monotonic()
+        last_report = started
+
+        def report():
+            elapsed = max(time.monotonic() - started, 1e-9)
+            processed = totals['orders'] + totals['rejected']
+            rows = totals['orders'] + totals['items']
+            self.stdout.write(
+                f"  записей {processed}/{remaining} ({100 * processed / remaining:.1f}%), "
+                f"заказов {totals['orders']}, позиций {totals['items']}, отклонено {totals['rejected']}, "
+                f"{rows / elapsed:.0f} строк/с"
+            )
+
+        with context.Manager() as manager:
+            events = manager.Queue()
+            with ProcessPoolExecutor(min(workers, len(pending)), mp_context=context,
+                                     initializer=django.setup) as pool:
+                futures = {pool.submit(ingest_shard, job, shard, paths[shard], options['batch_size'], events): shard
+                           for shard in pending}
+                not_done = set(futures)
+                failed = None
+                while not_done and failed is None:
+                    finished, not_done = wait(not_done, timeout=0.5, return_when=FIRST_EXCEPTION)
+                    self.drain(events, totals, on_reject)
+                    failed = next((future for future in finished if future.exception()), None)
+                    if time.monotonic() - last_report >= options['progress_interval']:
+                        last_report = time.monotonic()
+                        report()
+                if failed is not None:
+                    for future in not_done:
+                        future.cancel()
+            self.drain(events, totals, on_reject)
+        report()
+
+        if failed is not None:
+            raise CommandError(
+                f"Шард {futures[failed]}: {failed.exception()}. "
+                f"Записанные пачки сохранены, повторный запуск продолжит загрузку"
+            )
+        return totals
+
+    @staticmethod
+    def drain(events, totals, on_reject):
+        while not events.empty():
+            kind, *payload = events.get()
+            if kind == 'reject':
+                on_reject(*payload)
+            else:
+                _, stats = payload
+                for key in totals:
+                    totals[key] += stats[key]
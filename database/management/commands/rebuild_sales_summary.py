@@ -0,0 +1,19 @@
+"""
+Полный пересчет сводки продаж sales_summary по таблицам заказов.
+
+Пример:
+  python manage.py rebuild_sales_summary
+"""
+from django.core.management.base import BaseCommand
+
+from database.PostgreSQLHandler import PostgreSQLHandler
+from database.SalesRollup import SalesRollup
+
+
+class Command(BaseCommand):
+    help = "Пересчет сводки продаж (день × категория × статус)"
+
+    def handle(self, *args, **options):
+        rows = SalesRollup().rebuild()
+        PostgreSQLHandler.invalidate_stats_cache()
+        self.stdout.write(self.style.SUCCESS(f"Сводка продаж пересчитана, строк: {rows}"))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_sales_summary(apps, schema_editor):
+    # Начальное заполнение сводки по уже существующим заказам
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO sales_summary (day, category, status, revenue, quantity, order_count)
+            SELECT (o.order_date AT TIME ZONE %s)::date, p.category, o.status,
+                   SUM(oi.total_price), SUM(oi.quantity), COUNT(DISTINCT o.id)
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            JOIN products p ON p.id = oi.product_id
+            GROUP BY 1, 2, 3
+            """,
+            [settings.TIME_ZONE]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0003_customer_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('category', models.CharField(choices=[('electronics', 'Электроника'), ('clothing', 'Одежда'), ('books', 'Книги'), ('food', 'Продукты'), ('other', 'Другое')], max_length=50, verbose_name='Категория')),
+                ('status', models.CharField(choices=[('pending', 'В обработке'), ('processing', 'В процессе'), ('shipped', 'Отправлен'), ('delivered', 'Доставлен'), ('cancelled', 'Отменен')], max_length=20, verbose_name='Статус')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('quantity', models.BigIntegerField(default=0, verbose_name='Продано единиц')),
+                ('order_count', models.IntegerField(default=0, verbose_name='Заказов')),
+            ],
+            options={
+                'verbose_name': 'Сводка продаж',
+                'verbose_name_plural': 'Сводки продаж',
+                'db_table': 'sales_summary',
+                'unique_together': {('day', 'category', 'status')},
+            },
+        ),
+        migrations.RunPython(fill_sales_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+"""
+Триграммные GIN-индексы для поиска клиентов по подстроке.
+
+Если расширение pg_trgm недоступно на сервере, миграция ничего не делает,
+а PostgreSQLHandler.search_customers использует запасной поиск через ORM.
+"""
+from django.db import migrations
+
+TRIGRAM_COLUMNS = ['first_name', 'last_name', 'email', 'phone']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            print("\n⚠️ Расширение pg_trgm недоступно — триграммные индексы не созданы")
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in TRIGRAM_COLUMNS:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS customers_{column}_trgm_idx "
+                f"ON customers USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for column in TRIGRAM_COLUMNS:
+            cursor.execute(f"DROP INDEX IF EXISTS customers_{column}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0004_salessummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0005_customer_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='order_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата заказа'),
+            preserve_default=False,
+        ),
+        # Дата позиции — дата ее заказа
+        migrations.RunSQL(
+            "UPDATE order_items oi SET order_date = o.order_date FROM orders o WHERE o.id = oi.order_id",
+            migrations.RunSQL.noop,
+        ),
+    ]
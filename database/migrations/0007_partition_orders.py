@@ -0,0 +1,37 @@
+"""
+Помесячное секционирование orders и order_items по order_date.
+
+Таблицы пересоздаются секционированными с переносом данных (см.
+database/Partitioning.py). Ссылка позиции на заказ становится составной
+(order_id, order_date), поэтому внешний ключ Django по order_id отключается.
+"""
+from django.db import migrations, models
+import django.db.models.deletion
+
+from database.Partitioning import partition_tables, unpartition_tables
+
+
+def forwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        partition_tables(cursor)
+
+
+def backwards(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        unpartition_tables(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0006_orderitem_order_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='database.order', verbose_name='Заказ'),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
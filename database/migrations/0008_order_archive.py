@@ -0,0 +1,42 @@
+"""
+Архивные таблицы заказов и позиций (см. database/OrderArchiver.py).
+
+Структура повторяет orders и order_items, но без секционирования и
+identity: строки переносятся с исходными id. archived_at — время переноса.
+"""
+from django.db import migrations
+
+
+CREATE_SQL = """
+CREATE TABLE orders_archive (LIKE orders INCLUDING DEFAULTS);
+ALTER TABLE orders_archive
+    ADD COLUMN archived_at timestamp with time zone NOT NULL DEFAULT NOW(),
+    ADD PRIMARY KEY (id),
+    ADD CONSTRAINT orders_archive_customer_fk FOREIGN KEY (customer_id) REFERENCES customers (id);
+CREATE INDEX orders_archive_customer_date_idx ON orders_archive (customer_id, order_date);
+CREATE INDEX orders_archive_status_date_idx ON orders_archive (status, order_date);
+
+CREATE TABLE order_items_archive (LIKE order_items INCLUDING DEFAULTS);
+ALTER TABLE order_items_archive
+    ADD PRIMARY KEY (id),
+    ADD CONSTRAINT order_items_archive_order_fk FOREIGN KEY (order_id) REFERENCES orders_archive (id)
+        DEFERRABLE INITIALLY DEFERRED,
+    ADD CONSTRAINT order_items_archive_product_fk FOREIGN KEY (product_id) REFERENCES products (id);
+CREATE INDEX order_items_archive_order_idx ON order_items_archive (order_id);
+"""
+
+DROP_SQL = """
+DROP TABLE order_items_archive;
+DROP TABLE orders_archive;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0007_partition_orders'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+    ]
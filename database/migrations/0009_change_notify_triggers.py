@@ -0,0 +1,71 @@
+"""
+Триггеры NOTIFY об изменениях клиентов, товаров, заказов и позиций.
+
+Каждая измененная строка отправляет в канал db_changes компактный JSON:
+{"t": таблица, "id": id, "op": "I"|"U"|"D"}, для позиций еще "p" — id заказа.
+Массовые операции отключают триггеры параметром app.notify_changes = 'off'
+и шлют одно уведомление {"t": таблица, "op": "R"} (см. database/ChangeFeed.py).
+Триггеры на секционированных orders/order_items переходят и на новые секции.
+"""
+from django.db import migrations
+
+
+NOTIFY_TABLES = [
+    ('customers', None),
+    ('products', None),
+    ('orders', None),
+    ('order_items', 'order_id'),
+]
+
+CREATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION notify_change() RETURNS trigger AS $$
+DECLARE
+    rec jsonb;
+    payload jsonb;
+BEGIN
+    IF current_setting('app.notify_changes', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        rec := to_jsonb(OLD);
+    ELSE
+        rec := to_jsonb(NEW);
+    END IF;
+    payload := jsonb_build_object('t', TG_ARGV[0], 'id', rec -> 'id', 'op', left(TG_OP, 1));
+    IF TG_NARGS > 1 THEN
+        payload := payload || jsonb_build_object('p', rec -> TG_ARGV[1]);
+    END IF;
+    PERFORM pg_notify('db_changes', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def create_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_FUNCTION)
+        for table, parent in NOTIFY_TABLES:
+            args = f"'{table}'" + (f", '{parent}'" if parent else "")
+            cursor.execute(
+                f"CREATE TRIGGER {table}_notify_change AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION notify_change({args})"
+            )
+
+
+def drop_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table, _ in NOTIFY_TABLES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_notify_change ON {table}")
+        cursor.execute("DROP FUNCTION IF EXISTS notify_change()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0008_order_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,80 @@
+"""
+Выборка изменений по отметке времени (PostgreSQLHandler.get_changes_since).
+
+Товары получают updated_at (у существующих строк — дата создания),
+customers, products и orders — индекс (updated_at, id). Удаления
+записываются триггером в таблицу deleted_rows: (таблица, id, время удаления).
+"""
+from django.db import migrations, models
+
+
+TOMBSTONE_TABLES = ['customers', 'products', 'orders']
+
+CREATE_SQL = """
+CREATE TABLE deleted_rows (
+    table_name varchar(50) NOT NULL,
+    row_id bigint NOT NULL,
+    deleted_at timestamp with time zone NOT NULL DEFAULT NOW()
+);
+CREATE INDEX deleted_rows_table_deleted_idx ON deleted_rows (table_name, deleted_at);
+
+CREATE OR REPLACE FUNCTION record_deletion() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO deleted_rows (table_name, row_id) VALUES (TG_ARGV[0], OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+DROP_SQL = """
+DROP FUNCTION IF EXISTS record_deletion();
+DROP TABLE deleted_rows;
+"""
+
+
+def create_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TOMBSTONE_TABLES:
+            cursor.execute(
+                f"CREATE TRIGGER {table}_record_deletion AFTER DELETE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION record_deletion('{table}')"
+            )
+
+
+def drop_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TOMBSTONE_TABLES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_record_deletion ON {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0009_change_notify_triggers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.RunSQL(
+            "SELECT set_config('app.notify_changes', 'off', true); UPDATE products SET updated_at = created_at",
+            migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['updated_at', 'id'], name='customers_updated_697413_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at', 'id'], name='orders_updated_4de207_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'id'], name='products_updated_751206_idx'),
+        ),
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:56
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Индексы строятся CONCURRENTLY, без блокировки записи в products
+    atomic = False
+
+    dependencies = [
+        ('database', '0010_changes_since'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', 'name', 'id'], name='products_active_category_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['quantity', 'id'], include=('category',), name='products_active_quantity_idx'),
+        ),
+        # Индекс по одному is_active малоизбирателен и заменен частичными
+        RemoveIndexConcurrently(
+            model_name='product',
+            name='products_is_acti_cb485f_idx',
+        ),
+    ]
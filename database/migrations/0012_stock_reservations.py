@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0011_product_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Количество')),
+                ('status', models.CharField(choices=[('held', 'Удерживается'), ('committed', 'Оформлен в заказ'), ('released', 'Возвращен')], default='held', max_length=20, verbose_name='Статус')),
+                ('order_id', models.IntegerField(blank=True, null=True, verbose_name='Заказ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('expires_at', models.DateTimeField(verbose_name='Действует до')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='database.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Резерв товара',
+                'verbose_name_plural': 'Резервы товаров',
+                'db_table': 'stock_reservations',
+                'indexes': [models.Index(condition=models.Q(('status', 'held')), fields=['expires_at'], name='stock_res_held_expires_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockStripe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stripe', models.SmallIntegerField(verbose_name='Номер полосы')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Остаток')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_stripes', to='database.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Полоса остатка',
+                'verbose_name_plural': 'Полосы остатков',
+                'db_table': 'stock_stripes',
+                'unique_together': {('product', 'stripe')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0012_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=255, verbose_name='Задание')),
+                ('shard', models.IntegerField(verbose_name='Шард')),
+                ('shards', models.IntegerField(verbose_name='Всего шардов')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Обработано записей')),
+                ('orders', models.BigIntegerField(default=0, verbose_name='Добавлено заказов')),
+                ('items', models.BigIntegerField(default=0, verbose_name='Добавлено позиций')),
+                ('rejected', models.BigIntegerField(default=0, verbose_name='Отклонено записей')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Отметка загрузки заказов',
+                'verbose_name_plural': 'Отметки загрузки заказов',
+                'db_table': 'ingest_checkpoints',
+                'unique_together': {('job', 'shard')},
+            },
+        ),
+    ]
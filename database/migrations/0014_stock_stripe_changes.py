@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+def create_trigger(apps, schema_editor):
+    # Функция notify_change — из 0009; "p" — товар, остаток которого изменился
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TRIGGER stock_stripes_notify_change AFTER INSERT OR UPDATE OR DELETE ON stock_stripes "
+            "FOR EACH ROW EXECUTE FUNCTION notify_change('stock_stripes', 'product_id')"
+        )
+
+
+def drop_trigger(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER IF EXISTS stock_stripes_notify_change ON stock_stripes")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0013_ingest_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockstripe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='stockstripe',
+            index=models.Index(fields=['updated_at'], name='stock_strip_updated_2f8e1c_idx'),
+        ),
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0014_stock_stripe_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesSummaryDelta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField(verbose_name='День')),
+                ('category', models.CharField(choices=[('electronics', 'Электроника'), ('clothing', 'Одежда'), ('books', 'Книги'), ('food', 'Продукты'), ('other', 'Другое')], max_length=50, verbose_name='Категория')),
+                ('status', models.CharField(choices=[('pending', 'В обработке'), ('processing', 'В процессе'), ('shipped', 'Отправлен'), ('delivered', 'Доставлен'), ('cancelled', 'Отменен')], max_length=20, verbose_name='Статус')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('quantity', models.BigIntegerField(default=0, verbose_name='Продано единиц')),
+                ('order_count', models.IntegerField(default=0, verbose_name='Заказов')),
+            ],
+            options={
+                'verbose_name': 'Изменение сводки продаж',
+                'verbose_name_plural': 'Изменения сводки продаж',
+                'db_table': 'sales_summary_deltas',
+            },
+        ),
+    ]
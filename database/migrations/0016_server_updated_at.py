@@ -0,0 +1,67 @@
+"""
+Время изменения строк по часам сервера.
+
+auto_now ставит updated_at по часам клиента, а отметку get_changes_since
+дает сервер: у клиента с отстающими часами изменения оказывались раньше
+отметки и терялись. Триггер BEFORE INSERT OR UPDATE перезаписывает
+updated_at временем сервера на момент записи (clock_timestamp(), а не
+начало транзакции), deleted_rows.deleted_at — тоже.
+"""
+from django.db import migrations
+
+
+UPDATED_AT_TABLES = ['customers', 'products', 'orders', 'stock_stripes']
+
+CREATE_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_deletion() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO deleted_rows (table_name, row_id, deleted_at) VALUES (TG_ARGV[0], OLD.id, clock_timestamp());
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+RESTORE_RECORD_DELETION = """
+CREATE OR REPLACE FUNCTION record_deletion() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO deleted_rows (table_name, row_id) VALUES (TG_ARGV[0], OLD.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def create_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_FUNCTIONS)
+        for table in UPDATED_AT_TABLES:
+            cursor.execute(
+                f"CREATE TRIGGER {table}_set_updated_at BEFORE INSERT OR UPDATE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION set_updated_at()"
+            )
+
+
+def drop_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in UPDATED_AT_TABLES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_set_updated_at ON {table}")
+        cursor.execute("DROP FUNCTION IF EXISTS set_updated_at()")
+        cursor.execute(RESTORE_RECORD_DELETION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0015_sales_summary_deltas'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
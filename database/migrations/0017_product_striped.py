@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0016_server_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='striped',
+            field=models.BooleanField(db_default=False, default=False, verbose_name='Остаток в полосах'),
+        ),
+        # Товары, у которых уже есть полосы
+        migrations.RunSQL(
+            "SELECT set_config('app.notify_changes', 'off', true); "
+            "UPDATE products SET striped = TRUE WHERE id IN (SELECT product_id FROM stock_stripes)",
+            migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('database', '0017_product_striped'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestcheckpoint',
+            name='file_size',
+            field=models.BigIntegerField(null=True, verbose_name='Размер файла'),
+        ),
+        migrations.AddField(
+            model_name='ingestcheckpoint',
+            name='file_mtime_ns',
+            field=models.BigIntegerField(null=True, verbose_name='Время изменения файла, нс'),
+        ),
+    ]
@@ -19,6 +19,7 @@ class Customer(models.Model):
     address = models.TextField(verbose_name="Адрес", blank=True)
     # Служебные поля (заполняются автоматически)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # В базе значение перезаписывает триггер по часам сервера (миграция 0016_server_updated_at)
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
     class Meta:
@@ -29,6 +30,8 @@ class Customer(models.Model):
         indexes = [
             models.Index(fields=['email']),
             models.Index(fields=['last_name', 'first_name']),
+            # Выборка изменений после отметки времени (get_changes_since)
+            models.Index(fields=['updated_at', 'id']),
         ]
 
     def __str__(self):
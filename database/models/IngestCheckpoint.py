@@ -0,0 +1,35 @@
+"""
+Модель отметки прогресса загрузки заказов (manage.py ingest_orders).
+"""
+from django.db import models
+
+
+class IngestCheckpoint(models.Model):
+    """
+    Прогресс одной части (шарда) загрузки заказов из файла.
+
+    position — число обработанных записей шарда; обновляется в той же
+    транзакции, что и записанная пачка заказов, поэтому после сбоя
+    загрузка продолжается с первой незаписанной записи без повторов.
+    file_size и file_mtime_ns — файл, с которого начато задание: продолжать
+    загрузку из измененного файла нельзя.
+    """
+    job = models.CharField(max_length=255, verbose_name="Задание")
+    shard = models.IntegerField(verbose_name="Шард")
+    shards = models.IntegerField(verbose_name="Всего шардов")
+    file_size = models.BigIntegerField(null=True, verbose_name="Размер файла")
+    file_mtime_ns = models.BigIntegerField(null=True, verbose_name="Время изменения файла, нс")
+    position = models.BigIntegerField(default=0, verbose_name="Обработано записей")
+    orders = models.BigIntegerField(default=0, verbose_name="Добавлено заказов")
+    items = models.BigIntegerField(default=0, verbose_name="Добавлено позиций")
+    rejected = models.BigIntegerField(default=0, verbose_name="Отклонено записей")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        db_table = 'ingest_checkpoints'
+        verbose_name = 'Отметка загрузки заказов'
+        verbose_name_plural = 'Отметки загрузки заказов'
+        unique_together = ['job', 'shard']
+
+    def __str__(self):
+        return f"{self.job} #{self.shard}: {self.position}"
@@ -22,6 +22,15 @@ class Order(models.Model):
         ('cancelled', 'Отменен'),
     ]
 
+    # Допустимые переходы статусов: из ключа — в любой из статусов значения
+    STATUS_TRANSITIONS = {
+        'pending': ('processing', 'cancelled'),
+        'processing': ('shipped', 'cancelled'),
+        'shipped': ('delivered',),
+        'delivered': (),
+        'cancelled': (),
+    }
+
     customer = models.ForeignKey(
         Customer,
         on_delete=models.PROTECT,  # Запрет удаления клиента при наличии заказов
@@ -46,6 +55,7 @@ class Order(models.Model):
     )
     notes = models.TextField(verbose_name="Примечания", blank=True)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # В базе значение перезаписывает триггер по часам сервера (миграция 0016_server_updated_at)
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
     class Meta:
@@ -56,8 +66,19 @@ class Order(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['order_date']),
             models.Index(fields=['customer', 'order_date']),
+            # Выборка изменений после отметки времени (get_changes_since)
+            models.Index(fields=['updated_at', 'id']),
         ]
         ordering = ['-order_date']  # Свежие заказы первыми
 
+    @classmethod
+    def allowed_predecessors(cls, new_status):
+        """Статусы, из которых можно перейти в new_status"""
+        return [status for status, targets in cls.STATUS_TRANSITIONS.items() if new_status in targets]
+
+    def can_change_status(self, new_status):
+        """Допустим ли переход из текущего статуса в new_status"""
+        return new_status in self.STATUS_TRANSITIONS.get(self.status, ())
+
     def __str__(self):
         return f"Заказ #{self.id} - {self.customer}"
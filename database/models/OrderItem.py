@@ -15,13 +15,18 @@ class OrderItem(models.Model):
     Связывает заказ и товар, хранит количество и цены. Один и тот же товар
     в одном заказе может быть только в одной позиции (unique_together).
     total_price пересчитывается в save().
+
+    order_date копирует дату заказа: по ней таблица секционирована, и позиция
+    ссылается на заказ парой (order_id, order_date) — см. database/Partitioning.py.
     """
     order = models.ForeignKey(
         Order,
         on_delete=models.CASCADE,  # При удалении заказа удаляются и позиции
         related_name='items',
-        verbose_name="Заказ"
+        verbose_name="Заказ",
+        db_constraint=False  # Внешний ключ в БД — составной, по (order_id, order_date)
     )
+    order_date = models.DateTimeField(verbose_name="Дата заказа", editable=False)
     product = models.ForeignKey(
         Product,
         on_delete=models.PROTECT,  # Не удалять товар, на который есть заказы
@@ -51,6 +56,8 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         # Автоматически рассчитываем общую стоимость позиции
         self.total_price = self.unit_price * self.quantity
+        if self.order_date is None:
+            self.order_date = self.order.order_date
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -42,7 +42,12 @@ class Product(models.Model):
     )
     sku = models.CharField(max_length=50, unique=True, verbose_name="Артикул")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    # В базе значение перезаписывает триггер по часам сервера (миграция 0016_server_updated_at)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     is_active = models.BooleanField(default=True, verbose_name="Активен")
+    # Остаток разнесен по полосам stock_stripes (ставит и снимает database.Inventory
+    # под блокировкой строки товара, поэтому условие списания перепроверяется по нему)
+    striped = models.BooleanField(default=False, db_default=False, verbose_name="Остаток в полосах")
 
     class Meta:
         db_table = 'products'
@@ -51,7 +56,14 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['category']),
             models.Index(fields=['sku']),
-            models.Index(fields=['is_active']),
+            # Частичные индексы по активным товарам: каталог по категории
+            # и проверка остатков (category в индексе — для index-only scan)
+            models.Index(fields=['category', 'name', 'id'], name='products_active_category_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['quantity', 'id'], name='products_active_quantity_idx',
+                         include=['category'], condition=models.Q(is_active=True)),
+            # Выборка изменений после отметки времени (get_changes_since)
+            models.Index(fields=['updated_at', 'id']),
         ]
 
     def __str__(self):
@@ -0,0 +1,33 @@
+"""
+Модель сводки продаж (агрегат по дням, категориям и статусам).
+"""
+from django.db import models
+
+from .Order import Order
+from .Product import Product
+
+
+class SalesSummary(models.Model):
+    """
+    Сводка продаж: выручка и количество по (день, категория, статус).
+
+    Поддерживается инкрементально при создании заказа и смене статуса
+    (см. database.SalesRollup), полностью пересчитывается командой
+    rebuild_sales_summary. Один заказ учитывается в order_count
+    каждой категории, товары которой в нем есть.
+    """
+    day = models.DateField(verbose_name="День")
+    category = models.CharField(max_length=50, choices=Product.CATEGORY_CHOICES, verbose_name="Категория")
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Статус")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    quantity = models.BigIntegerField(default=0, verbose_name="Продано единиц")
+    order_count = models.IntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        db_table = 'sales_summary'
+        verbose_name = 'Сводка продаж'
+        verbose_name_plural = 'Сводки продаж'
+        unique_together = ['day', 'category', 'status']
+
+    def __str__(self):
+        return f"{self.day} {self.category} {self.status}: ₽{self.revenue}"
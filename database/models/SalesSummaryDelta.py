@@ -0,0 +1,32 @@
+"""
+Модель изменения сводки продаж, еще не перенесенного в sales_summary.
+"""
+from django.db import models
+
+from .Order import Order
+from .Product import Product
+
+
+class SalesSummaryDelta(models.Model):
+    """
+    Дельта сводки продаж по (день, категория, статус).
+
+    Транзакции заказов только добавляют строки и не ждут друг друга на
+    общей строке сводки; SalesRollup.fold() переносит накопленные дельты
+    в sales_summary и удаляет их.
+    """
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField(verbose_name="День")
+    category = models.CharField(max_length=50, choices=Product.CATEGORY_CHOICES, verbose_name="Категория")
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Статус")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    quantity = models.BigIntegerField(default=0, verbose_name="Продано единиц")
+    order_count = models.IntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        db_table = 'sales_summary_deltas'
+        verbose_name = 'Изменение сводки продаж'
+        verbose_name_plural = 'Изменения сводки продаж'
+
+    def __str__(self):
+        return f"{self.day} {self.category} {self.status}: {self.order_count:+} / ₽{self.revenue}"
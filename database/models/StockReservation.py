@@ -0,0 +1,41 @@
+"""
+Модель резерва товара.
+"""
+from django.db import models
+
+from .Product import Product
+
+
+class StockReservation(models.Model):
+    """
+    Резерв товара: количество уже списано с остатка и удерживается до
+    оформления заказа (committed) или возврата (released). Резерв, не
+    оформленный до expires_at, возвращается на склад (см. database.Inventory).
+    """
+    STATUS_CHOICES = [
+        ('held', 'Удерживается'),
+        ('committed', 'Оформлен в заказ'),
+        ('released', 'Возвращен'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations',
+                                verbose_name="Товар")
+    quantity = models.IntegerField(verbose_name="Количество")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held', verbose_name="Статус")
+    # Заказы секционированы, внешний ключ на них невозможен — хранится только id
+    order_id = models.IntegerField(null=True, blank=True, verbose_name="Заказ")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    expires_at = models.DateTimeField(verbose_name="Действует до")
+
+    class Meta:
+        db_table = 'stock_reservations'
+        verbose_name = 'Резерв товара'
+        verbose_name_plural = 'Резервы товаров'
+        indexes = [
+            # Поиск просроченных резервов
+            models.Index(fields=['expires_at'], name='stock_res_held_expires_idx',
+                         condition=models.Q(status='held')),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} x{self.quantity} ({self.status})"
@@ -0,0 +1,35 @@
+"""
+Модель полосы остатка товара (для часто покупаемых товаров).
+"""
+from django.db import models
+
+from .Product import Product
+
+
+class StockStripe(models.Model):
+    """
+    Часть остатка товара, разнесенного по нескольким строкам.
+
+    Пока у товара есть полосы, остаток хранится в них, а products.quantity —
+    итог на момент последней перебалансировки (см. database.Inventory).
+    Списания разных заказов попадают в разные строки и не ждут друг друга.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_stripes',
+                                verbose_name="Товар")
+    stripe = models.SmallIntegerField(verbose_name="Номер полосы")
+    quantity = models.IntegerField(default=0, verbose_name="Остаток")
+    # Время последнего списания/пополнения (по часам сервера, триггер из 0016_server_updated_at):
+    # по нему get_changes_since находит товары с новым остатком
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        db_table = 'stock_stripes'
+        verbose_name = 'Полоса остатка'
+        verbose_name_plural = 'Полосы остатков'
+        unique_together = ['product', 'stripe']
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}#{self.stripe}: {self.quantity}"
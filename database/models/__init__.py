@@ -2,11 +2,19 @@
 Модели базы данных с использованием Django ORM для PostgreSQL.
 
 Один файл — одна модель. Импорт из пакета сохраняет совместимость:
-  from database.models import Customer, Product, Order, OrderItem
+  from database.models import Customer, Product, Order, OrderItem, SalesSummary,
+                              SalesSummaryDelta, StockStripe, StockReservation,
+                              IngestCheckpoint
 """
 from .Customer import Customer
 from .Product import Product
 from .Order import Order
 from .OrderItem import OrderItem
+from .SalesSummary import SalesSummary
+from .SalesSummaryDelta import SalesSummaryDelta
+from .StockStripe import StockStripe
+from .StockReservation import StockReservation
+from .IngestCheckpoint import IngestCheckpoint
 
-__all__ = ['Customer', 'Product', 'Order', 'OrderItem']
+__all__ = ['Customer', 'Product', 'Order', 'OrderItem', 'SalesSummary', 'SalesSummaryDelta', 'StockStripe',
+           'StockReservation', 'IngestCheckpoint']
@@ -3,14 +3,70 @@
 """
 import sys
 import os
+import time
+import argparse
 from pathlib import Path
 
 # Добавляем текущую директорию в путь Python
 current_dir = Path(__file__).parent
 sys.path.append(str(current_dir))
 
+class StartupProfiler:
+    """Замер длительности этапов запуска (--profile-startup)"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.steps = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.steps.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        print("⏱  Время запуска:")
+        for name, seconds in self.steps:
+            print(f"  {name:<28} {seconds * 1000:8.1f} мс")
+        print(f"  {'Итого':<28} {(self.last - self.started) * 1000:8.1f} мс")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Desktop App with PostgreSQL")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='вывести время этапов запуска')
+    parser.add_argument('--full-setup', action='store_true',
+                        help='всегда запускать migrate и заполнение тестовыми данными')
+    return parser.parse_args()
+
+
+# Период фонового обслуживания базы, мс
+MAINTENANCE_INTERVAL_MS = 60_000
+
+
+def run_maintenance(handler):
+    """Обслуживание базы (в фоновом потоке)"""
+    # Записи об удаленных строках нужны только для недавних отметок get_changes_since
+    handler.prune_tombstones()
+    # Резервы, брошенные до истечения срока, возвращаются на склад
+    handler.expire_reservations()
+    # Дельты сводки продаж из транзакций заказов — в sales_summary
+    handler.fold_sales_summary()
+
+
+def schedule_maintenance(root, handler):
+    """Обслуживание сразу и затем каждые MAINTENANCE_INTERVAL_MS"""
+    handler.run_in_background(run_maintenance, handler)
+    root.after(MAINTENANCE_INTERVAL_MS, schedule_maintenance, root, handler)
+
+
 def main():
     """Точка входа в приложение"""
+    args = parse_args()
+    profiler = StartupProfiler(args.profile_startup)
     try:
         # Проверяем наличие необходимых модулей
         try:
@@ -23,6 +79,7 @@ def main():
             print("macOS: brew install python-tk")
             input("Нажмите Enter для выхода...")
             return
+        profiler.mark("Импорт Tkinter")
 
         # Проверяем настройки Django
         try:
@@ -39,10 +96,15 @@ def main():
             input("Нажмите Enter для выхода...")
             return
 
-        # Проверяем подключение к базе и инициализируем таблицы
+        profiler.mark("Настройка Django и моделей")
+
+        # Проверяем подключение к базе и инициализируем таблицы.
+        # Результат проверки кэшируется, повторные вызовы не ходят в базу
         print("🔍 Проверка подключения к базе данных...")
         handler = PostgreSQLHandler()
-        if not handler.check_connection():
+        connected = handler.check_connection()
+        profiler.mark("Подключение к базе")
+        if not connected:
             print("\n⚠️  Не удалось подключиться к базе данных.")
             print("Хотите продолжить без подключения? (y/n)")
             choice = input().lower()
@@ -50,10 +112,22 @@ def main():
                 print("Выход из программы...")
                 return
 
+        # Быстрый путь: migrate только при неприменённых миграциях,
+        # тестовые данные — только в пустую базу
         from database.PostgreSQLHandler import setup_database
         from database.PostgreSQLHandler import create_test_data
-        if setup_database():
-            create_test_data()
+        ready = False
+        if connected:
+            ready = setup_database(fast=not args.full_setup)
+            profiler.mark("Проверка миграций")
+            if ready:
+                create_test_data(only_if_empty=not args.full_setup)
+            profiler.mark("Тестовые данные")
+            if ready:
+                # Месячные секции заказов на ближайшие месяцы
+                from database.Partitioning import ensure_partitions
+                ensure_partitions()
+            profiler.mark("Секции заказов")
 
         # Импортируем окно приложения
         from ui.main_window import MainWindow
@@ -63,6 +137,13 @@ def main():
 
         # Создаем и запускаем приложение
         app = MainWindow(root)
+        root.update_idletasks()
+        profiler.mark("Создание окна")
+        profiler.report()
+
+        # Обслуживание базы не задерживает показ окна — в пуле фоновых потоков БД
+        if ready:
+            schedule_maintenance(root, handler)
 
         # Запускаем главный цикл
         root.mainloop()
@@ -0,0 +1,45 @@
+"""
+Мост между главным циклом Tkinter и asyncio
+"""
+import asyncio
+import threading
+
+
+class TkAsyncBridge:
+    """
+    Цикл asyncio в отдельном потоке для корутин интерфейса.
+
+    run(coro, on_done, on_error) запускает корутину в цикле, а результат
+    или исключение передает в главный поток Tk через root.after.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='tk-asyncio', daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, on_done=None, on_error=None):
+        """Запуск корутины; возвращает concurrent.futures.Future"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+        def callback(done):
+            try:
+                result = done.result()
+            except Exception as e:
+                if on_error:
+                    self.root.after(0, on_error, e)
+            else:
+                if on_done:
+                    self.root.after(0, on_done, result)
+
+        future.add_done_callback(callback)
+        return future
+
+    def stop(self):
+        """Остановка цикла asyncio"""
+        self.loop.call_soon_threadsafe(self.loop.stop)
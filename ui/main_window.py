@@ -3,15 +3,38 @@
 """
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, simpledialog
-from datetime import datetime
-import threading
+from datetime import date, datetime
 
 from database.PostgreSQLHandler import PostgreSQLHandler, setup_database, create_test_data
+from database.AsyncPostgreSQLHandler import AsyncPostgreSQLHandler
+from database.ChangeFeed import ChangeListener
+from database.DatabaseExecutor import shutdown_executor
+from database.OrderIntake import shutdown_order_intake
+from database.QueryProfiler import profiler
+from ui.async_bridge import TkAsyncBridge
+from ui.paged_treeview import PagedTreeview
+from ui.query_stream import QueryStreamWorker
 
 
 class MainWindow:
     """Главное окно приложения на Tkinter"""
 
+    # Размер страницы таблиц и число страниц, одновременно держащихся в Treeview
+    PAGE_SIZE = 200
+    MAX_PAGES = 5
+    # Сколько строк результата SQL запроса показывать до кнопки «Загрузить еще»
+    # и сколько секунд ждать ее нажатия, прежде чем закрыть курсор
+    QUERY_ROW_CAP = 1000
+    QUERY_IDLE_TIMEOUT = 120
+    # Больше стольких строк отчета не показывается
+    REPORT_ROW_CAP = 5000
+    # Поиск клиента для заказа: задержка после ввода (мс) и число найденных в списке
+    CUSTOMER_SEARCH_DELAY = 300
+    CUSTOMER_SEARCH_LIMIT = 50
+    # Периоды группировки отчетов: подпись — аргумент date_trunc
+    REPORT_GRAINS = {'День': 'day', 'Неделя': 'week', 'Месяц': 'month', 'Квартал': 'quarter',
+                     'Год': 'year', 'Весь период': None}
+
     def __init__(self, root):
         self.root = root
         self.root.title("Desktop App with PostgreSQL (pg8000)")
@@ -19,13 +42,31 @@ class MainWindow:
 
         # Инициализируем обработчик БД
         self.db_handler = PostgreSQLHandler()
+        self.async_handler = AsyncPostgreSQLHandler(self.db_handler)
+        self.async_bridge = TkAsyncBridge(self.root)
+        self.query_worker = None
+        self.report_worker = None
+        self.customer_search_job = None
+        # Список комбобокса без поиска (id — подпись) и признак показа результатов поиска
+        self.customer_labels = {}
+        self.customer_search_active = False
+        # Отметки времени последней загрузки таблиц: повторная загрузка
+        # запрашивает только изменения после них (get_changes_since)
+        self.watermarks = {}
 
         # Создание интерфейса
         self.create_widgets()
 
+        # При закрытии окна останавливаем фоновые потоки и их соединения
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Загрузка данных
         self.load_data_threaded()
 
+        # Изменения из других сессий и процессов приходят через LISTEN/NOTIFY
+        self.change_listener = ChangeListener(self.on_db_changes)
+        self.change_listener.start()
+
     def create_widgets(self):
         """Создание виджетов интерфейса"""
         # Основной контейнер
@@ -58,6 +99,7 @@ class MainWindow:
         self.create_products_tab()
         self.create_orders_tab()
         self.create_statistics_tab()
+        self.create_reports_tab()
 
         # Панель кнопок
         button_frame = ttk.Frame(main_container)
@@ -154,7 +196,17 @@ class MainWindow:
 
         # Прокрутка
         scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.customers_tree.yview)
-        self.customers_tree.configure(yscrollcommand=scrollbar.set)
+        self.customers_pager = PagedTreeview(
+            self.root, self.customers_tree, scrollbar,
+            fetch_page=self.db_handler.get_customers_page,
+            submit=self.db_handler.run_in_background,
+            key_func=lambda customer: customer.id,
+            row_func=self.customer_row,
+            page_size=self.PAGE_SIZE,
+            max_pages=self.MAX_PAGES,
+            on_error=self.show_error,
+            version_func=lambda customer: customer.updated_at
+        )
 
         self.customers_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -236,7 +288,16 @@ class MainWindow:
             self.products_tree.column(col, width=100)
 
         scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.products_tree.yview)
-        self.products_tree.configure(yscrollcommand=scrollbar.set)
+        self.products_pager = PagedTreeview(
+            self.root, self.products_tree, scrollbar,
+            fetch_page=self.db_handler.get_products_page,
+            submit=self.db_handler.run_in_background,
+            key_func=lambda product: product.id,
+            row_func=self.product_row,
+            page_size=self.PAGE_SIZE,
+            max_pages=self.MAX_PAGES,
+            on_error=self.show_error
+        )
 
         self.products_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -258,8 +319,10 @@ class MainWindow:
         fields.pack(fill=tk.X, expand=True)
 
         ttk.Label(fields, text="Клиент:").grid(row=0, column=0, sticky=tk.W, pady=5, padx=5)
-        self.order_customer_combo = ttk.Combobox(fields, width=27, state="readonly")
+        # Список — первая страница клиентов; ввод текста ищет клиента среди всех (search_customers)
+        self.order_customer_combo = ttk.Combobox(fields, width=27)
         self.order_customer_combo.grid(row=0, column=1, pady=5, padx=5)
+        self.order_customer_combo.bind('<KeyRelease>', self.on_customer_combo_typed)
 
         ttk.Label(fields, text="Примечания:").grid(row=1, column=0, sticky=tk.NW, pady=5, padx=5)
         self.order_notes_text = scrolledtext.ScrolledText(fields, width=30, height=3)
@@ -277,7 +340,9 @@ class MainWindow:
         table_frame = ttk.Frame(paned)
 
         columns = ("ID", "Клиент", "Дата заказа", "Статус", "Сумма", "Примечания")
-        self.orders_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15)
+        # Можно выделить несколько заказов (Ctrl/Shift) и сменить их статус разом
+        self.orders_tree = ttk.Treeview(table_frame, columns=columns, show="headings", height=15,
+                                        selectmode="extended")
 
         for col in columns:
             self.orders_tree.heading(col, text=col)
@@ -285,13 +350,25 @@ class MainWindow:
 
         # Контекстное меню
         self.order_context_menu = tk.Menu(self.root, tearoff=0)
-        self.order_context_menu.add_command(label="Изменить статус", command=self.change_order_status)
+        self.order_context_menu.add_command(label="Изменить статус выбранных", command=self.change_order_status)
         self.order_context_menu.add_command(label="Показать детали", command=self.show_order_details)
 
         self.orders_tree.bind("<Button-3>", self.show_context_menu)
 
         scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.orders_tree.yview)
-        self.orders_tree.configure(yscrollcommand=scrollbar.set)
+        self.orders_pager = PagedTreeview(
+            self.root, self.orders_tree, scrollbar,
+            fetch_page=self.db_handler.get_orders_page,
+            submit=self.db_handler.run_in_background,
+            key_func=lambda order: (order.order_date, order.id),
+            row_func=self.order_row,
+            page_size=self.PAGE_SIZE,
+            max_pages=self.MAX_PAGES,
+            on_error=self.show_error,
+            # В строке заказа показывается и клиент
+            version_func=lambda order: (order.updated_at, order.customer.updated_at),
+            descending=True
+        )
 
         self.orders_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -310,9 +387,28 @@ class MainWindow:
         stats_frame = ttk.LabelFrame(main_frame, text="Статистика базы данных", padding=10)
         stats_frame.pack(fill=tk.X, pady=(0, 10))
 
-        self.stats_text = tk.Text(stats_frame, height=8, font=('Arial', 10))
+        self.stats_text = scrolledtext.ScrolledText(stats_frame, height=12, font=('Arial', 10))
         self.stats_text.pack(fill=tk.BOTH, expand=True)
 
+        # Учет SQL запросов по методам
+        profile_frame = ttk.LabelFrame(main_frame, text="SQL запросы по методам", padding=10)
+        profile_frame.pack(fill=tk.X, pady=(0, 10))
+
+        columns = ('Метод', 'Вызовов', 'Запросов/вызов', 'Макс. запросов', 'Время БД, мс', 'Строк', 'N+1')
+        self.profile_tree = ttk.Treeview(profile_frame, columns=columns, show="headings", height=6)
+        for col in columns:
+            self.profile_tree.heading(col, text=col)
+            self.profile_tree.column(col, width=260 if col == 'Метод' else 100)
+        self.profile_tree.tag_configure('n_plus_one', background='#ffcccc')
+        self.profile_tree.pack(fill=tk.X)
+
+        profile_buttons = ttk.Frame(profile_frame)
+        profile_buttons.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(profile_buttons, text="🔄 Обновить", command=self.update_query_profile).pack(side=tk.LEFT, padx=5)
+        ttk.Button(profile_buttons, text="🗑 Сбросить", command=self.reset_query_profile).pack(side=tk.LEFT, padx=5)
+        self.profile_status_label = ttk.Label(profile_buttons, text="")
+        self.profile_status_label.pack(side=tk.LEFT, padx=5)
+
         # Произвольный запрос
         query_frame = ttk.LabelFrame(main_frame, text="Произвольный SQL запрос", padding=10)
         query_frame.pack(fill=tk.X, pady=(0, 10))
@@ -321,11 +417,37 @@ class MainWindow:
         self.query_text = scrolledtext.ScrolledText(query_frame, height=4, font=('Courier', 10))
         self.query_text.pack(fill=tk.X, pady=(5, 5))
 
+        query_buttons = ttk.Frame(query_frame)
+        query_buttons.pack()
+
         ttk.Button(
-            query_frame,
+            query_buttons,
             text="▶️ Выполнить запрос",
             command=self.execute_custom_query
-        ).pack()
+        ).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(query_buttons, text="Лимит строк:").pack(side=tk.LEFT, padx=(15, 5))
+        self.query_row_cap_spinbox = tk.Spinbox(
+            query_buttons,
+            from_=100,
+            to=1000000,
+            increment=100,
+            width=10
+        )
+        self.query_row_cap_spinbox.delete(0, tk.END)
+        self.query_row_cap_spinbox.insert(0, str(self.QUERY_ROW_CAP))
+        self.query_row_cap_spinbox.pack(side=tk.LEFT, padx=5)
+
+        self.query_more_button = ttk.Button(
+            query_buttons,
+            text="⏬ Загрузить еще",
+            command=self.fetch_more_query_rows,
+            state=tk.DISABLED
+        )
+        self.query_more_button.pack(side=tk.LEFT, padx=5)
+
+        self.query_status_label = ttk.Label(query_buttons, text="")
+        self.query_status_label.pack(side=tk.LEFT, padx=5)
 
         # Результаты запроса
         result_frame = ttk.LabelFrame(main_frame, text="Результаты запроса", padding=10)
@@ -340,6 +462,58 @@ class MainWindow:
         self.query_result_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
+    def create_reports_tab(self):
+        """Вкладка отчетов по продажам"""
+        from database.SalesReports import REPORTS
+        tab = ttk.Frame(self.notebook)
+        self.notebook.add(tab, text="📑 Отчеты")
+
+        main_frame = ttk.Frame(tab)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        params_frame = ttk.LabelFrame(main_frame, text="Параметры отчета", padding=10)
+        params_frame.pack(fill=tk.X, pady=(0, 10))
+
+        self.report_names = {spec['title']: name for name, spec in REPORTS.items()}
+        ttk.Label(params_frame, text="Отчет:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.report_combo = ttk.Combobox(params_frame, values=list(self.report_names), width=30, state="readonly")
+        self.report_combo.current(0)
+        self.report_combo.grid(row=0, column=1, pady=5, padx=5)
+
+        ttk.Label(params_frame, text="Группировка:").grid(row=0, column=2, sticky=tk.W, pady=5)
+        self.report_grain_combo = ttk.Combobox(params_frame, values=list(self.REPORT_GRAINS), width=15,
+                                               state="readonly")
+        self.report_grain_combo.set('Месяц')
+        self.report_grain_combo.grid(row=0, column=3, pady=5, padx=5)
+
+        ttk.Label(params_frame, text="С (ГГГГ-ММ-ДД):").grid(row=1, column=0, sticky=tk.W, pady=5)
+        self.report_from_entry = ttk.Entry(params_frame, width=15)
+        self.report_from_entry.insert(0, date(date.today().year, 1, 1).isoformat())
+        self.report_from_entry.grid(row=1, column=1, sticky=tk.W, pady=5, padx=5)
+
+        ttk.Label(params_frame, text="По (не включая):").grid(row=1, column=2, sticky=tk.W, pady=5)
+        self.report_to_entry = ttk.Entry(params_frame, width=15)
+        self.report_to_entry.grid(row=1, column=3, sticky=tk.W, pady=5, padx=5)
+
+        ttk.Label(params_frame, text="Мест в топе:").grid(row=0, column=4, sticky=tk.W, pady=5)
+        self.report_limit_spinbox = tk.Spinbox(params_frame, from_=1, to=1000, width=8)
+        self.report_limit_spinbox.delete(0, tk.END)
+        self.report_limit_spinbox.insert(0, "10")
+        self.report_limit_spinbox.grid(row=0, column=5, pady=5, padx=5)
+
+        ttk.Button(params_frame, text="▶️ Построить", command=self.build_report).grid(row=1, column=4, pady=5, padx=5)
+        self.report_status_label = ttk.Label(params_frame, text="")
+        self.report_status_label.grid(row=1, column=5, sticky=tk.W, pady=5, padx=5)
+
+        result_frame = ttk.LabelFrame(main_frame, text="Результат", padding=10)
+        result_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.report_tree = ttk.Treeview(result_frame, show="headings", height=15)
+        scrollbar = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=self.report_tree.yview)
+        self.report_tree.configure(yscrollcommand=scrollbar.set)
+        self.report_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
     def update_status_label(self):
         """Обновление статуса подключения"""
         if self.db_handler.check_connection():
@@ -348,112 +522,271 @@ class MainWindow:
             self.status_label.config(text="❌ Нет подключения к базе данных", foreground='red')
 
     def load_data_threaded(self):
-        """Загрузка данных в отдельном потоке"""
+        """Загрузка данных через цикл asyncio (запросы идут в пуле фоновых потоков БД)"""
         self.progress.start()
         self.root.config(cursor="watch")
 
-        thread = threading.Thread(target=self.load_data)
-        thread.daemon = True
-        thread.start()
+        future = self.async_bridge.run(self.load_data())
 
         # Проверка завершения
-        self.check_thread_completion(thread)
+        self.check_thread_completion(future)
 
-    def load_data(self):
-        """Загрузка данных из базы"""
+    async def load_data(self):
+        """Загрузка первых страниц таблиц и статистики из базы параллельными запросами"""
+        if self.watermarks:
+            await self.load_changes()
+            return
         try:
-            # Загрузка клиентов
-            from database.models import Customer
-            customers = Customer.objects.all()
+            # Запросы всех параллельных вызовов учитываются одной записью
+            with profiler.session('MainWindow.load_data'):
+                # Отметки берутся до чтения страниц: изменения во время чтения придут в следующей выборке
+                changes = await self.async_handler.gather(
+                    *(self.async_handler.get_changes_since(table) for table in self.change_pagers())
+                )
+                customers, products, orders, stats = await self.async_handler.gather(
+                    self.async_handler.get_customers_page(limit=self.PAGE_SIZE),
+                    self.async_handler.get_products_page(limit=self.PAGE_SIZE),
+                    self.async_handler.get_orders_page(limit=self.PAGE_SIZE),
+                    self.async_handler.get_database_stats(),
+                )
 
             # Обновляем в основном потоке
             self.root.after(0, self.update_customers_table, customers)
-
-            # Загрузка товаров
-            from database.models import Product
-            products = Product.objects.all()
             self.root.after(0, self.update_products_table, products)
 
             # Обновление комбобокса клиентов
-            customer_data = [(f"{c.id}: {c.last_name} {c.first_name}", c.id) for c in customers]
+            customer_data = [(self.customer_label(c), c.id) for c in customers]
             self.root.after(0, self.update_customer_combo, customer_data)
 
-            # Загрузка заказов
-            from database.models import Order
-            orders = Order.objects.select_related('customer').all()
             self.root.after(0, self.update_orders_table, orders)
-
-            # Статистика
-            stats = self.db_handler.get_database_stats()
             self.root.after(0, self.update_statistics, stats)
+            self.root.after(0, self.update_query_profile)
+            self.watermarks = {table: change['watermark'] for table, change in zip(self.change_pagers(), changes)}
 
         except Exception as e:
             self.root.after(0, self.show_error, "Ошибка загрузки данных", str(e))
 
-    def check_thread_completion(self, thread):
-        """Проверка завершения потока"""
-        if thread.is_alive():
-            self.root.after(100, self.check_thread_completion, thread)
+    async def load_changes(self, tables=None):
+        """Повторная загрузка: только строки, измененные и удаленные после прошлой загрузки"""
+        tables = list(tables or self.change_pagers())
+        try:
+            with profiler.session('MainWindow.load_changes'):
+                *changes, stats = await self.async_handler.gather(
+                    *(self.async_handler.get_changes_since(table, self.watermarks.get(table)) for table in tables),
+                    self.async_handler.get_database_stats(),
+                )
+            for table, change in zip(tables, changes):
+                self.watermarks[table] = change['watermark']
+                self.root.after(0, self.apply_changes, table, change)
+            self.root.after(0, self.update_statistics, stats)
+            self.root.after(0, self.update_query_profile)
+        except Exception as e:
+            self.root.after(0, self.show_error, "Ошибка загрузки данных", str(e))
+
+    def change_pagers(self):
+        """Таблицы окна, обновляемые по изменениям: имя таблицы — PagedTreeview"""
+        return {
+            'customers': self.customers_pager,
+            'products': self.products_pager,
+            'orders': self.orders_pager,
+        }
+
+    def apply_changes(self, table, change):
+        """Применение результата get_changes_since к таблице окна"""
+        pager = self.change_pagers()[table]
+        if change['full_reload']:
+            pager.refresh()
+            return
+        pager.apply_rows(change['rows'], change['deleted'])
+        if table == 'customers' and (change['rows'] or change['deleted']):
+            self.merge_customer_combo(change['rows'], change['deleted'])
+
+    def check_thread_completion(self, future):
+        """Проверка завершения фоновой задачи"""
+        if not future.done():
+            self.root.after(100, self.check_thread_completion, future)
         else:
             self.root.config(cursor="")
             self.progress.stop()
 
     def update_customers_table(self, customers):
-        """Обновление таблицы клиентов"""
-        # Очищаем таблицу
-        for item in self.customers_tree.get_children():
-            self.customers_tree.delete(item)
-
-        # Добавляем данные
-        for customer in customers:
-            self.customers_tree.insert("", tk.END, values=(
-                customer.id,
-                customer.first_name,
-                customer.last_name,
-                customer.email,
-                customer.phone,
-                customer.created_at.strftime("%Y-%m-%d %H:%M")
-            ))
+        """Обновление таблицы клиентов: только изменившиеся строки (первая страница — из load_data)"""
+        self.customers_pager.refresh(customers)
+
+    def customer_row(self, customer):
+        """Значения строки таблицы клиентов"""
+        return (
+            customer.id,
+            customer.first_name,
+            customer.last_name,
+            customer.email,
+            customer.phone,
+            customer.created_at.strftime("%Y-%m-%d %H:%M")
+        ), ()
 
     def update_products_table(self, products):
-        """Обновление таблицы товаров"""
-        for item in self.products_tree.get_children():
-            self.products_tree.delete(item)
-
-        for product in products:
-            self.products_tree.insert("", tk.END, values=(
-                product.id,
-                product.name,
-                product.sku,
-                product.get_category_display(),
-                f"₽{product.price}",
-                product.quantity,
-                "✅ Активен" if product.is_active else "❌ Не активен"
-            ))
+        """Обновление таблицы товаров: только изменившиеся строки (первая страница — из load_data)"""
+        self.products_pager.refresh(products)
+
+    def product_row(self, product):
+        """Значения строки таблицы товаров"""
+        return (
+            product.id,
+            product.name,
+            product.sku,
+            product.get_category_display(),
+            f"₽{product.price}",
+            product.quantity,
+            "✅ Активен" if product.is_active else "❌ Не активен"
+        ), ()
+
+    def merge_customer_combo(self, customers, deleted_ids):
+        """Добавление новых и изменившихся клиентов в комбобокс без полной перезагрузки"""
+        for customer_id in deleted_ids:
+            self.customer_labels.pop(customer_id, None)
+        for c in customers:
+            self.customer_labels[c.id] = self.customer_label(c)
+        if not self.customer_search_active:
+            self.show_customer_labels(self.customer_labels)
+            return
+
+        # В результатах поиска обновляются только уже найденные клиенты
+        found = {int(value.split(':', 1)[0]): value for value in self.order_customer_combo['values']}
+        for customer_id in deleted_ids:
+            found.pop(customer_id, None)
+        for c in customers:
+            if c.id in found:
+                found[c.id] = self.customer_label(c)
+        self.order_customer_combo['values'] = list(found.values())
 
     def update_customer_combo(self, customer_data):
-        """Обновление комбобокса клиентов"""
-        self.order_customer_combo['values'] = [item[0] for item in customer_data]
-        if customer_data:
+        """Обновление комбобокса клиентов (список без поиска)"""
+        self.customer_labels = {customer_id: label for label, customer_id in customer_data}
+        if not self.customer_search_active:
+            self.show_customer_labels(self.customer_labels)
+
+    def show_customer_labels(self, labels):
+        """Список без поиска; введенный пользователем текст не заменяется"""
+        self.order_customer_combo['values'] = [labels[customer_id] for customer_id in sorted(labels)]
+        if not self.order_customer_combo.get() and labels:
             self.order_customer_combo.current(0)
 
+    @staticmethod
+    def customer_label(customer):
+        """Подпись клиента в комбобоксе: «id: фамилия имя»"""
+        return f"{customer.id}: {customer.last_name} {customer.first_name}"
+
+    def on_customer_combo_typed(self, event):
+        """Поиск клиента по введенному тексту после паузы в наборе"""
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        if self.customer_search_job is not None:
+            self.root.after_cancel(self.customer_search_job)
+        self.customer_search_job = self.root.after(self.CUSTOMER_SEARCH_DELAY, self.search_customer_combo)
+
+    def search_customer_combo(self):
+        """Список комбобокса — клиенты, найденные по имени, email или телефону"""
+        self.customer_search_job = None
+        query = self.order_customer_combo.get().strip()
+        if not query:
+            # Текст стерт — снова список без поиска
+            if self.customer_search_active:
+                self.customer_search_active = False
+                self.order_customer_combo['values'] = [
+                    self.customer_labels[customer_id] for customer_id in sorted(self.customer_labels)
+                ]
+            return
+        if query in self.order_customer_combo['values']:
+            return
+
+        def show(customers):
+            # Пока шел поиск, текст могли изменить — тогда результат уже не нужен
+            if self.order_customer_combo.get().strip() != query:
+                return
+            self.customer_search_active = True
+            self.order_customer_combo['values'] = [self.customer_label(c) for c in customers]
+
+        self.async_bridge.run(
+            self.async_handler.search_customers(query, self.CUSTOMER_SEARCH_LIMIT),
+            on_done=show,
+            on_error=lambda e: self.show_error("Ошибка поиска клиентов", str(e)),
+        )
+
     def update_orders_table(self, orders):
-        """Обновление таблицы заказов"""
-        for item in self.orders_tree.get_children():
-            self.orders_tree.delete(item)
-
-        for order in orders:
-            self.orders_tree.insert("", tk.END, values=(
-                order.id,
-                str(order.customer),
-                order.order_date.strftime("%Y-%m-%d %H:%M"),
-                order.get_status_display(),
-                f"₽{order.total_amount}",
-                order.notes[:50] + "..." if len(order.notes) > 50 else order.notes
-            ), tags=(order.status,))
+        """Обновление таблицы заказов: только изменившиеся строки (первая страница — из load_data)"""
+        self.orders_pager.refresh(orders)
+
+    def order_row(self, order):
+        """Значения и теги строки таблицы заказов"""
+        return (
+            order.id,
+            str(order.customer),
+            order.order_date.strftime("%Y-%m-%d %H:%M"),
+            order.get_status_display(),
+            f"₽{order.total_amount}",
+            order.notes[:50] + "..." if len(order.notes) > 50 else order.notes
+        ), (order.status,)
+
+    def on_db_changes(self, batch):
+        """Пачка изменений из ленты (вызывается в потоке слушателя)"""
+        self.root.after(0, self.apply_db_changes, batch)
+
+    def apply_db_changes(self, batch):
+        """Точечное обновление таблиц по пачке изменений"""
+        pagers = self.change_pagers()
+        # Изменения могли прийти не из этого процесса — его кэши устарели
+        if 'orders' in batch.tables or 'products' in batch.tables:
+            PostgreSQLHandler.invalidate_stats_cache()
+        if 'products' in batch.tables:
+            PostgreSQLHandler.invalidate_catalog_cache()
+
+        # Таблицы, измененные массово, догружаются по отметкам времени
+        reload = [table for table in pagers if table in batch.reload]
+        if reload and self.watermarks:
+            self.async_bridge.run(self.load_changes(reload))
+        for table, pager in pagers.items():
+            if table in batch.reload:
+                if not self.watermarks:
+                    pager.refresh()
+                continue
+            changes = batch.rows.get(table)
+            if not changes:
+                continue
+            deleted = [row_id for row_id, op in changes.items() if op == 'D']
+            changed = [row_id for row_id, op in changes.items() if op != 'D']
+            self.db_handler.run_in_background(self.load_changed_rows, table, pager, changed, deleted)
+
+        # load_changes обновляет и статистику
+        if ('orders' in batch.tables or 'products' in batch.tables) and not (reload and self.watermarks):
+            self.async_bridge.run(self.async_handler.get_database_stats(), on_done=self.update_statistics)
+
+    def load_changed_rows(self, table, pager, changed, deleted):
+        """Чтение измененных строк в пуле и применение к таблице в основном потоке"""
+        rows = self.db_handler.get_rows_by_ids(table, changed) if changed else []
+        # Строка, которой уже нет (удалена или перенесена в архив), убирается
+        found = {row.id for row in rows}
+        deleted = deleted + [row_id for row_id in changed if row_id not in found]
+        self.root.after(0, pager.apply_rows, rows, deleted)
 
     def update_statistics(self, stats):
         """Обновление статистики"""
+        from database.models import Order, Product
+        status_names = dict(Order.STATUS_CHOICES)
+        category_names = dict(Product.CATEGORY_CHOICES)
+
+        by_status = "\n".join(
+            f"   {status_names.get(status, status)}: ₽{revenue}"
+            for status, revenue in stats.get('revenue_by_status', {}).items()
+        ) or "   нет данных"
+        by_category = "\n".join(
+            f"   {category_names.get(category, category)}: ₽{revenue}"
+            for category, revenue in stats.get('revenue_by_category', {}).items()
+        ) or "   нет данных"
+        by_day = "\n".join(
+            f"   {day}: ₽{revenue}"
+            for day, revenue in stats.get('revenue_by_day', {}).items()
+        ) or "   нет данных"
+
         stats_text = f"""
 📊 Статистика базы данных:
 
@@ -462,12 +795,47 @@ class MainWindow:
 📋 Всего заказов: {stats.get('orders', 0)}
 ⏳ Заказов в обработке: {stats.get('pending_orders', 0)}
 
+💰 Выручка (без отмененных): ₽{stats.get('revenue', 0)}
+По статусам:
+{by_status}
+По категориям:
+{by_category}
+По дням:
+{by_day}
+
 Обновлено: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         """
 
         self.stats_text.delete(1.0, tk.END)
         self.stats_text.insert(1.0, stats_text)
 
+    def update_query_profile(self):
+        """Обновление таблицы учета SQL запросов"""
+        profile = self.db_handler.get_query_profile()
+        self.profile_tree.delete(*self.profile_tree.get_children())
+        methods = sorted(profile['methods'].items(), key=lambda item: item[1]['db_time_ms'], reverse=True)
+        for name, stats in methods:
+            self.profile_tree.insert("", tk.END, values=(
+                name,
+                stats['calls'],
+                f"{stats['avg_queries']:.1f}",
+                stats['max_queries'],
+                f"{stats['db_time_ms']:.1f}",
+                stats['rows'],
+                stats['n_plus_one'],
+            ), tags=('n_plus_one',) if stats['n_plus_one'] else ())
+
+        status = f"Выборка: {profile['sample_rate']:.0%} вызовов"
+        if profile['warnings']:
+            _, name, fp, count = profile['warnings'][-1]
+            status += f" | N+1 в {name}: {count}× {fp[:80]}"
+        self.profile_status_label.config(text=status)
+
+    def reset_query_profile(self):
+        """Сброс учета SQL запросов"""
+        self.db_handler.reset_query_profile()
+        self.update_query_profile()
+
     def add_customer(self):
         """Добавление нового клиента"""
         try:
@@ -530,6 +898,9 @@ class MainWindow:
             if not customer_selection:
                 messagebox.showwarning("Ошибка", "Выберите клиента")
                 return
+            if customer_selection not in self.order_customer_combo['values']:
+                messagebox.showwarning("Ошибка", "Выберите клиента из списка найденных")
+                return
 
             # Создаем диалоговое окно для выбора товаров
             dialog = tk.Toplevel(self.root)
@@ -538,9 +909,9 @@ class MainWindow:
             dialog.transient(self.root)
             dialog.grab_set()
 
-            # Получаем доступные товары
-            from database.models import Product
-            products = Product.objects.filter(is_active=True, quantity__gt=0)
+            # Каталог берется из кэша, остатки — свежие из базы
+            stock = self.db_handler.get_stock()
+            products = [p for p in self.db_handler.get_catalog() if stock.get(p.id, 0) > 0]
 
             # Создаем интерфейс для выбора товаров
             ttk.Label(dialog, text="Выберите товары для заказа:", font=('Arial', 12, 'bold')).pack(pady=10)
@@ -566,7 +937,7 @@ class MainWindow:
 
                 ttk.Label(item_frame, text=product.name, width=30).pack(side=tk.LEFT, padx=5)
                 ttk.Label(item_frame, text=f"₽{product.price}", width=10).pack(side=tk.LEFT, padx=5)
-                ttk.Label(item_frame, text=str(product.quantity), width=10).pack(side=tk.LEFT, padx=5)
+                ttk.Label(item_frame, text=str(stock[product.id]), width=10).pack(side=tk.LEFT, padx=5)
 
                 # Поле для ввода количества
                 quantity_var = tk.StringVar(value="0")
@@ -642,31 +1013,46 @@ class MainWindow:
         """Показать контекстное меню"""
         item = self.orders_tree.identify_row(event.y)
         if item:
+            # Щелчок вне выделения выделяет только эту строку
+            if item not in self.orders_tree.selection():
+                self.orders_tree.selection_set(item)
             self.selected_order_item = item
             self.order_context_menu.post(event.x_root, event.y_root)
 
     def change_order_status(self):
-        """Изменение статуса заказа"""
-        if not hasattr(self, 'selected_order_item'):
+        """Изменение статуса выбранных заказов"""
+        order_ids = [self.orders_tree.item(item)['values'][0] for item in self.orders_tree.selection()]
+        if not order_ids:
             return
 
         try:
-            order_id = self.orders_tree.item(self.selected_order_item)['values'][0]
+            from database.models import Order
+            statuses = [status for status, _ in Order.STATUS_CHOICES]
 
             # Диалог выбора статуса
+            title = f"заказа #{order_ids[0]}" if len(order_ids) == 1 else f"{len(order_ids)} заказов"
             new_status = simpledialog.askstring(
                 "Изменение статуса",
-                f"Введите новый статус для заказа #{order_id}:\n"
-                "(pending, processing, shipped, delivered, cancelled)",
+                f"Введите новый статус для {title}:\n"
+                f"({', '.join(statuses)})",
                 parent=self.root
             )
 
-            if new_status and new_status in ['pending', 'processing', 'shipped', 'delivered', 'cancelled']:
-                if self.db_handler.update_order_status(order_id, new_status):
-                    messagebox.showinfo("Успех", "Статус заказа обновлен!")
+            if new_status and new_status in statuses:
+                result = self.db_handler.bulk_update_order_status(order_ids, new_status)
+                if result['updated']:
                     self.load_data_threaded()
+                if not result['rejected']:
+                    messagebox.showinfo("Успех", f"Статус обновлен у заказов: {len(result['updated'])}")
                 else:
-                    messagebox.showerror("Ошибка", "Не удалось обновить статус")
+                    rejected = ", ".join(f"#{order_id}" for order_id in result['rejected'][:20])
+                    if len(result['rejected']) > 20:
+                        rejected += ", ..."
+                    messagebox.showwarning(
+                        "Статус обновлен частично",
+                        f"Обновлено заказов: {len(result['updated'])}\n"
+                        f"Переход в '{new_status}' недопустим для: {rejected}"
+                    )
             elif new_status:
                 messagebox.showwarning("Ошибка", "Некорректный статус")
 
@@ -719,39 +1105,160 @@ class MainWindow:
             self.show_error("Ошибка при получении деталей заказа", str(e))
 
     def execute_custom_query(self):
-        """Выполнение произвольного SQL запроса"""
+        """Выполнение произвольного SQL запроса (строки подгружаются порциями из фонового потока)"""
         try:
             query = self.query_text.get(1.0, tk.END).strip()
             if not query:
                 messagebox.showwarning("Ошибка", "Введите SQL запрос")
                 return
 
-            results = self.db_handler.execute_custom_query(query)
+            try:
+                row_cap = int(self.query_row_cap_spinbox.get())
+            except ValueError:
+                row_cap = self.QUERY_ROW_CAP
+
+            # Останавливаем предыдущий запрос, если он еще читается
+            if self.query_worker is not None:
+                self.query_worker.stop()
 
             # Очищаем таблицу результатов
-            for item in self.query_result_tree.get_children():
-                self.query_result_tree.delete(item)
-
-            if results:
-                # Настраиваем колонки
-                columns = list(results[0].keys())
-                self.query_result_tree["columns"] = columns
-
-                # Устанавливаем заголовки
-                for col in columns:
-                    self.query_result_tree.heading(col, text=col)
-                    self.query_result_tree.column(col, width=100)
-
-                # Добавляем данные
-                for row in results:
-                    values = [row.get(col, '') for col in columns]
-                    self.query_result_tree.insert("", tk.END, values=values)
-            else:
-                messagebox.showinfo("Результат", "Запрос выполнен успешно (нет данных для отображения)")
+            self.query_result_tree.delete(*self.query_result_tree.get_children())
+            self.query_result_tree["columns"] = ()
+            self.query_more_button.config(state=tk.DISABLED)
+            self.query_status_label.config(text="Выполняется...")
+
+            worker = QueryStreamWorker(
+                self.root, self.db_handler, query, row_cap,
+                on_batch=lambda columns, rows: self.append_query_rows(worker, columns, rows),
+                on_done=lambda total, exhausted, error: self.finish_query(worker, total, exhausted, error),
+                on_cap_reached=lambda total: self.query_cap_reached(worker, total),
+                idle_timeout=self.QUERY_IDLE_TIMEOUT
+            )
+            self.query_worker = worker
+            worker.start()
 
         except Exception as e:
             self.show_error("Ошибка выполнения запроса", str(e))
 
+    def append_query_rows(self, worker, columns, rows):
+        """Добавление порции строк результата в таблицу"""
+        if worker is not self.query_worker:
+            return
+
+        if tuple(self.query_result_tree["columns"]) != columns:
+            # Настраиваем колонки по первой порции
+            self.query_result_tree["columns"] = columns
+            for col in columns:
+                self.query_result_tree.heading(col, text=col)
+                self.query_result_tree.column(col, width=100)
+
+        for row in rows:
+            self.query_result_tree.insert("", tk.END, values=["" if value is None else value for value in row])
+        self.query_status_label.config(text=f"Строк: {len(self.query_result_tree.get_children())}")
+
+    def query_cap_reached(self, worker, total):
+        """Достигнут лимит строк — предлагаем загрузить еще"""
+        if worker is not self.query_worker:
+            return
+        self.query_more_button.config(state=tk.NORMAL)
+        self.query_status_label.config(text=f"Показано строк: {total} (есть еще)")
+
+    def fetch_more_query_rows(self):
+        """Продолжение чтения результата запроса"""
+        if self.query_worker is not None:
+            self.query_more_button.config(state=tk.DISABLED)
+            self.query_worker.more()
+
+    def finish_query(self, worker, total, exhausted, error):
+        """Завершение чтения результата запроса"""
+        if worker is not self.query_worker:
+            return
+        self.query_worker = None
+        self.query_more_button.config(state=tk.DISABLED)
+
+        if error:
+            self.query_status_label.config(text="")
+            self.show_error("Ошибка выполнения запроса", error)
+        elif total == 0 and exhausted:
+            self.query_status_label.config(text="")
+            messagebox.showinfo("Результат", "Запрос выполнен успешно (нет данных для отображения)")
+        elif worker.expired:
+            self.query_status_label.config(text=f"Строк: {total} (чтение остановлено: курсор закрыт по таймауту)")
+        else:
+            self.query_status_label.config(text=f"Строк: {total}")
+
+    def build_report(self):
+        """Построение отчета: строки выводятся по мере чтения из базы"""
+        try:
+            dates = []
+            for entry in (self.report_from_entry, self.report_to_entry):
+                text = entry.get().strip()
+                dates.append(date.fromisoformat(text) if text else None)
+            limit = int(self.report_limit_spinbox.get())
+        except ValueError:
+            messagebox.showwarning("Ошибка", "Даты — в формате ГГГГ-ММ-ДД, число мест — целое")
+            return
+
+        name = self.report_names[self.report_combo.get()]
+        grain = self.REPORT_GRAINS[self.report_grain_combo.get()]
+        date_from, date_to = dates
+
+        if self.report_worker is not None:
+            self.report_worker.stop()
+        self.report_tree.delete(*self.report_tree.get_children())
+        self.report_tree["columns"] = ()
+        self.report_status_label.config(text="Выполняется...")
+
+        worker = QueryStreamWorker(
+            self.root, self.db_handler, None, self.REPORT_ROW_CAP,
+            on_batch=lambda columns, rows: self.append_report_rows(worker, columns, rows),
+            on_done=lambda total, exhausted, error: self.finish_report(worker, total, error),
+            on_cap_reached=lambda total: worker.stop(),
+            batch_size=100,
+            stream_func=lambda batch_size: self.db_handler.stream_report(
+                name, date_from, date_to, grain, limit, batch_size=batch_size
+            )
+        )
+        self.report_worker = worker
+        worker.start()
+
+    def append_report_rows(self, worker, columns, rows):
+        """Добавление порции строк отчета в таблицу"""
+        if worker is not self.report_worker:
+            return
+        from database.models import Product
+        category_names = dict(Product.CATEGORY_CHOICES)
+
+        if tuple(self.report_tree["columns"]) != columns:
+            self.report_tree["columns"] = columns
+            for col in columns:
+                self.report_tree.heading(col, text=col)
+                self.report_tree.column(col, width=200 if col == 'Товар' else 110)
+
+        for row in rows:
+            values = []
+            for col, value in zip(columns, row):
+                if col == 'Период':
+                    value = value.isoformat() if value is not None else "весь период"
+                elif col == 'Категория':
+                    value = category_names.get(value, value)
+                values.append("" if value is None else value)
+            self.report_tree.insert("", tk.END, values=values)
+        self.report_status_label.config(text=f"Строк: {len(self.report_tree.get_children())}")
+
+    def finish_report(self, worker, total, error):
+        """Завершение построения отчета"""
+        if worker is not self.report_worker:
+            return
+        self.report_worker = None
+        if error:
+            self.report_status_label.config(text="")
+            self.show_error("Ошибка построения отчета", error)
+        elif total >= self.REPORT_ROW_CAP:
+            self.report_status_label.config(text=f"Показаны первые {total} строк")
+        else:
+            self.report_status_label.config(text=f"Строк: {total}" if total else "Нет данных за период")
+
     def setup_database(self):
         """Настройка базы данных"""
         try:
@@ -776,8 +1283,9 @@ class MainWindow:
 
     def test_connection(self):
         """Тест подключения к базе"""
+        healthy = self.db_handler.check_connection(force=True)
         self.update_status_label()
-        if self.db_handler.check_connection():
+        if healthy:
             messagebox.showinfo("Успех", "Подключение к PostgreSQL работает!")
         else:
             messagebox.showerror("Ошибка", "Нет подключения к базе данных")
@@ -801,6 +1309,18 @@ class MainWindow:
         self.product_quantity_spinbox.insert(0, "0")
         self.product_description_text.delete(1.0, tk.END)
 
+    def on_close(self):
+        """Закрытие окна: прерываем запрос и закрываем соединения пула"""
+        if self.query_worker is not None:
+            self.query_worker.stop()
+        if self.report_worker is not None:
+            self.report_worker.stop()
+        self.change_listener.stop()
+        self.async_bridge.stop()
+        shutdown_order_intake(wait=False)
+        shutdown_executor(wait=False)
+        self.root.destroy()
+
     def show_error(self, title, message):
         """Показать окно ошибки"""
         messagebox.showerror(title, message)
\ No newline at end of file
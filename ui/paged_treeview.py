@@ -0,0 +1,386 @@
+"""
+Постраничная подгрузка строк в ttk.Treeview при прокрутке
+"""
+import time
+import tkinter as tk
+from collections import deque
+
+
+class PagedTreeview:
+    """
+    Скользящее окно страниц поверх ttk.Treeview.
+
+    Страницы запрашиваются через fetch_page(cursor, limit, backward) по ключу
+    (keyset), когда прокрутка подходит к краю загруженных строк; запрос
+    выполняется через submit (пул фоновых потоков БД). В дереве
+    держится не больше max_pages страниц: при подгрузке снизу верхние
+    страницы удаляются и наоборот.
+
+    Элементы дерева идентифицируются первичным ключом строки (id_func), поэтому
+    refresh() обновляет окно по разнице: вставляет, меняет и удаляет только
+    изменившиеся строки — выделение и прокрутка сохраняются. Изменение строки
+    определяется по version_func (например, updated_at), а без нее — по
+    отображаемым значениям. Работа выполняется порциями через root.after.
+
+    apply_rows() применяет точечные изменения (из ленты изменений базы) без
+    запроса окна: строки внутри границ окна обновляются или вставляются на
+    место по ключу (descending — ключи по убыванию), удаленные убираются.
+    """
+
+    # Доля высоты прокрутки у края, при которой подгружается следующая страница
+    PREFETCH_MARGIN = 0.15
+    # Длительность одной порции обновления дерева в главном потоке (секунды)
+    SLICE_SECONDS = 0.015
+
+    def __init__(self, root, tree, scrollbar, fetch_page, key_func, row_func, submit,
+                 page_size=200, max_pages=5, on_error=None, id_func=None, version_func=None,
+                 descending=False):
+        self.root = root
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.submit = submit
+        self.key_func = key_func
+        self.row_func = row_func
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.on_error = on_error
+        self.id_func = id_func or (lambda row: row.id)
+        self.version_func = version_func
+        self.descending = descending
+
+        # Загруженные страницы: (id элементов дерева, ключ первой строки, ключ последней)
+        self.pages = deque()
+        # Версия каждой строки дерева для сравнения при refresh()
+        self.versions = {}
+        # Ключ сортировки каждой строки дерева для вставки на место в apply_rows()
+        self.keys = {}
+        self.has_more_above = False
+        self.has_more_below = False
+        self.loading = False
+        # Номер поколения отсекает ответы, пришедшие после reset()
+        self.generation = 0
+
+        self.tree.configure(yscrollcommand=self._on_scroll)
+
+    def reset(self, rows=None):
+        """Очистка окна и показ первой страницы (rows — уже загруженная первая страница)"""
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.pages.clear()
+        self.versions.clear()
+        self.keys.clear()
+        self.has_more_above = False
+        self.has_more_below = True
+        self.loading = False
+        if rows is None:
+            self._request(None, backward=False)
+        else:
+            self._apply(self.generation, list(rows), backward=False)
+
+    def _on_scroll(self, first, last):
+        """Обработчик yscrollcommand: двигает ползунок и подгружает страницы у краев"""
+        self.scrollbar.set(first, last)
+        if self.loading or not self.pages:
+            return
+        if float(last) >= 1 - self.PREFETCH_MARGIN and self.has_more_below:
+            self._request(self.pages[-1][2], backward=False)
+        elif float(first) <= self.PREFETCH_MARGIN and self.has_more_above:
+            self._request(self.pages[0][1], backward=True)
+
+    def _request(self, cursor, backward):
+        """Загрузка страницы в пуле фоновых потоков"""
+        self.loading = True
+        generation = self.generation
+
+        def worker():
+            try:
+                rows = self.fetch_page(cursor, self.page_size, backward)
+            except Exception as e:
+                rows = []
+                if self.on_error:
+                    self.root.after(0, self.on_error, "Ошибка загрузки данных", str(e))
+            self.root.after(0, self._apply, generation, rows, backward)
+
+        self.submit(worker)
+
+    def _apply(self, generation, rows, backward):
+        """Вставка страницы в дерево и вытеснение лишних страниц (в основном потоке)"""
+        if generation != self.generation:
+            return
+        self.loading = False
+
+        if len(rows) < self.page_size:
+            if backward:
+                self.has_more_above = False
+            else:
+                self.has_more_below = False
+        if not rows:
+            return
+
+        anchor = self._top_item()
+
+        items = []
+        position = 0
+        for row in rows:
+            iid = str(self.id_func(row))
+            # Строка могла сдвинуться между запросами страниц и уже быть в дереве
+            if self.tree.exists(iid):
+                continue
+            values, tags = self.row_func(row)
+            index = position if backward else tk.END
+            items.append(self.tree.insert("", index, iid=iid, values=values, tags=tags))
+            self.versions[iid] = self._version(row, values, tags)
+            self.keys[iid] = self.key_func(row)
+            position += 1
+        page = (items, self.key_func(rows[0]), self.key_func(rows[-1]))
+
+        if backward:
+            self.pages.appendleft(page)
+        else:
+            self.pages.append(page)
+
+        while len(self.pages) > self.max_pages:
+            if backward:
+                dropped = self.pages.pop()
+                self.has_more_below = True
+            else:
+                dropped = self.pages.popleft()
+                self.has_more_above = True
+            self.tree.delete(*dropped[0])
+            for iid in dropped[0]:
+                self.versions.pop(iid, None)
+                self.keys.pop(iid, None)
+
+        self._restore_anchor(anchor)
+
+    def _version(self, row, values=None, tags=None):
+        if self.version_func is not None:
+            return self.version_func(row)
+        if values is None:
+            values, tags = self.row_func(row)
+        return (tuple(values), tuple(tags))
+
+    def refresh(self, rows=None):
+        """
+        Обновление загруженного окна по разнице с базой.
+
+        rows — свежая первая страница: используется, если окно состоит только
+        из первой страницы. Иначе окно целиком перечитывается в пуле потоков.
+        """
+        if not self.pages:
+            self.reset(rows)
+            return
+        if self.loading:
+            # Идет подгрузка или предыдущее обновление — перечитаем окно целиком позже
+            self.root.after(100, self.refresh)
+            return
+
+        self.loading = True
+        self.generation += 1
+        generation = self.generation
+        if rows is not None and not self.has_more_above and len(self.pages) == 1:
+            self._start_diff(generation, list(rows), len(rows) >= self.page_size)
+            return
+
+        first_key = self.pages[0][1]
+        count = sum(len(page[0]) for page in self.pages)
+        from_top = not self.has_more_above
+
+        def worker():
+            try:
+                # Ключ строки перед окном: окно перечитывается начиная с нее (не включая)
+                cursor = None
+                if not from_top:
+                    before = self.fetch_page(first_key, 1, True)
+                    cursor = self.key_func(before[-1]) if before else None
+                fresh = self.fetch_page(cursor, count, False)
+            except Exception as e:
+                if self.on_error:
+                    self.root.after(0, self.on_error, "Ошибка загрузки данных", str(e))
+                self.root.after(0, self._finish_diff, generation, None, None)
+                return
+            self.root.after(0, self._start_diff, generation, fresh, len(fresh) >= count)
+
+        self.submit(worker)
+
+    def _start_diff(self, generation, rows, has_more_below):
+        """Удаление исчезнувших строк и запуск порционного обновления остальных"""
+        if generation != self.generation:
+            return
+        target = [str(self.id_func(row)) for row in rows]
+        wanted = set(target)
+        anchor = self._top_item()
+
+        stale = [iid for iid in self.tree.get_children() if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                self.versions.pop(iid, None)
+                self.keys.pop(iid, None)
+        state = {
+            'rows': rows,
+            'target': target,
+            'current': list(self.tree.get_children()),
+            'index': 0,
+            'anchor': anchor if anchor in wanted else None,
+            'has_more_below': has_more_below,
+        }
+        self._diff_slice(generation, state)
+
+    def _diff_slice(self, generation, state):
+        """Одна порция: вставка новых, обновление измененных и перестановка строк"""
+        if generation != self.generation:
+            return
+        rows, target, current = state['rows'], state['target'], state['current']
+        deadline = time.perf_counter() + self.SLICE_SECONDS
+        index = state['index']
+        while index < len(rows) and time.perf_counter() < deadline:
+            row, iid = rows[index], target[index]
+            self.keys[iid] = self.key_func(row)
+            if self.tree.exists(iid):
+                version = self._version(row)
+                if self.versions.get(iid) != version:
+                    values, tags = self.row_func(row)
+                    self.tree.item(iid, values=values, tags=tags)
+                    self.versions[iid] = version
+                if index >= len(current) or current[index] != iid:
+                    self.tree.move(iid, "", index)
+                    current.remove(iid)
+                    current.insert(index, iid)
+            else:
+                values, tags = self.row_func(row)
+                self.tree.insert("", index, iid=iid, values=values, tags=tags)
+                self.versions[iid] = self._version(row, values, tags)
+                current.insert(index, iid)
+            index += 1
+        state['index'] = index
+
+        if index < len(rows):
+            self.root.after(1, self._diff_slice, generation, state)
+        else:
+            self._finish_diff(generation, state, rows)
+
+    def _finish_diff(self, generation, state, rows):
+        """Пересборка страниц окна после обновления"""
+        if generation != self.generation:
+            return
+        self.loading = False
+        if state is None:
+            return
+        self.pages.clear()
+        target = state['target']
+        for start in range(0, len(rows), self.page_size):
+            chunk = rows[start:start + self.page_size]
+            self.pages.append((target[start:start + self.page_size],
+                               self.key_func(chunk[0]), self.key_func(chunk[-1])))
+        self.has_more_below = state['has_more_below']
+        self._restore_anchor(state['anchor'])
+
+    def apply_rows(self, rows, deleted_ids=()):
+        """
+        Точечное обновление окна: rows — измененные или новые строки,
+        deleted_ids — id удаленных (в основном потоке).
+
+        Строка с ключом вне загруженного окна убирается из дерева — она
+        появится при прокрутке к своему месту.
+        """
+        if not self.pages:
+            # Пустое окно (например, таблица была пуста) — загрузить первую страницу
+            if rows and not self.loading:
+                self.reset()
+            return
+        if self.loading:
+            # Окно сейчас меняется — перечитаем его целиком после загрузки
+            self.refresh()
+            return
+
+        anchor = self._top_item()
+        for row_id in deleted_ids:
+            self._remove(str(row_id))
+
+        for row in rows:
+            iid = str(self.id_func(row))
+            key = self.key_func(row)
+            exists = self.tree.exists(iid)
+            if exists and self.keys.get(iid) == key:
+                version = self._version(row)
+                if self.versions.get(iid) != version:
+                    values, tags = self.row_func(row)
+                    self.tree.item(iid, values=values, tags=tags)
+                    self.versions[iid] = version
+                continue
+            # Новая строка или строка со сменившимся ключом — на свое место
+            if exists:
+                self._remove(iid)
+            if self._in_window(key):
+                self._insert_sorted(row, iid, key)
+
+        self._restore_anchor(anchor)
+
+    def _before(self, a, b):
+        """Строка с ключом a выводится выше строки с ключом b"""
+        return a > b if self.descending else a < b
+
+    def _in_window(self, key):
+        first, last = self.pages[0][1], self.pages[-1][2]
+        if self.has_more_above and self._before(key, first):
+            return False
+        if self.has_more_below and self._before(last, key):
+            return False
+        return True
+
+    def _remove(self, iid):
+        if not self.tree.exists(iid):
+            return
+        self.tree.delete(iid)
+        self.versions.pop(iid, None)
+        self.keys.pop(iid, None)
+        for index, (items, first, last) in enumerate(self.pages):
+            if iid in items:
+                items.remove(iid)
+                if not items and len(self.pages) > 1:
+                    del self.pages[index]
+                break
+
+    def _insert_sorted(self, row, iid, key):
+        children = self.tree.get_children()
+        # Двоичный поиск первой строки, которая должна идти ниже новой
+        low, high = 0, len(children)
+        while low < high:
+            middle = (low + high) // 2
+            if self._before(self.keys[children[middle]], key):
+                low = middle + 1
+            else:
+                high = middle
+        values, tags = self.row_func(row)
+        self.tree.insert("", low, iid=iid, values=values, tags=tags)
+        self.versions[iid] = self._version(row, values, tags)
+        self.keys[iid] = key
+
+        # Строка попадает в страницу предыдущей строки (или в первую)
+        previous = children[low - 1] if low else None
+        for index, (items, first, last) in enumerate(self.pages):
+            if previous is None or previous in items:
+                items.insert(items.index(previous) + 1 if previous is not None else 0, iid)
+                if self._before(key, first):
+                    first = key
+                if self._before(last, key):
+                    last = key
+                self.pages[index] = (items, first, last)
+                break
+
+    def _top_item(self):
+        """Первая видимая строка дерева"""
+        children = self.tree.get_children()
+        if not children:
+            return None
+        index = int(float(self.tree.yview()[0]) * len(children))
+        return children[min(index, len(children) - 1)]
+
+    def _restore_anchor(self, anchor):
+        """Возврат прокрутки к той же строке после вставки/удаления страниц"""
+        if anchor is None or not self.tree.exists(anchor):
+            return
+        children = self.tree.get_children()
+        self.tree.yview_moveto(self.tree.index(anchor) / len(children))
@@ -0,0 +1,84 @@
+"""
+Фоновое выполнение SQL запроса с порционной передачей строк в интерфейс
+"""
+import queue
+
+
+class QueryStreamWorker:
+    """
+    Задача пула потоков БД, читающая результат stream_custom_query порциями.
+
+    Каждая порция передается в on_batch(columns, rows) через root.after.
+    После row_cap строк поток ждет команды more() (еще row_cap строк)
+    или stop(), но не дольше idle_timeout секунд: ожидание держит поток
+    пула и открытую транзакцию, поэтому по истечении срока курсор
+    закрывается (expired = True). По окончании вызывается
+    on_done(total, exhausted, error).
+    Генератор потребляется только в одном потоке пула — серверный курсор
+    и транзакция живут в его соединении, пока задача не завершится.
+    stream_func(batch_size) задает другой источник порций (columns, rows),
+    например stream_report; query тогда не используется.
+    """
+
+    def __init__(self, root, db_handler, query, row_cap, on_batch, on_done,
+                 on_cap_reached=None, batch_size=500, stream_func=None, idle_timeout=60):
+        self.root = root
+        self.db_handler = db_handler
+        self.query = query
+        self.row_cap = row_cap
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.on_cap_reached = on_cap_reached
+        self.stream_func = stream_func
+        self.idle_timeout = idle_timeout
+        self.expired = False
+        self._commands = queue.Queue()
+        self._stopped = False
+
+    def start(self):
+        """Запуск чтения в пуле фоновых потоков БД"""
+        return self.db_handler.run_in_background(self.run)
+
+    def more(self):
+        """Разрешить чтение следующих row_cap строк"""
+        self._commands.put('more')
+
+    def stop(self):
+        """Прервать чтение и закрыть курсор"""
+        self._stopped = True
+        self._commands.put('stop')
+
+    def run(self):
+        total = 0
+        limit = self.row_cap
+        exhausted = False
+        error = None
+        if self.stream_func is not None:
+            stream = self.stream_func(self.batch_size)
+        else:
+            stream = self.db_handler.stream_custom_query(self.query, batch_size=self.batch_size)
+        try:
+            for columns, rows in stream:
+                if self._stopped:
+                    break
+                total += len(rows)
+                self.root.after(0, self.on_batch, columns, rows)
+                if total >= limit:
+                    if self.on_cap_reached:
+                        self.root.after(0, self.on_cap_reached, total)
+                    try:
+                        command = self._commands.get(timeout=self.idle_timeout)
+                    except queue.Empty:
+                        self.expired = True
+                        break
+                    if command != 'more':
+                        break
+                    limit += self.row_cap
+            else:
+                exhausted = not self._stopped
+        except Exception as e:
+            error = str(e)
+        finally:
+            stream.close()
+        self.root.after(0, self.on_done, total, exhausted, error)